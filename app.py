@@ -1,14 +1,33 @@
 import os
-import openai
-from twilio.rest import Client
+import asyncio
+import atexit
+import json
+import threading
 import logging
-from flask import Flask, request, jsonify, session
+from flask import Blueprint, Flask, Response, request, jsonify
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import List, Dict, Optional
 import time
-import threading
-import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from outbound import OutboundQueue, TwilioTransport
+from campaigns import CampaignRunner
+from scheduler import TimerScheduler
+from intent_router import Intent, IntentRouter
+from conversation_store import MemoryConversationStore, SQLiteConversationStore
+from context_builder import ContextBuilder
+from response_cache import ResponseCache
+from idempotency import MemoryIdempotencyStore, SQLiteIdempotencyStore
+from rate_limit import InFlightLimiter, RateDecision, WebhookRateLimiter
+from inventory import InventoryCatalog, format_rand
+from sales_ledger import SalesLedger
+from user_state import ShardedUserStates, UserState
+from state_backend import LocalStateBackend, SQLiteStateBackend
+from state_journal import FileJournal, apply_record, sale_record, snapshot_records, user_record
+from asgi_adapter import create_asgi_app
+from leader import LeaderLock
+from metrics import MetricsRegistry, RequestTrace
+from streaming import ReplyChunker, stream_reply, stream_reply_async
 
 # Load environment variables
 load_dotenv()
@@ -20,15 +39,43 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-# Flask app setup
-app = Flask(__name__)  # Ensure this matches the filename 'app.py'
-app.secret_key = os.getenv("FLASK_SECRET_KEY", "your-secret-key-here")
+# Prometheus metrics served at /metrics; TRACE_SAMPLE_RATE also logs per-stage timings for that fraction of requests
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.0))
+metrics = MetricsRegistry(trace_sample_rate=TRACE_SAMPLE_RATE, enabled=METRICS_ENABLED)
+webhook_requests = metrics.counter("webhook_requests_total", "Webhook requests by outcome", label="status")
+intent_counter = metrics.counter("webhook_intents_total", "Messages handled per intent branch", label="intent")
+prompt_tokens = metrics.histogram("openai_prompt_tokens", "Prompt tokens per AI request",
+                                  buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 4000))
+
+# Feed Twilio call durations into the stage histogram
+def observe_twilio_send(seconds: float) -> None:
+    metrics.stage_seconds.observe(seconds, "twilio_send")
+
+# Routes, registered on the Flask app built by create_app()
+routes = Blueprint("assistant", __name__)
 
 # Load OpenAI API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
-if not openai.api_key:
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY environment variable is missing.")
 
+# Point OPENAI_API_BASE at a proxy or a local stub; used by both the sync and async clients
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+
+# The openai package takes a few hundred milliseconds to import (it pulls in aiohttp),
+# so it is imported on first use, or in the background by start_services()
+_openai = None
+
+def openai_module():
+    global _openai
+    if _openai is None:
+        import openai
+        openai.api_key = OPENAI_API_KEY
+        openai.api_base = OPENAI_API_BASE
+        _openai = openai
+    return _openai
+
 # Secret phrase for admin access
 SECRET_PHRASE = os.getenv("SECRET_PHRASE", "admin access granted")
 
@@ -40,43 +87,47 @@ TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 if not all([TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER]):
     raise ValueError("Twilio environment variables (ACCOUNT_SID, AUTH_TOKEN, PHONE_NUMBER) are missing.")
 
-# Initialize Twilio client
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+# Twilio REST client, created on first use
+twilio_client = None
+
+def get_twilio_client():
+    global twilio_client
+    if twilio_client is None:
+        from twilio.rest import Client
+        twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    return twilio_client
+
+# Outbound delivery queue settings
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", 4))
+OUTBOUND_MAX_PENDING = int(os.getenv("OUTBOUND_MAX_PENDING", 10000))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 5))
+# When enabled, the webhook returns as soon as the reply is queued instead of waiting on Twilio
+ACK_WEBHOOK_EARLY = os.getenv("ACK_WEBHOOK_EARLY", "True") == "True"
+
+# Point TWILIO_API_BASE at a regional edge or a local stub to send over pooled HTTP instead of the SDK
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE")
+
+def create_outbound_transport():
+    if TWILIO_API_BASE:
+        from http_clients import TwilioRestTransport
+        return TwilioRestTransport(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER, api_base=TWILIO_API_BASE)
+    return TwilioTransport(get_twilio_client(), TWILIO_PHONE_NUMBER)
+
+# Workers and transport start with the other services; set outbound_queue.transport before that to replace it
+outbound_queue = OutboundQueue(
+    None,
+    workers=OUTBOUND_WORKERS,
+    max_pending=OUTBOUND_MAX_PENDING,
+    max_retries=OUTBOUND_MAX_RETRIES,
+    observe_send=observe_twilio_send if METRICS_ENABLED else None,
+)
 
 # Define the AI system prompt
 AI_PROMPT = """
 You are an AI assistant for ANB Tech Supplies, specializing in iPhone sales. Your role is to assist customers with information about iPhone models, pricing, installment plans, and other inquiries. You also handle customer service and sales requests, providing details on product availability, payment methods, and more. Always respond clearly, politely, and helpfully, staying focused on the customer's question or request. Use short sentences and simple language for easy reading. Maintain context from previous messages to ensure a seamless conversation. Do not include any links unless explicitly instructed. Do not generate or invent banking details; use only the provided details: Account Number: 1773081371, Bank: Capitec, Name: Mr N Nkapele when asked for payment information. When a customer specifies a model, color, and storage (e.g., "Pink iPhone 13, 128GB"), provide details specific to that request.
 """
 
-# Predefined responses (formatted for readability)
-PRICE_LIST = """
-📌 iPhone Price List – 40% Discount Applied  
-
-Older Models:  
-- iPhone X: ~~R7,999~~ Now R4,799  
-- iPhone XS: ~~R8,999~~ Now R5,399  
-- iPhone XS Max: ~~R9,999~~ Now R5,999  
-
-Mid-Range Models:  
-- iPhone 11 Pro: ~~R12,999~~ Now R7,799  
-- iPhone 11 Pro Max: ~~R13,999~~ Now R8,399  
-- iPhone 12 Pro: ~~R15,999~~ Now R9,599  
-- iPhone 12 Pro Max: ~~R16,999~~ Now R10,199  
-- iPhone 13: ~~R12,582~~ Now R7,549  
-
-Newer Models:  
-- iPhone 13 Pro: ~~R17,999~~ Now R10,799  
-- iPhone 13 Pro Max: ~~R18,999~~ Now R11,399  
-- iPhone 14 Pro: ~~R20,999~~ Now R12,599  
-- iPhone 14 Pro Max: ~~R21,999~~ Now R13,199  
-
-Latest Models:  
-- iPhone 15 Pro: ~~R22,999~~ Now R13,799  
-- iPhone 15 Pro Max: ~~R23,999~~ Now R14,399  
-- iPhone 16 Pro: ~~R24,999~~ Now R14,999  
-- iPhone 16 Pro Max: ~~R25,999~~ Now R15,599  
-"""
-
+# Predefined responses (formatted for readability); the price list is generated from INVENTORY
 INSTALLMENT_PLAN = """
 💳 Monthly Installment Plan  
 
@@ -175,257 +226,745 @@ https://iphone-customizer.onrender.com/
 How can I assist you today?
 """
 
-# Simplified inventory for context (base prices with storage adjustments)
+# Simplified inventory (price-list tier, list and discounted base prices, storage adjustments);
+# purchase lookups and the price list are served from an index built over it
 INVENTORY = {
-    "iPhone X": {"base_price": 4799, "storage": {64: 0, 128: 500, 256: 1000}, "colors": ["Space Gray", "Silver"]},
-    "iPhone XS": {"base_price": 5399, "storage": {64: 0, 256: 600, 512: 1200}, "colors": ["Space Gray", "Silver", "Gold"]},
-    "iPhone XS Max": {"base_price": 5999, "storage": {64: 0, 256: 600, 512: 1200}, "colors": ["Space Gray", "Silver", "Gold"]},
-    "iPhone 11 Pro": {"base_price": 7799, "storage": {64: 0, 256: 600, 512: 1200}, "colors": ["Space Gray", "Silver", "Gold", "Midnight Green"]},
-    "iPhone 11 Pro Max": {"base_price": 8399, "storage": {64: 0, 256: 600, 512: 1200}, "colors": ["Space Gray", "Silver", "Gold", "Midnight Green"]},
-    "iPhone 12 Pro": {"base_price": 9599, "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Graphite", "Silver", "Gold", "Pacific Blue"]},
-    "iPhone 12 Pro Max": {"base_price": 10199, "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Graphite", "Silver", "Gold", "Pacific Blue"]},
-    "iPhone 13": {"base_price": 7549, "storage": {128: 0, 256: 500, 512: 1000}, "colors": ["Pink", "Blue", "Midnight", "Starlight", "Red", "Green"]},
-    "iPhone 13 Pro": {"base_price": 10799, "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Graphite", "Gold", "Silver", "Sierra Blue", "Alpine Green"]},
-    "iPhone 13 Pro Max": {"base_price": 11399, "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Graphite", "Gold", "Silver", "Sierra Blue", "Alpine Green"]},
-    "iPhone 14 Pro": {"base_price": 12599, "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Space Black", "Silver", "Gold", "Deep Purple"]},
-    "iPhone 14 Pro Max": {"base_price": 13199, "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Space Black", "Silver", "Gold", "Deep Purple"]},
-    "iPhone 15 Pro": {"base_price": 13799, "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Black Titanium", "White Titanium", "Natural Titanium", "Blue Titanium"]},
-    "iPhone 15 Pro Max": {"base_price": 14399, "storage": {256: 0, 512: 600, 1024: 1200}, "colors": ["Black Titanium", "White Titanium", "Natural Titanium", "Blue Titanium"]},
-    "iPhone 16 Pro": {"base_price": 14999, "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Black Titanium", "White Titanium", "Natural Titanium", "Blue Titanium"]},
-    "iPhone 16 Pro Max": {"base_price": 15599, "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Black Titanium", "White Titanium", "Natural Titanium", "Blue Titanium"]}
+    "iPhone X": {"tier": "Older Models", "list_price": 7999, "base_price": 4799, "chip": "A11 Bionic", "storage": {64: 0, 128: 500, 256: 1000}, "colors": ["Space Gray", "Silver"]},
+    "iPhone XS": {"tier": "Older Models", "list_price": 8999, "base_price": 5399, "chip": "A12 Bionic", "storage": {64: 0, 256: 600, 512: 1200}, "colors": ["Space Gray", "Silver", "Gold"]},
+    "iPhone XS Max": {"tier": "Older Models", "list_price": 9999, "base_price": 5999, "chip": "A12 Bionic", "storage": {64: 0, 256: 600, 512: 1200}, "colors": ["Space Gray", "Silver", "Gold"]},
+    "iPhone 11 Pro": {"tier": "Mid-Range Models", "list_price": 12999, "base_price": 7799, "chip": "A13 Bionic", "storage": {64: 0, 256: 600, 512: 1200}, "colors": ["Space Gray", "Silver", "Gold", "Midnight Green"]},
+    "iPhone 11 Pro Max": {"tier": "Mid-Range Models", "list_price": 13999, "base_price": 8399, "chip": "A13 Bionic", "storage": {64: 0, 256: 600, 512: 1200}, "colors": ["Space Gray", "Silver", "Gold", "Midnight Green"]},
+    "iPhone 12 Pro": {"tier": "Mid-Range Models", "list_price": 15999, "base_price": 9599, "chip": "A14 Bionic", "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Graphite", "Silver", "Gold", "Pacific Blue"]},
+    "iPhone 12 Pro Max": {"tier": "Mid-Range Models", "list_price": 16999, "base_price": 10199, "chip": "A14 Bionic", "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Graphite", "Silver", "Gold", "Pacific Blue"]},
+    "iPhone 13": {"tier": "Mid-Range Models", "list_price": 12582, "base_price": 7549, "chip": "A15 Bionic", "storage": {128: 0, 256: 500, 512: 1000}, "colors": ["Pink", "Blue", "Midnight", "Starlight", "Red", "Green"]},
+    "iPhone 13 Pro": {"tier": "Newer Models", "list_price": 17999, "base_price": 10799, "chip": "A15 Bionic", "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Graphite", "Gold", "Silver", "Sierra Blue", "Alpine Green"]},
+    "iPhone 13 Pro Max": {"tier": "Newer Models", "list_price": 18999, "base_price": 11399, "chip": "A15 Bionic", "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Graphite", "Gold", "Silver", "Sierra Blue", "Alpine Green"]},
+    "iPhone 14 Pro": {"tier": "Newer Models", "list_price": 20999, "base_price": 12599, "chip": "A16 Bionic", "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Space Black", "Silver", "Gold", "Deep Purple"]},
+    "iPhone 14 Pro Max": {"tier": "Newer Models", "list_price": 21999, "base_price": 13199, "chip": "A16 Bionic", "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Space Black", "Silver", "Gold", "Deep Purple"]},
+    "iPhone 15 Pro": {"tier": "Latest Models", "list_price": 22999, "base_price": 13799, "chip": "A17 Pro", "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Black Titanium", "White Titanium", "Natural Titanium", "Blue Titanium"]},
+    "iPhone 15 Pro Max": {"tier": "Latest Models", "list_price": 23999, "base_price": 14399, "chip": "A17 Pro", "storage": {256: 0, 512: 600, 1024: 1200}, "colors": ["Black Titanium", "White Titanium", "Natural Titanium", "Blue Titanium"]},
+    "iPhone 16 Pro": {"tier": "Latest Models", "list_price": 24999, "base_price": 14999, "chip": "A18 Pro", "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Black Titanium", "White Titanium", "Natural Titanium", "Blue Titanium"]},
+    "iPhone 16 Pro Max": {"tier": "Latest Models", "list_price": 25999, "base_price": 15599, "chip": "A18 Pro", "storage": {128: 0, 256: 600, 512: 1200}, "colors": ["Black Titanium", "White Titanium", "Natural Titanium", "Blue Titanium"]}
 }
 
-# Sales tracking data
-sales_data = {
-    "completed": [],  # List of {"phone": str, "item": str, "amount": int, "date": str}
-    "pending": [],    # List of {"phone": str, "item": str, "amount": int}
-    "promised": []    # List of {"phone": str, "item": str, "amount": int, "day": str}
-}
+# Normalized (model, color, storage) -> price index; call inventory.reload(...) to swap in a new catalog
+inventory = InventoryCatalog(INVENTORY)
+
+# Where user states, sales, conversations and delivery records live: "memory" (this process
+# only) or "sqlite" (databases shared by every worker on the host, for gunicorn -w N). With
+# sqlite, each sender's messages are processed under a lease in the shared database, one at a
+# time on whichever worker they land; a message waits up to USER_LEASE_WAIT seconds for the
+# sender's previous one, and a lease left by a dead worker expires after USER_LEASE_TTL seconds.
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite" if os.getenv("STATE_JOURNAL") == "sqlite" else "memory")
+USER_LEASES = os.getenv("USER_LEASES", "True") == "True"
+USER_LEASE_WAIT = float(os.getenv("USER_LEASE_WAIT", 30.0))
+USER_LEASE_TTL = float(os.getenv("USER_LEASE_TTL", 120.0))
+# Async messages wait for a busy lease on their own threads, so the waits never hold up the
+# default executor that releases leases and runs the other blocking state calls
+USER_LEASE_WAIT_THREADS = int(os.getenv("USER_LEASE_WAIT_THREADS", 32))
+
+# Durable journal for user states and sales: "off" or "file" with the memory backend; the
+# sqlite backend always journals to its database. A file journal belongs to one process:
+# another one started on it (gunicorn -w N, uvicorn --workers N) waits up to
+# STATE_JOURNAL_CLAIM_WAIT seconds for the holder to exit, then refuses to start. Run several
+# workers with STATE_BACKEND=sqlite instead.
+STATE_JOURNAL = "sqlite" if STATE_BACKEND == "sqlite" else os.getenv("STATE_JOURNAL", "off")
+STATE_JOURNAL_CLAIM_WAIT = float(os.getenv("STATE_JOURNAL_CLAIM_WAIT", 30.0))
+STATE_JOURNAL_PATH = os.getenv("STATE_JOURNAL_PATH", "state.db" if STATE_JOURNAL == "sqlite" else "state.journal")
+STATE_JOURNAL_FSYNC_INTERVAL = float(os.getenv("STATE_JOURNAL_FSYNC_INTERVAL", 0.05))
+STATE_COMPACT_INTERVAL = int(os.getenv("STATE_COMPACT_INTERVAL", 3600))
+STATE_SYNC_INTERVAL = float(os.getenv("STATE_SYNC_INTERVAL", 1.0))
+
+if STATE_BACKEND == "sqlite":
+    state_backend = SQLiteStateBackend(STATE_JOURNAL_PATH, fsync_interval=STATE_JOURNAL_FSYNC_INTERVAL,
+                                       lease_ttl=USER_LEASE_TTL)
+elif STATE_JOURNAL == "file":
+    state_backend = LocalStateBackend(FileJournal(STATE_JOURNAL_PATH, fsync_interval=STATE_JOURNAL_FSYNC_INTERVAL))
+else:
+    state_backend = LocalStateBackend()
+state_journal = state_backend.journal
+lease_waiters = ThreadPoolExecutor(USER_LEASE_WAIT_THREADS, thread_name_prefix="lease-wait")
+user_lease_timeouts = metrics.counter("user_lease_timeouts_total", "Messages processed without the sender's lease after waiting USER_LEASE_WAIT")
+
+# Journal every new or updated sale
+def journal_sale(sale) -> None:
+    if state_journal:
+        state_journal.append(sale_record(sale))
+
+# Sales tracking data (completed, pending and promised sales, indexed by phone and day)
+sales_ledger = SalesLedger(on_change=journal_sale)
+
+# In-memory store for user states, lock-striped by phone number; hold user_states.lock(phone) to read or update a user
+USER_STATE_SHARDS = int(os.getenv("USER_STATE_SHARDS", 64))
+user_states = ShardedUserStates(USER_STATE_SHARDS)
+
+# Idle users are evicted once their follow-up cycle is over (every follow-up sent, no reminder
+# pending) and USER_STATE_TTL seconds have passed since their last message or follow-up (0 keeps
+# everyone); with USER_STATE_ARCHIVE set, their last state is appended to that JSONL file first
+USER_STATE_TTL = int(os.getenv("USER_STATE_TTL", 14 * 24 * 3600))
+USER_STATE_ARCHIVE = os.getenv("USER_STATE_ARCHIVE", "")
+USER_STATE_SWEEP_INTERVAL = int(os.getenv("USER_STATE_SWEEP_INTERVAL", 3600))
+evicted_users = metrics.counter("user_states_evicted_total", "Idle users evicted from memory")
+
+# Precompiled keyword/intent router for incoming messages
+intent_router = IntentRouter(SECRET_PHRASE)
+
+# Server-side conversation history ("memory" or "sqlite"; follows STATE_BACKEND unless set)
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", STATE_BACKEND)
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", 20))
+CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", 7 * 24 * 3600))
+
+if CONVERSATION_STORE == "sqlite":
+    conversation_store = SQLiteConversationStore(
+        os.getenv("CONVERSATION_DB", "conversations.db"),
+        max_turns=CONVERSATION_MAX_TURNS,
+        ttl=CONVERSATION_TTL,
+    )
+else:
+    conversation_store = MemoryConversationStore(
+        max_turns=CONVERSATION_MAX_TURNS,
+        max_users=int(os.getenv("CONVERSATION_MAX_USERS", 100000)),
+        ttl=CONVERSATION_TTL,
+    )
+
+# Cache for AI fallback answers, keyed on the normalized question plus the full context sent to the model
+OPENAI_CACHE_ENABLED = os.getenv("OPENAI_CACHE_ENABLED", "True") == "True"
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("OPENAI_CACHE_MAX_ENTRIES", 10000)),
+    max_bytes=int(os.getenv("OPENAI_CACHE_MAX_BYTES", 16 * 2**20)),
+    ttl=int(os.getenv("OPENAI_CACHE_TTL", 6 * 3600)),
+)
 
-# In-memory store for user states
-user_states = {}
+# Twilio redelivers a webhook it considers slow or failed; deliveries are deduplicated on
+# MessageSid ("memory", "sqlite" to share across workers, or "off"; follows STATE_BACKEND
+# unless set) and a redelivery gets the first delivery's response, waiting up to
+# IDEMPOTENCY_WAIT seconds while it is in progress
+IDEMPOTENCY = os.getenv("IDEMPOTENCY", STATE_BACKEND)
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", 10.0))
+# Async redeliveries wait on their own threads, so a burst of them cannot hold up the default
+# executor that the first deliveries need to finish
+IDEMPOTENCY_WAIT_THREADS = int(os.getenv("IDEMPOTENCY_WAIT_THREADS", 32))
+duplicate_waiters = ThreadPoolExecutor(IDEMPOTENCY_WAIT_THREADS, thread_name_prefix="duplicate-wait")
+
+if IDEMPOTENCY == "sqlite":
+    idempotency = SQLiteIdempotencyStore(os.getenv("IDEMPOTENCY_DB", "idempotency.db"), ttl=IDEMPOTENCY_TTL)
+elif IDEMPOTENCY == "memory":
+    idempotency = MemoryIdempotencyStore(max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 100000)), ttl=IDEMPOTENCY_TTL)
+else:
+    idempotency = None
+
+OPENAI_ERROR_REPLY = "Sorry, I couldn’t process your request right now. How can I assist you otherwise?"
+
+# Token buckets checked before any processing: SENDER_RATE_LIMIT messages per minute per sender
+# (bursts of SENDER_RATE_BURST) and GLOBAL_RATE_LIMIT messages per second overall (bursts of
+# GLOBAL_RATE_BURST); 0 disables either. Limits apply per worker process. A sender over their own
+# limit gets RATE_LIMIT_REPLY once until their bucket refills (RATE_LIMIT_ACTION=reply) or nothing
+# (drop); messages refused by the global limit are dropped without a reply.
+SENDER_RATE_LIMIT = float(os.getenv("SENDER_RATE_LIMIT", 20))
+SENDER_RATE_BURST = float(os.getenv("SENDER_RATE_BURST", 8))
+GLOBAL_RATE_LIMIT = float(os.getenv("GLOBAL_RATE_LIMIT", 0))
+GLOBAL_RATE_BURST = float(os.getenv("GLOBAL_RATE_BURST", 2 * GLOBAL_RATE_LIMIT))
+RATE_LIMIT_ACTION = os.getenv("RATE_LIMIT_ACTION", "reply")
+RATE_LIMIT_REPLY = "⏳ You’re sending messages faster than we can answer. Please wait a minute and try again."
+
+if SENDER_RATE_LIMIT or GLOBAL_RATE_LIMIT:
+    rate_limiter = WebhookRateLimiter(SENDER_RATE_LIMIT / 60, SENDER_RATE_BURST, GLOBAL_RATE_LIMIT, GLOBAL_RATE_BURST)
+else:
+    rate_limiter = None
+rate_limited_messages = metrics.counter("webhook_rate_limited_total", "Messages refused by the rate limiter", label="bucket")
+
+# Load shedding: with OPENAI_MAX_IN_FLIGHT AI calls already running (0 for no limit), questions
+# without a cached answer get OPENAI_BUSY_REPLY instead of queueing behind them
+OPENAI_MAX_IN_FLIGHT = int(os.getenv("OPENAI_MAX_IN_FLIGHT", 32))
+OPENAI_BUSY_REPLY = "We’re getting a lot of questions right now. Please try again in a few minutes, or reply 'price' for our price list."
+openai_in_flight = InFlightLimiter(OPENAI_MAX_IN_FLIGHT)
+shed_questions = metrics.counter("openai_shed_total", "AI questions answered with the busy reply")
+
+# Stream AI answers to the customer sentence by sentence instead of waiting for the whole completion;
+# a chunk is sent at the first sentence or line break after OPENAI_STREAM_MIN_CHUNK characters
+OPENAI_STREAMING = os.getenv("OPENAI_STREAMING", "False") == "True"
+OPENAI_STREAM_MIN_CHUNK = int(os.getenv("OPENAI_STREAM_MIN_CHUNK", 200))
+
+# Token-budgeted prompts: long keyword replies are stored in the history as short references,
+# turns older than CONTEXT_KEEP_TURNS are summarized in the background, and the oldest turns
+# are dropped to keep each prompt under OPENAI_MAX_PROMPT_TOKENS
+CONTEXT_COMPACTION = os.getenv("CONTEXT_COMPACTION", "True") == "True"
+OPENAI_MAX_PROMPT_TOKENS = int(os.getenv("OPENAI_MAX_PROMPT_TOKENS", 1500))
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", 6))
+CONTEXT_SUMMARIES = os.getenv("CONTEXT_SUMMARIES", "True") == "True"
+CONTEXT_SUMMARY_BATCH = int(os.getenv("CONTEXT_SUMMARY_BATCH", 6))
+
+SUMMARY_PROMPT = "Summarize this WhatsApp conversation between a customer and the ANB Tech Supplies assistant in at most three short sentences. Keep the models, colors, storage, prices, orders, payments and promises mentioned."
+
+# Short stand-ins kept in the conversation history instead of long keyword replies
+CONTEXT_REFERENCES = {
+    "admin": "[Sent the sales report]",
+    "price": "[Sent the full iPhone price list]",
+    "recommend": "[Sent top picks: iPhone 12 Pro + Wireless Charger R10,899, iPhone 14 Pro Max + Case R14,299]",
+    "installment": "[Sent the installment plan: R750 minimum deposit, up to 24 months, application link]",
+    "purchase": "[Sent how to order and the payment options, including the bank details]",
+    "picture": "[Sent the iPhone customizer link]",
+    "ad_reply": "[Sent the ANB Tech Supplies welcome message and customizer link]",
+}
 
-# Lock for thread-safe updates
-state_lock = threading.Lock()
+# Fold older turns (and the previous summary) into a new summary; runs on the builder's background thread
+def summarize_conversation(summary: str, turns: List[Dict[str, str]]) -> str:
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    if summary:
+        transcript = f"Earlier summary: {summary}\n{transcript}"
+    response = openai_module().ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+        temperature=0.2,
+        max_tokens=120,
+    )
+    return response.choices[0].message.content.strip()
+
+context_builder = ContextBuilder(
+    AI_PROMPT,
+    max_prompt_tokens=OPENAI_MAX_PROMPT_TOKENS,
+    keep_turns=CONTEXT_KEEP_TURNS,
+    summarize=summarize_conversation if CONTEXT_SUMMARIES else None,
+    summarize_batch=CONTEXT_SUMMARY_BATCH,
+    ttl=CONVERSATION_TTL,
+)
 
-# Function to query OpenAI GPT-3.5-Turbo
+# Call OpenAI GPT-3.5-Turbo (uncached)
+def openai_completion(customer_message: str, context: List[Dict[str, str]]) -> str:
+    messages = [context_builder.system_message] + context + [{"role": "user", "content": customer_message}]
+    response = openai_module().ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=messages,
+        temperature=0.7,
+        max_tokens=300,
+    )
+    return response.choices[0].message.content.strip()
+
+# Call OpenAI GPT-3.5-Turbo with streaming, yielding text as it is generated
+def openai_completion_stream(customer_message: str, context: List[Dict[str, str]]):
+    messages = [context_builder.system_message] + context + [{"role": "user", "content": customer_message}]
+    response = openai_module().ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=messages,
+        temperature=0.7,
+        max_tokens=300,
+        stream=True,
+    )
+    for event in response:
+        text = event.choices[0].delta.get("content")
+        if text:
+            yield text
+
+# Function to query OpenAI GPT-3.5-Turbo (through the response cache)
 def query_openai(customer_message: str, context: List[Dict[str, str]]) -> str:
     try:
-        messages = [{"role": "system", "content": AI_PROMPT}] + context + [{"role": "user", "content": customer_message}]
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=300,
-        )
-        return response.choices[0].message.content.strip()
+        if not OPENAI_CACHE_ENABLED:
+            return openai_completion(customer_message, context)
+        return response_cache.get_or_load(customer_message, context, lambda: openai_completion(customer_message, context))
     except Exception as e:
         logging.error(f"OpenAI query failed: {e}")
-        return "Sorry, I couldn’t process your request right now. How can I assist you otherwise?"
+        return OPENAI_ERROR_REPLY
+
+# Non-blocking, connection-pooled clients for the async webhook (uvicorn app:asgi_app)
+# created on first use, so WSGI workers only build the clients they use
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", 100))
+async_openai = None
+async_twilio = None
+
+def get_async_openai():
+    global async_openai
+    if async_openai is None:
+        from http_clients import AsyncOpenAIClient
+        async_openai = AsyncOpenAIClient(OPENAI_API_KEY, api_base=OPENAI_API_BASE, max_connections=ASYNC_MAX_CONNECTIONS)
+    return async_openai
+
+def get_async_twilio():
+    global async_twilio
+    if async_twilio is None:
+        from http_clients import AsyncTwilioClient
+        async_twilio = AsyncTwilioClient(
+            TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER,
+            api_base=TWILIO_API_BASE or "https://api.twilio.com",
+            max_connections=ASYNC_MAX_CONNECTIONS,
+            max_retries=OUTBOUND_MAX_RETRIES,
+            observe_send=observe_twilio_send if METRICS_ENABLED else None,
+        )
+    return async_twilio
 
-# Check for admin access
-def is_admin(message_body: str) -> bool:
-    return SECRET_PHRASE.lower() in message_body.lower()
+# Async variant of query_openai for the ASGI webhook
+async def query_openai_async(customer_message: str, context: List[Dict[str, str]]) -> str:
+    messages = [context_builder.system_message] + context + [{"role": "user", "content": customer_message}]
+    try:
+        if not OPENAI_CACHE_ENABLED:
+            return await get_async_openai().chat(messages)
+        return await response_cache.get_or_load_async(customer_message, context, lambda: get_async_openai().chat(messages))
+    except Exception as e:
+        logging.error(f"OpenAI query failed: {e}")
+        return OPENAI_ERROR_REPLY
 
 # Generate sales report
 def generate_sales_report() -> str:
-    today = datetime.now().strftime("%A")
-    completed_count = len(sales_data["completed"])
-    pending_count = len(sales_data["pending"])
-    promised_today = [p for p in sales_data["promised"] if p["day"] == today]
-    promised_count = len(promised_today)
-
-    report = "📊 Sales Report\n\n"
-    report += f"Completed Sales: {completed_count}\n"
-    if completed_count > 0:
-        for sale in sales_data["completed"]:
-            report += f"- {sale['phone']}: {sale['item']} (R{sale['amount']}) on {sale['date']}\n"
-    report += "\n"
-
-    report += f"Pending Sales: {pending_count}\n"
-    if pending_count > 0:
-        for pend in sales_data["pending"]:
-            report += f"- {pend['phone']}: {pend['item']} (R{pend['amount']})\n"
-    report += "\n"
-
-    report += f"Promised Today ({today}): {promised_count}\n"
-    if promised_count > 0:
-        for prom in promised_today:
-            report += f"- {prom['phone']}: {prom['item']} (R{prom['amount']})\n"
-    
-    return report
-
-# Parse specific purchase request
-def parse_purchase_request(message: str) -> tuple[str, str, str, int, bool]:
-    pattern = r"i(?:'| a)m interested in buying an? (iPhone [^\s(]+(?: Pro Max| Pro)?) \(([^,]+),\s*(\d+GB)\)(?:\s*for\s*R(\d+))?"
-    match = re.search(pattern, message.lower())
-    if match:
-        model = match.group(1)  # e.g., "iphone 13"
-        color = match.group(2).strip()  # e.g., "pink"
-        storage = match.group(3)  # e.g., "128gb"
-        price = int(match.group(4)) if match.group(4) else None  # e.g., 11000 or None
-        return model.capitalize(), color.capitalize(), storage, price, True
-    return "", "", "", 0, False
-
-# Get price and validate request from INVENTORY
-def get_purchase_details(model: str, color: str, storage: str) -> tuple[int, bool]:
-    if model in INVENTORY:
-        inv = INVENTORY[model]
-        storage_int = int(storage.replace("GB", ""))
-        if storage_int in inv["storage"] and color in inv["colors"]:
-            price = inv["base_price"] + inv["storage"][storage_int]
-            return price, True
-        return 0, False
-    return 0, False
-
-# Send WhatsApp message via Twilio
-def send_whatsapp_message(to: str, body: str) -> None:
+    return sales_ledger.report()
+
+# Send WhatsApp message via Twilio (queued unless wait=True or early acks are disabled)
+def send_whatsapp_message(to: str, body: str, wait: bool = False) -> None:
+    if not to.startswith("+"):
+        logging.error(f"Invalid phone number format: {to}")
+        return
+    if ACK_WEBHOOK_EARLY and not wait:
+        outbound_queue.enqueue(to, body)
+    else:
+        outbound_queue.send_now(to, body)
+
+# Stream the AI answer to the customer, sending each chunk as soon as it is complete;
+# returns the full answer for the conversation history
+def stream_openai_reply(sender_number: str, customer_message: str, context: List[Dict[str, str]],
+                        trace: RequestTrace) -> str:
+    if OPENAI_CACHE_ENABLED:
+        cached = response_cache.get(customer_message, context)
+        if cached is not None:
+            send_whatsapp_message(sender_number, cached)
+            return cached
+
+    chunker = ReplyChunker(min_length=OPENAI_STREAM_MIN_CHUNK)
+    start = time.perf_counter()
+    first_chunk = True
+
+    def send(chunk: str) -> None:
+        nonlocal first_chunk
+        if first_chunk:
+            first_chunk = False
+            trace.observe("openai_first_chunk", time.perf_counter() - start)
+        send_whatsapp_message(sender_number, chunk)
+
     try:
-        if not to.startswith("+"):
-            logging.error(f"Invalid phone number format: {to}")
-            return
-        max_length = 1600
-        chunks = [body[i:i + max_length] for i in range(0, len(body), max_length)]
-        for chunk in chunks:
-            twilio_client.messages.create(
-                body=chunk,
-                from_=f"whatsapp:{TWILIO_PHONE_NUMBER}",
-                to=f"whatsapp:{to}"
-            )
-        logging.info(f"Message sent to {to}: {body[:50]}...")
+        answer = stream_reply(openai_completion_stream(customer_message, context), chunker, send)
     except Exception as e:
-        logging.error(f"Failed to send message to {to}: {e}")
-
-# Initialize session context per user
-def get_user_context(sender_number: str) -> List[Dict[str, str]]:
-    if sender_number not in session:
-        session[sender_number] = []
-    return session[sender_number]
-
-# Parse reminder request
-def parse_reminder(message: str) -> tuple[int, str, bool]:
-    pattern = r"remind me in (\d+) (minute|minutes|hour|hours|day|days)"
-    match = re.search(pattern, message.lower())
-    if match:
-        value, unit = int(match.group(1)), match.group(2)
-        if unit.startswith("minute"):
-            return value * 60, "minutes", True
-        elif unit.startswith("hour"):
-            return value * 3600, "hours", True
-        elif unit.startswith("day"):
-            return value * 24 * 3600, "days", True
-    return 0, "", False
-
-# Check if message is an ad reply
-def is_ad_reply(message: str) -> bool:
-    ad_keywords = ["know more", "tell me more", "about this", "interested", "details", "what’s this", "ad", "advertisement"]
-    purchase_keywords = ["buy", "order", "purchase", "pay", "eft", "transfer", "secure"]
-    return any(keyword in message.lower() for keyword in ad_keywords) and not any(keyword in message.lower() for keyword in purchase_keywords)
-
-# Follow-up and reminder thread
-def follow_up_and_reminder_thread():
-    while True:
-        with state_lock:
-            current_time = time.time()
-            for phone_number, state in list(user_states.items()):
-                last_message_time = state["last_message_time"]
-                follow_up_count = state.get("follow_up_count", 0)
-                if follow_up_count < 3 and current_time - last_message_time >= 12 * 3600:
-                    logging.info(f"Sending follow-up to {phone_number}, attempt {follow_up_count + 1}")
-                    send_whatsapp_message(phone_number, FOLLOW_UP_MESSAGE)
-                    state["follow_up_count"] = follow_up_count + 1
-                    state["last_message_time"] = current_time
-                    user_states[phone_number] = state
-                
-                reminder_time = state.get("reminder_time", 0)
-                reminder_text = state.get("reminder_text", "")
-                if reminder_time and current_time >= reminder_time:
-                    logging.info(f"Sending reminder to {phone_number}")
-                    send_whatsapp_message(phone_number, REMINDER_MESSAGE.format(reminder_text=reminder_text))
-                    state["reminder_time"] = 0
-                    state["reminder_text"] = ""
-                    user_states[phone_number] = state
-        time.sleep(60)
-
-# Promo thread
-def promo_thread():
-    while True:
-        with state_lock:
-            current_time = time.time()
-            for phone_number, state in list(user_states.items()):
-                last_promo_time = state.get("last_promo_time", 0)
-                if current_time - last_promo_time >= 2 * 24 * 3600:
-                    logging.info(f"Sending promo to {phone_number}")
-                    send_whatsapp_message(phone_number, PROMO_MESSAGE)
-                    state["last_promo_time"] = current_time
-                    user_states[phone_number] = state
-        time.sleep(3600)
-
-# Start background threads
-threading.Thread(target=follow_up_and_reminder_thread, daemon=True).start()
-threading.Thread(target=promo_thread, daemon=True).start()
-
-@app.route("/", methods=["GET"])
-def home():
-    return "Welcome to ANB Tech Supplies AI WhatsApp Assistant!"
+        logging.error(f"OpenAI streaming failed: {e}")
+        if chunker.emitted:
+            return "\n".join(chunker.emitted)
+        send_whatsapp_message(sender_number, OPENAI_ERROR_REPLY)
+        return OPENAI_ERROR_REPLY
+    if OPENAI_CACHE_ENABLED:
+        response_cache.put(customer_message, context, answer, time.perf_counter() - start)
+    return answer
+
+# Load stored conversation context per user, compacted to the prompt token budget
+def get_user_context(sender_number: str, customer_message: str) -> List[Dict[str, str]]:
+    appended, history = conversation_store.history(sender_number)
+    context = context_builder.build(sender_number, history, customer_message, appended) if CONTEXT_COMPACTION else history
+    prompt_tokens.observe(context_builder.prompt_tokens(context, customer_message))
+    return context
+
+# What the conversation history keeps of a reply: a short reference for long keyword replies
+def context_reference(intent: Intent, response_message: str) -> str:
+    if not CONTEXT_COMPACTION:
+        return response_message
+    if intent.name == "purchase_request":
+        offer = inventory.index.lookup(intent.model, intent.color, intent.storage)
+        if offer:
+            return f"[Quoted the {offer.model} ({offer.color}, {offer.storage}) at {format_rand(offer.price)} and sent the payment options]"
+    return CONTEXT_REFERENCES.get(intent.name, response_message)
+
+# Journal a user's state after changing it, or None after evicting the user; caller holds the user's lock
+def save_user_state(phone_number: str, state: Optional[UserState]) -> None:
+    if state_journal:
+        state_journal.append(user_record(phone_number, state.to_record() if state is not None else None))
+
+# Apply journal records to user_states and the sales ledger (which has its own lock); in the
+# scheduler leader this also arms timers for users whose messages other workers handled
+def apply_state_records(records) -> None:
+    for record in records:
+        if record["op"] == "user":
+            phone = record["phone"]
+            with user_states.lock(phone):
+                # Writes are journaled under this lock, so the check sees every write of this process
+                if state_journal.superseded(record):
+                    continue
+                apply_record(record, user_states, sales_ledger)
+                state = user_states.get(phone)
+                due_times = timer_due_times(state) if state is not None else None
+            if due_times:
+                schedule_user_timers(phone, due_times)
+        else:
+            apply_record(record, user_states, sales_ledger)
+
+# Polls apply one batch at a time and in journal order
+state_sync_lock = threading.Lock()
+
+# Pick up state written by other workers sharing the journal
+def sync_remote_state() -> None:
+    if state_journal:
+        with state_sync_lock:
+            apply_state_records(state_journal.poll())
+
+# Current user states and sales, for a journal snapshot
+def snapshot_state() -> Dict:
+    return {"users": user_states.snapshot(), "sales": sales_ledger.dump()}
+
+# Follow-up, reminder and promo timings
+FOLLOW_UP_INTERVAL = 12 * 3600
+MAX_FOLLOW_UPS = 3
+PROMO_INTERVAL = 2 * 24 * 3600
+
+# Scheduled jobs wait up to TIMER_LEASE_WAIT seconds for a user's lease, so one busy user does
+# not hold up every other timer; a follow-up or reminder that could not get it is retried
+# TIMER_LEASE_RETRY seconds later
+TIMER_LEASE_WAIT = 1.0
+TIMER_LEASE_RETRY = 30.0
+
+# Take a user's lease for a scheduled change to their state, then catch up on what other
+# workers wrote: the change is made to the user's latest state, never while a message of
+# theirs is being processed. None if leases are off or the lease stayed busy for `wait` seconds.
+def acquire_job_lease(phone_number: str, wait: float) -> Optional[str]:
+    if not USER_LEASES:
+        return None
+    token = state_backend.acquire(phone_number, wait)
+    if token is not None:
+        sync_remote_state()
+    return token
+
+# Scheduled follow-up: re-checks the user's state under their lease and lock, sends outside the lock
+def send_follow_up(phone_number: str, current_time: float):
+    lease = acquire_job_lease(phone_number, TIMER_LEASE_WAIT)
+    if USER_LEASES and lease is None:
+        return current_time + TIMER_LEASE_RETRY
+    try:
+        with user_states.lock(phone_number):
+            state = user_states.get(phone_number)
+            if state is None:
+                return None
+            follow_up_count = state.follow_up_count
+            if follow_up_count >= MAX_FOLLOW_UPS:
+                return None
+            if current_time - state.last_message_time < FOLLOW_UP_INTERVAL:
+                return state.last_message_time + FOLLOW_UP_INTERVAL
+            state.follow_up_count = follow_up_count + 1
+            state.last_message_time = current_time
+            save_user_state(phone_number, state)
+        logging.info(f"Sending follow-up to {phone_number}, attempt {follow_up_count + 1}")
+        send_whatsapp_message(phone_number, FOLLOW_UP_MESSAGE)
+        return current_time + FOLLOW_UP_INTERVAL if follow_up_count + 1 < MAX_FOLLOW_UPS else None
+    finally:
+        release_user_lease(phone_number, lease)
+
+# Scheduled reminder, under the user's lease like follow-ups
+def send_reminder(phone_number: str, current_time: float):
+    lease = acquire_job_lease(phone_number, TIMER_LEASE_WAIT)
+    if USER_LEASES and lease is None:
+        return current_time + TIMER_LEASE_RETRY
+    try:
+        with user_states.lock(phone_number):
+            state = user_states.get(phone_number)
+            if state is None:
+                return None
+            reminder_time = state.reminder_time
+            reminder_text = state.reminder_text
+            if not reminder_time:
+                return None
+            if current_time < reminder_time:
+                return reminder_time
+            state.reminder_time = 0
+            state.reminder_text = ""
+            save_user_state(phone_number, state)
+        logging.info(f"Sending reminder to {phone_number}")
+        send_whatsapp_message(phone_number, REMINDER_MESSAGE.format(reminder_text=reminder_text))
+        return None
+    finally:
+        release_user_lease(phone_number, lease)
+
+# Promo campaigns: every PROMO_CAMPAIGN_INTERVAL, users whose last promo is older than
+# PROMO_INTERVAL are sent PROMO_MESSAGE in batches under a messages-per-second budget.
+# Campaigns run where the users' state is kept, like their timers. CAMPAIGN_CHECKPOINT_DIR
+# belongs to the scheduler leader, so only its campaigns are resumed after a restart.
+PROMO_CAMPAIGN_INTERVAL = int(os.getenv("PROMO_CAMPAIGN_INTERVAL", 900))
+CAMPAIGN_RATE = float(os.getenv("CAMPAIGN_RATE", 20))
+CAMPAIGN_BATCH_SIZE = int(os.getenv("CAMPAIGN_BATCH_SIZE", 500))
+CAMPAIGN_CONCURRENCY = int(os.getenv("CAMPAIGN_CONCURRENCY", 8))
+CAMPAIGN_CHECKPOINT_DIR = os.getenv("CAMPAIGN_CHECKPOINT_DIR", "campaigns")
+
+# Skip users who got a promo since the campaign was planned (e.g. before a resume)
+def promo_recently_sent(phone_number: str) -> bool:
+    with user_states.lock(phone_number):
+        state = user_states.get(phone_number)
+        return state is None or time.time() - state.last_promo_time < PROMO_INTERVAL
+
+# Record a sent promo under the user's lease; the promo is already out, so after waiting
+# USER_LEASE_WAIT it is recorded without the lease rather than not at all
+def mark_promo_sent(phone_number: str, sent_time: float) -> None:
+    lease = acquire_job_lease(phone_number, USER_LEASE_WAIT)
+    try:
+        with user_states.lock(phone_number):
+            state = user_states.get(phone_number)
+            if state is not None:
+                state.last_promo_time = sent_time
+                save_user_state(phone_number, state)
+    finally:
+        release_user_lease(phone_number, lease)
+
+campaign_runner = CampaignRunner(
+    outbound_queue,
+    rate=CAMPAIGN_RATE,
+    batch_size=CAMPAIGN_BATCH_SIZE,
+    concurrency=CAMPAIGN_CONCURRENCY,
+    checkpoint_dir=CAMPAIGN_CHECKPOINT_DIR,
+    should_skip=promo_recently_sent,
+    on_sent=mark_promo_sent,
+)
 
-@app.route("/webhook", methods=["POST"])
-def webhook():
-    sender_number = request.form.get("From")
-    message_body = request.form.get("Body")
+# Scheduled promo campaign over every user due a promo
+def run_promo_campaign(subject: str, current_time: float):
+    if not campaign_runner.running:
+        recipients = user_states.collect(
+            lambda phone, state: phone if current_time - state.last_promo_time >= PROMO_INTERVAL else None)
+        if recipients:
+            logging.info(f"Starting promo campaign for {len(recipients)} users")
+            campaign_runner.start(f"promo-{int(current_time)}", recipients, PROMO_MESSAGE,
+                                  checkpoint=scheduler_leader.held)
+    return current_time + PROMO_CAMPAIGN_INTERVAL
+
+# Scheduled journal upkeep: tail other workers' writes
+def run_state_sync(subject: str, current_time: float):
+    try:
+        sync_remote_state()
+    except Exception as e:
+        logging.error(f"State sync failed: {e}")
+    return current_time + STATE_SYNC_INTERVAL
 
-    if not sender_number or not message_body:
-        logging.error("Invalid request: Missing 'From' or 'Body'.")
-        return jsonify({"status": "error", "message": "Invalid request"}), 400
+# Scheduled journal upkeep: fold the journal into a snapshot
+def run_state_compaction(subject: str, current_time: float):
+    try:
+        # Holding the sync lock keeps the snapshot level with the records polled so far
+        with state_sync_lock:
+            apply_state_records(state_journal.poll())
+            state_journal.compact(snapshot_state)
+    except Exception as e:
+        logging.error(f"State compaction failed: {e}")
+    return current_time + STATE_COMPACT_INTERVAL
+
+# Scheduled eviction of idle users whose follow-up cycle is over
+def run_state_eviction(subject: str, current_time: float):
+    def idle(phone: str, state: UserState) -> bool:
+        return (state.follow_up_count >= MAX_FOLLOW_UPS and not state.reminder_time
+                and current_time - state.last_message_time > USER_STATE_TTL)
 
-    sender_number = sender_number.replace("whatsapp:", "")
+    try:
+        # Judge idleness on the latest state, including messages other workers just handled
+        sync_remote_state()
+        evicted = user_states.evict(idle, lambda phone, state: save_user_state(phone, None))
+        if evicted and USER_STATE_ARCHIVE:
+            archive_users(evicted, current_time)
+        if evicted:
+            evicted_users.inc(amount=len(evicted))
+            logging.info(f"Evicted {len(evicted)} idle users")
+    except Exception as e:
+        logging.error(f"User state eviction failed: {e}")
+    return current_time + USER_STATE_SWEEP_INTERVAL
+
+# Append evicted users' last state to USER_STATE_ARCHIVE, one JSON object per line
+def archive_users(users: List[tuple[str, UserState]], evicted_at: float) -> None:
+    with open(USER_STATE_ARCHIVE, "a", encoding="utf-8") as f:
+        for phone, state in users:
+            f.write(json.dumps(dict(state.to_record(), phone=phone, evicted_at=evicted_at)) + "\n")
+
+# Timer due times for a user's state: (follow-up, reminder or 0)
+def timer_due_times(state: UserState) -> tuple[float, float]:
+    return state.last_message_time + FOLLOW_UP_INTERVAL, state.reminder_time
+
+# Jobs over the users' state (follow-ups, reminders, promo campaigns, idle-user eviction,
+# journal compaction) run where that state is kept: in the scheduler leader when workers share state, otherwise in
+# every worker for its own users
+def runs_state_jobs() -> bool:
+    return scheduler_leader.held or not state_backend.shared
+
+# Schedule a user's timers; call outside the user's lock. With shared state only the scheduler
+# leader runs timers, other workers hand theirs over through the shared state journal
+def schedule_user_timers(phone_number: str, due_times: tuple[float, float]) -> None:
+    if not runs_state_jobs():
+        return
+    follow_up_due, reminder_due = due_times
+    scheduler.schedule("follow_up", phone_number, follow_up_due)
+    if reminder_due:
+        scheduler.schedule("reminder", phone_number, reminder_due)
+
+# Rebuild user states and sales from the journal
+def restore_state() -> None:
+    start = time.perf_counter()
+    snapshot, tail = state_journal.load()
+    apply_state_records(snapshot_records(snapshot))
+    apply_state_records(tail)
+    logging.info(f"Restored {len(user_states)} users and {len(sales_ledger)} sales from the state journal in {time.perf_counter() - start:.2f}s")
+
+# Background scheduler for timers, promo campaigns and journal upkeep
+scheduler = TimerScheduler()
+scheduler.register("follow_up", send_follow_up)
+scheduler.register("reminder", send_reminder)
+scheduler.register("promo_campaign", run_promo_campaign)
+scheduler.register("state_sync", run_state_sync)
+scheduler.register("state_compact", run_state_compaction)
+scheduler.register("state_evict", run_state_eviction)
+
+# Arm every known user's timers, promo campaigns, the idle-user sweep and journal compaction,
+# and start the scheduler
+def start_state_jobs() -> None:
+    due = user_states.collect(lambda phone, state: (phone, timer_due_times(state)))
+    for phone, due_times in due:
+        schedule_user_timers(phone, due_times)
+    if USER_STATE_TTL:
+        scheduler.schedule("state_evict", "users", time.time() + USER_STATE_SWEEP_INTERVAL)
+    if state_journal:
+        scheduler.schedule("state_compact", "journal", time.time() + STATE_COMPACT_INTERVAL)
+    scheduler.schedule("promo_campaign", "all", time.time() + PROMO_CAMPAIGN_INTERVAL)
+    scheduler.start()
+
+# Leader duties: the state jobs and journal tailing when workers share state, and resuming
+# an interrupted promo campaign
+def start_schedulers() -> None:
+    sync_remote_state()
+    if state_backend.shared:
+        start_state_jobs()
+        scheduler.schedule("state_sync", "journal", time.time() + STATE_SYNC_INTERVAL)
+    campaign_runner.resume()
+    scheduler.start()
+
+# Only one process per host resumes promo campaigns (and, with shared state, runs the state
+# jobs for every user): whichever holds SCHEDULER_LOCK_PATH. The others keep retrying the
+# lock and take over if that process exits.
+SCHEDULER_LOCK_PATH = os.getenv("SCHEDULER_LOCK_PATH", "scheduler.lock")
+scheduler_leader = LeaderLock(SCHEDULER_LOCK_PATH, start_schedulers)
+
+_services_started = False
+_services_lock = threading.Lock()
+
+# Per-process startup, run on the first message instead of at import: restore state, start
+# the outbound workers and background summaries, import the OpenAI client in the
+# background, and stand for scheduler leader
+def start_services() -> None:
+    global _services_started
+    if _services_started:
+        return
+    with _services_lock:
+        if _services_started:
+            return
+        if state_journal:
+            if not state_journal.claim(STATE_JOURNAL_CLAIM_WAIT):
+                raise RuntimeError(f"Another process writes the state journal {STATE_JOURNAL_PATH}; "
+                                   "use STATE_BACKEND=sqlite to run several workers")
+            restore_state()
+            state_journal.start()
+            atexit.register(state_journal.stop)
+        if outbound_queue.transport is None:
+            outbound_queue.transport = create_outbound_transport()
+        outbound_queue.start()
+        context_builder.start()
+        threading.Thread(target=openai_module, name="openai-import", daemon=True).start()
+        if not state_backend.shared:
+            start_state_jobs()
+        scheduler_leader.start()
+        _services_started = True
+
+# Read sender and message from the Twilio webhook form; empty strings if either is missing
+def read_webhook_form(form) -> tuple[str, str]:
+    sender_number = form.get("From")
+    message_body = form.get("Body")
+    if not sender_number or not message_body:
+        return "", ""
+    return sender_number.replace("whatsapp:", ""), message_body
+
+# Check the sender's and the global token buckets; None lets the message through
+def rate_limited(sender_number: str) -> Optional[RateDecision]:
+    if rate_limiter is None:
+        return None
+    decision = rate_limiter.acquire(sender_number)
+    if decision.allowed:
+        return None
+    rate_limited_messages.inc(decision.reason)
+    webhook_requests.inc("rate_limited")
+    if decision.notify:
+        logging.warning(f"Rate limiting {sender_number} ({decision.reason} limit)")
+    return decision
+
+# Reply for an AI question shed while OpenAI is at OPENAI_MAX_IN_FLIGHT: a cached answer if there is one
+def shed_question(customer_message: str, context: List[Dict[str, str]]) -> str:
+    cached = response_cache.get(customer_message, context) if OPENAI_CACHE_ENABLED else None
+    if cached is not None:
+        return cached
+    shed_questions.inc()
+    return OPENAI_BUSY_REPLY
+
+# Take the sender's lease before touching their state, so their messages are processed one
+# at a time even across workers. None if leases are off, or if the lease was not free within
+# USER_LEASE_WAIT seconds; the message is then processed anyway rather than dropped.
+def acquire_user_lease(sender_number: str, trace: RequestTrace) -> Optional[str]:
+    if not USER_LEASES:
+        return None
+    wait_start = time.perf_counter()
+    token = state_backend.acquire(sender_number, USER_LEASE_WAIT)
+    trace.observe("lease_wait", time.perf_counter() - wait_start)
+    if token is None:
+        user_lease_timeouts.inc()
+        logging.warning(f"Processing a message from {sender_number} without their lease after waiting {USER_LEASE_WAIT}s")
+    return token
+
+# Hand the sender's lease to their next message; with the sqlite backend this first writes
+# out the journal, so the next holder sees this message's state
+def release_user_lease(sender_number: str, token: Optional[str]) -> None:
+    if token is not None:
+        state_backend.release(sender_number, token)
+
+# Reset follow-ups on reply and route the message
+def begin_message(sender_number: str, message_body: str, trace: RequestTrace) -> Intent:
     logging.info(f"Received message from {sender_number}: {message_body}")
+    start_services()
 
-    # Get or initialize user-specific context
-    context = get_user_context(sender_number)
-    response_message = ""
+    # Catch up on state other workers wrote (e.g. this user's previous message)
+    sync_remote_state()
 
     # Update user state on reply
-    with state_lock:
-        if sender_number in user_states:
-            user_states[sender_number]["follow_up_count"] = 0
+    wait_start = time.perf_counter()
+    with user_states.lock(sender_number):
+        trace.observe("lock_wait", time.perf_counter() - wait_start)
+        state = user_states.get(sender_number)
+        if state is not None:
+            state.follow_up_count = 0
+            save_user_state(sender_number, state)
             logging.info(f"Reset follow-up count for {sender_number}")
 
+    # Route the message once; branches below follow the router's precedence
+    with trace.time("parse"):
+        intent = intent_router.route(message_body)
+    intent_counter.inc(intent.name)
+    trace.tag("intent", intent.name)
+    return intent
+
+# Build the reply for keyword intents; None means the AI fallback should answer
+def reply_for_intent(sender_number: str, message_body: str, intent: Intent) -> Optional[str]:
+    response_message = None
+
     # Check for admin access and sales report
-    if is_admin(message_body):
+    if intent.name == "admin":
         response_message = generate_sales_report()
 
     # Check for payment confirmation
-    elif message_body.lower().startswith("paid"):
+    elif intent.name == "paid":
         parts = message_body.split(" ", 1)
         if len(parts) > 1:
             order_details = parts[1].strip()
-            with state_lock:
-                pending = [p for p in sales_data["pending"] if p["phone"] == sender_number]
-                if pending:
-                    sale = pending[0]
-                    sales_data["pending"].remove(sale)
-                    sale["date"] = datetime.now().strftime("%Y-%m-%d")
-                    sales_data["completed"].append(sale)
-                else:
-                    sales_data["completed"].append({
-                        "phone": sender_number,
-                        "item": order_details,
-                        "amount": 9599,  # Default price, adjust based on order
-                        "date": datetime.now().strftime("%Y-%m-%d")
-                    })
+            today = datetime.now().strftime("%Y-%m-%d")
+            if not sales_ledger.complete_pending(sender_number, today):
+                sales_ledger.add_completed(sender_number, order_details, 9599, today)  # Default price, adjust based on order
             response_message = "✅ Payment received! Thanks for your purchase.\nHow else can I assist you?"
         else:
             response_message = "Please include your order details after 'PAID' (e.g., 'PAID iPhone 12 Pro')."
 
     # Check for specific purchase request
-    elif parse_purchase_request(message_body)[4]:
-        model, color, storage, customer_price, is_specific = parse_purchase_request(message_body)
-        actual_price, is_valid = get_purchase_details(model, color, storage)
-        if is_valid:
-            response_message = f"✅ Your {model} ({color}, {storage})\n\n"
-            response_message += f"The {color} iPhone 13 is a stunning choice with a sleek design and powerful A15 Bionic chip.\n"
-            response_message += f"Price: R{actual_price}\n"
+    elif intent.name == "purchase_request":
+        model, color, storage, customer_price = intent.model, intent.color, intent.storage, intent.price
+        offer = inventory.index.lookup(model, color, storage)
+        if offer:
+            actual_price = offer.price
+            response_message = offer.details
             if customer_price and customer_price != actual_price:
                 response_message += f"(You mentioned R{customer_price}, but our price is R{actual_price})\n\n"
             else:
@@ -441,79 +980,332 @@ def webhook():
             response_message += "To proceed, let me know your payment option!\n"
             response_message += "Once paid, reply with 'PAID' and your order details."
             
-            with state_lock:
-                sales_data["pending"].append({
-                    "phone": sender_number,
-                    "item": f"{model} ({color}, {storage})",
-                    "amount": actual_price
-                })
+            sales_ledger.add_pending(sender_number, f"{offer.model} ({offer.color}, {offer.storage})", actual_price)
         else:
             response_message = f"Sorry, we don’t have {model} in {color} with {storage} available.\nCheck our full list with 'price' or ask me for alternatives!"
 
     # Check for reminder request
-    elif seconds := parse_reminder(message_body)[0]:
-        seconds, unit, is_reminder = parse_reminder(message_body)
-        if is_reminder:
-            response_message = REMINDER_CONFIRMATION.format(time_value=seconds // (60 if unit == "minutes" else 3600 if unit == "hours" else 24 * 3600), time_unit=unit)
+    elif intent.name == "reminder":
+        seconds, unit = intent.reminder_seconds, intent.reminder_unit
+        response_message = REMINDER_CONFIRMATION.format(time_value=seconds // (60 if unit == "minutes" else 3600 if unit == "hours" else 24 * 3600), time_unit=unit)
 
     # Purchase intent check (general)
-    elif any(keyword in message_body.lower() for keyword in ["buy", "order", "purchase", "pay", "eft", "transfer", "secure"]):
+    elif intent.name == "purchase":
         response_message = ORDER_FLOW
-        with state_lock:
-            sales_data["pending"].append({
-                "phone": sender_number,
-                "item": message_body.lower().split("buy ")[-1] if "buy" in message_body.lower() else "Pending item",
-                "amount": 9599
-            })
+        item = intent.text.split("buy ")[-1] if "buy" in intent.text else "Pending item"
+        sales_ledger.add_pending(sender_number, item, 9599)
 
     # Check for ad reply
-    elif is_ad_reply(message_body):
+    elif intent.name == "ad_reply":
         response_message = AD_RESPONSE
 
     # Other keyword-based responses
-    elif any(keyword in message_body.lower() for keyword in ["price", "model", "discount", "cost"]):
-        response_message = PRICE_LIST
-    elif any(keyword in message_body.lower() for keyword in ["recommend", "suggest", "bundle", "accessories"]):
+    elif intent.name == "price":
+        response_message = inventory.index.price_list
+    elif intent.name == "recommend":
         response_message = RECOMMENDATIONS
-    elif any(keyword in message_body.lower() for keyword in ["installment", "installments", "monthly", "plan"]):
+    elif intent.name == "installment":
         response_message = INSTALLMENT_PLAN
-    elif any(keyword in message_body.lower() for keyword in ["picture", "pictures", "image", "images", "see", "look"]):
+    elif intent.name == "picture":
         response_message = PICTURE_LINK
-    # Fallback to AI
+    return response_message
+
+# Everything before the AI call: route the message, reply to keywords and, when the AI has to
+# answer, read the conversation context for it (None otherwise)
+def prepare_message(sender_number: str, message_body: str,
+                    trace: RequestTrace) -> tuple[Intent, Optional[str], Optional[List[Dict[str, str]]]]:
+    intent = begin_message(sender_number, message_body, trace)
+    response_message = reply_for_intent(sender_number, message_body, intent)
+    context = get_user_context(sender_number, message_body) if response_message is None else None
+    return intent, response_message, context
+
+# Record the exchange, update user state and reschedule timers
+def finish_message(sender_number: str, message_body: str, intent: Intent, response_message: str,
+                   trace: RequestTrace) -> None:
+    # Update context
+    conversation_store.append(sender_number, "user", message_body)
+    conversation_store.append(sender_number, "assistant", context_reference(intent, response_message))
+
+    # Update user state
+    wait_start = time.perf_counter()
+    with user_states.lock(sender_number):
+        trace.observe("lock_wait", time.perf_counter() - wait_start)
+        state = user_states.get(sender_number)
+        if state is None:
+            state = user_states[sender_number] = UserState()
+        if intent.reminder_unit and "about" in intent.text:
+            seconds, reminder_text = intent.reminder_seconds, intent.reminder_text
+            state.reminder_time = time.time() + seconds
+            state.reminder_text = reminder_text
+            logging.info(f"Set reminder for {sender_number} in {seconds} seconds: {reminder_text}")
+        state.last_message_time = time.time()
+        state.follow_up_count = 0
+        # The intent that produced the reply ("ai" for AI answers) stands in for its text
+        state.last_response = intent.name
+        save_user_state(sender_number, state)
+        due_times = timer_due_times(state)
+
+    # Reschedule timers outside the user's lock
+    schedule_user_timers(sender_number, due_times)
+
+@routes.route("/", methods=["GET"])
+def home():
+    return "Welcome to ANB Tech Supplies AI WhatsApp Assistant!"
+
+# Response for a redelivered message: the first delivery's, once it has finished
+def duplicate_delivery(message_sid: str) -> tuple[int, dict]:
+    webhook_requests.inc("duplicate")
+    logging.info(f"Duplicate delivery of {message_sid}, replaying its response")
+    result = idempotency.result(message_sid, IDEMPOTENCY_WAIT)
+    if result is None:
+        return 200, {"status": "processing"}
+    return result
+
+@routes.route("/webhook", methods=["POST"])
+def webhook():
+    message_sid = request.form.get("MessageSid")
+    if idempotency is None or not message_sid:
+        status, body = handle_webhook(request.form)
+    elif not idempotency.begin(message_sid):
+        status, body = duplicate_delivery(message_sid)
+    else:
+        try:
+            status, body = handle_webhook(request.form)
+        except Exception:
+            idempotency.release(message_sid)
+            raise
+        idempotency.finish(message_sid, status, body)
+    return jsonify(body), status
+
+# Route one message, reply and update state; the caller holds the sender's lease
+def process_message(sender_number: str, message_body: str, trace: RequestTrace) -> str:
+    intent, response_message, context = prepare_message(sender_number, message_body, trace)
+
+    # Fallback to AI, unless too many AI calls are in flight; a streamed answer has already been sent chunk by chunk
+    streamed = False
+    if response_message is None:
+        if not openai_in_flight.try_acquire():
+            response_message = shed_question(message_body, context)
+        else:
+            streamed = OPENAI_STREAMING
+            try:
+                with trace.time("openai"):
+                    if streamed:
+                        response_message = stream_openai_reply(sender_number, message_body, context, trace)
+                    else:
+                        response_message = query_openai(message_body, context)
+            finally:
+                openai_in_flight.release()
+
+    finish_message(sender_number, message_body, intent, response_message, trace)
+
+    # Send response
+    if not streamed:
+        send_whatsapp_message(sender_number, response_message)
+    return response_message
+
+# Process one inbound message under the sender's lease
+def handle_webhook(form) -> tuple[int, dict]:
+    trace = metrics.trace()
+    sender_number, message_body = read_webhook_form(form)
+    if not sender_number:
+        logging.error("Invalid request: Missing 'From' or 'Body'.")
+        webhook_requests.inc("invalid")
+        return 400, {"status": "error", "message": "Invalid request"}
+
+    refusal = rate_limited(sender_number)
+    if refusal is not None:
+        if refusal.notify and RATE_LIMIT_ACTION == "reply":
+            send_whatsapp_message(sender_number, RATE_LIMIT_REPLY)
+        return 200, {"status": "rate_limited"}
+
+    lease = acquire_user_lease(sender_number, trace)
+    try:
+        response_message = process_message(sender_number, message_body, trace)
+    finally:
+        release_user_lease(sender_number, lease)
+
+    trace.finish()
+    webhook_requests.inc("ok")
+    return 200, {"status": "success", "response": response_message}
+
+# Sends still running after an early-acked async webhook returned
+background_sends = set()
+
+# Send WhatsApp message from the event loop
+async def send_whatsapp_message_async(to: str, body: str) -> None:
+    if not to.startswith("+"):
+        logging.error(f"Invalid phone number format: {to}")
+        return
+    if ACK_WEBHOOK_EARLY:
+        task = asyncio.create_task(get_async_twilio().send_message(to, body))
+        background_sends.add(task)
+        task.add_done_callback(background_sends.discard)
     else:
-        response_message = query_openai(message_body, context)
+        await get_async_twilio().send_message(to, body)
+
+# Async variant of stream_openai_reply for the ASGI webhook
+async def stream_openai_reply_async(sender_number: str, customer_message: str, context: List[Dict[str, str]],
+                                    trace: RequestTrace) -> str:
+    if OPENAI_CACHE_ENABLED:
+        cached = response_cache.get(customer_message, context)
+        if cached is not None:
+            await send_whatsapp_message_async(sender_number, cached)
+            return cached
+
+    messages = [context_builder.system_message] + context + [{"role": "user", "content": customer_message}]
+    chunker = ReplyChunker(min_length=OPENAI_STREAM_MIN_CHUNK)
+    start = time.perf_counter()
+    first_chunk = True
+
+    async def send(chunk: str) -> None:
+        nonlocal first_chunk
+        if first_chunk:
+            first_chunk = False
+            trace.observe("openai_first_chunk", time.perf_counter() - start)
+        await send_whatsapp_message_async(sender_number, chunk)
 
-    # Update context
-    context.append({"role": "user", "content": message_body})
-    context.append({"role": "assistant", "content": response_message})
-    if len(context) > 20:
-        context = context[-20:]
-    session[sender_number] = context
+    try:
+        answer = await stream_reply_async(get_async_openai().chat_stream(messages), chunker, send)
+    except Exception as e:
+        logging.error(f"OpenAI streaming failed: {e}")
+        if chunker.emitted:
+            return "\n".join(chunker.emitted)
+        await send_whatsapp_message_async(sender_number, OPENAI_ERROR_REPLY)
+        return OPENAI_ERROR_REPLY
+    if OPENAI_CACHE_ENABLED:
+        response_cache.put(customer_message, context, answer, time.perf_counter() - start)
+    return answer
+
+# Run a blocking call that claims something (a lease, a delivery) off the event loop. If the
+# request is cancelled meanwhile, e.g. the client disconnected, the call still completes on
+# its thread and `undo` then hands back whatever it claimed.
+async def claim_off_loop(executor: Optional[ThreadPoolExecutor], undo, func, *args):
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, func, *args)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.add_done_callback(
+            lambda done: done.cancelled() or done.exception() is not None or loop.run_in_executor(None, undo, done.result()))
+        raise
+
+# Async webhook: same flow as webhook(), with OpenAI and Twilio I/O awaited on the event loop
+# and the blocking state and delivery-record calls run in threads
+async def webhook_async(form: Dict[str, str]) -> tuple[int, dict]:
+    message_sid = form.get("MessageSid")
+    if idempotency is None or not message_sid:
+        return await handle_webhook_async(form)
+    undo = lambda started: started and idempotency.release(message_sid)
+    if not await claim_off_loop(None, undo, idempotency.begin, message_sid):
+        return await asyncio.get_running_loop().run_in_executor(duplicate_waiters, duplicate_delivery, message_sid)
+    try:
+        status, body = await handle_webhook_async(form)
+    except BaseException:  # including cancellation when the client disconnects
+        await asyncio.shield(asyncio.to_thread(idempotency.release, message_sid))
+        raise
+    await asyncio.to_thread(idempotency.finish, message_sid, status, body)
+    return status, body
+
+# Async variant of process_message
+async def process_message_async(sender_number: str, message_body: str, trace: RequestTrace) -> str:
+    intent, response_message, context = await asyncio.to_thread(prepare_message, sender_number, message_body, trace)
+
+    # Fallback to AI, unless too many AI calls are in flight; a streamed answer has already been sent chunk by chunk
+    streamed = False
+    if response_message is None:
+        if not openai_in_flight.try_acquire():
+            response_message = shed_question(message_body, context)
+        else:
+            streamed = OPENAI_STREAMING
+            try:
+                with trace.time("openai"):
+                    if streamed:
+                        response_message = await stream_openai_reply_async(sender_number, message_body, context, trace)
+                    else:
+                        response_message = await query_openai_async(message_body, context)
+            finally:
+                openai_in_flight.release()
+
+    await asyncio.to_thread(finish_message, sender_number, message_body, intent, response_message, trace)
 
     # Send response
-    send_whatsapp_message(sender_number, response_message)
+    if not streamed:
+        await send_whatsapp_message_async(sender_number, response_message)
+    return response_message
+
+# Async variant of handle_webhook
+async def handle_webhook_async(form: Dict[str, str]) -> tuple[int, dict]:
+    trace = metrics.trace()
+    sender_number, message_body = read_webhook_form(form)
+    if not sender_number:
+        logging.error("Invalid request: Missing 'From' or 'Body'.")
+        webhook_requests.inc("invalid")
+        return 400, {"status": "error", "message": "Invalid request"}
 
-    # Update user state
-    with state_lock:
-        state = user_states.get(sender_number, {})
-        if parse_reminder(message_body)[2] and "about" in message_body.lower():
-            seconds, unit, _ = parse_reminder(message_body)
-            reminder_text = message_body.split("about", 1)[1].strip()
-            state.update({
-                "reminder_time": time.time() + seconds,
-                "reminder_text": reminder_text
-            })
-            logging.info(f"Set reminder for {sender_number} in {seconds} seconds: {reminder_text}")
-        state.update({
-            "last_message_time": time.time(),
-            "follow_up_count": 0,
-            "last_message": response_message,
-            "last_promo_time": state.get("last_promo_time", 0)
-        })
-        user_states[sender_number] = state
-        logging.info(f"Updated state for {sender_number}: {state}")
-
-    return jsonify({"status": "success", "response": response_message})
+    refusal = rate_limited(sender_number)
+    if refusal is not None:
+        if refusal.notify and RATE_LIMIT_ACTION == "reply":
+            await send_whatsapp_message_async(sender_number, RATE_LIMIT_REPLY)
+        return 200, {"status": "rate_limited"}
+
+    lease = await claim_off_loop(lease_waiters, lambda token: release_user_lease(sender_number, token),
+                                 acquire_user_lease, sender_number, trace)
+    try:
+        response_message = await process_message_async(sender_number, message_body, trace)
+    finally:
+        await asyncio.shield(asyncio.to_thread(release_user_lease, sender_number, lease))
+
+    trace.finish()
+    webhook_requests.inc("ok")
+    return 200, {"status": "success", "response": response_message}
+
+# Gauges are read when /metrics is scraped
+metrics.gauge("users", "Users with stored state", lambda: len(user_states))
+metrics.gauge("outbound_queue_depth", "Messages queued or being sent", outbound_queue.pending)
+metrics.gauge("scheduled_jobs", "Pending follow-up, reminder and maintenance timers", lambda: len(scheduler))
+metrics.gauge("async_background_sends", "Async replies still being delivered", lambda: len(background_sends))
+metrics.gauge("openai_cache_entries", "Cached AI answers", lambda: response_cache.snapshot()["entries"])
+metrics.gauge("openai_cache_hit_ratio", "Share of AI lookups served from cache", lambda: response_cache.snapshot()["hit_ratio"])
+metrics.gauge("openai_in_flight", "AI calls in progress", lambda: openai_in_flight.in_flight)
+metrics.gauge("user_leases", "Senders whose messages this process is processing or queueing", lambda: len(state_backend))
+metrics.gauge("rate_limit_senders", "Senders with a rate limit bucket", lambda: len(rate_limiter) if rate_limiter is not None else 0)
+
+@routes.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Close pooled clients after in-flight sends finish
+async def close_async_clients() -> None:
+    if background_sends:
+        await asyncio.gather(*background_sends, return_exceptions=True)
+    if async_openai is not None:
+        await async_openai.aclose()
+    if async_twilio is not None:
+        await async_twilio.aclose()
+
+# App factory; cheap to call, since state, clients and background threads start with the
+# first message (gunicorn 'app:create_app()', or gunicorn app:app for the default instance)
+def create_app() -> Flask:
+    flask_app = Flask(__name__)
+    flask_app.secret_key = os.getenv("FLASK_SECRET_KEY", "your-secret-key-here")
+    flask_app.register_blueprint(routes)
+    return flask_app
+
+app = create_app()
+
+async def start_services_async() -> None:
+    await asyncio.to_thread(start_services)
+
+# ASGI entry point (uvicorn app:asgi_app): /webhook runs on the event loop, other routes fall
+# through to Flask. Built on first access, so WSGI workers skip importing asgiref.
+def __getattr__(name: str):
+    if name == "asgi_app":
+        from asgiref.wsgi import WsgiToAsgi
+        globals()["asgi_app"] = create_asgi_app({"/webhook": webhook_async}, fallback=WsgiToAsgi(app),
+                                                on_startup=[start_services_async], on_shutdown=[close_async_clients])
+        return globals()["asgi_app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # For Render: Use environment-provided port
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+# An async route handler gets the decoded form fields and returns (status, JSON payload)
+AsyncHandler = Callable[[Dict[str, str]], Awaitable[Tuple[int, dict]]]
+
+
+# Read the whole request body from the ASGI receive channel
+async def _read_body(receive) -> bytes:
+    body = b""
+    more = True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    return body
+
+
+async def _send_json(send, status: int, payload: dict) -> None:
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# Minimal ASGI app serving form-encoded POST routes on the event loop. Any other
+# request goes to `fallback` (e.g. the Flask app wrapped with asgiref's WsgiToAsgi).
+def create_asgi_app(routes: Dict[str, AsyncHandler], fallback=None,
+                    on_startup: Optional[List[Callable[[], Awaitable[None]]]] = None,
+                    on_shutdown: Optional[List[Callable[[], Awaitable[None]]]] = None):
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    for hook in on_startup or []:
+                        await hook()
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    for hook in on_shutdown or []:
+                        await hook()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        handler = routes.get(scope.get("path", ""))
+        if scope["type"] == "http" and handler and scope["method"] == "POST":
+            body = await _read_body(receive)
+            form = {key: values[0] for key, values in parse_qs(body.decode("utf-8", "replace")).items()}
+            try:
+                status, payload = await handler(form)
+            except Exception as e:
+                logging.error(f"Async handler for {scope['path']} failed: {e}")
+                status, payload = 500, {"status": "error", "message": "Internal error"}
+            await _send_json(send, status, payload)
+        elif fallback is not None:
+            await fallback(scope, receive, send)
+        else:
+            await _send_json(send, 404, {"status": "error", "message": "Not found"})
+
+    return app
@@ -0,0 +1,114 @@
+# Promo campaign throughput against a fake Twilio transport: the old serial loop
+# vs CampaignRunner batches under a messages-per-second budget. Also interrupts a
+# campaign mid-way and resumes it from its checkpoint, checking nobody gets the
+# promo twice and users with a reply already queued are skipped.
+#
+#   python benchmarks/bench_campaigns.py --users 5000 --latency 0.05 --rate 200
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from campaigns import CampaignRunner
+from outbound import FakeTransport, OutboundQueue
+
+PROMO = "🎉 Special Offer! Get 5% off your next iPhone this week only."
+
+
+def run_serial(phones, latency):
+    transport = FakeTransport(latency=latency)
+    sender = OutboundQueue(transport, workers=1)
+    start = time.perf_counter()
+    for phone in phones:
+        sender.send_now(phone, PROMO)
+    return len(transport.sent) / (time.perf_counter() - start)
+
+
+def run_campaign(phones, args, checkpoint_dir):
+    transport = FakeTransport(latency=args.latency, rate_limit_every=args.rate_limit_every)
+    sender = OutboundQueue(transport, workers=4, backoff_base=0.01)
+    runner = CampaignRunner(sender, rate=args.rate, batch_size=args.batch_size,
+                            concurrency=args.concurrency, checkpoint_dir=checkpoint_dir)
+    return runner.run("bench", phones, PROMO)
+
+
+# Holds conversational replies until released, so they stay queued during the campaign
+class HeldRepliesTransport(FakeTransport):
+    def __init__(self, latency):
+        super().__init__(latency=latency)
+        self.release = threading.Event()
+
+    def send(self, to, body):
+        if body != PROMO:
+            self.release.wait()
+        super().send(to, body)
+
+
+def run_interrupted(phones, args, checkpoint_dir):
+    transport = HeldRepliesTransport(args.latency)
+    sender = OutboundQueue(transport, workers=4, max_pending=len(phones))
+    sender.start()
+    queued = phones[::50]
+    for phone in queued:
+        sender.enqueue(phone, "✅ Payment received!")
+
+    promoted = set()
+    lock = threading.Lock()
+
+    def on_sent(phone, _):
+        with lock:
+            promoted.add(phone)
+
+    def make_runner():
+        return CampaignRunner(sender, rate=args.rate, batch_size=args.batch_size, concurrency=args.concurrency,
+                              checkpoint_dir=checkpoint_dir, should_skip=promoted.__contains__, on_sent=on_sent)
+
+    first = make_runner()
+    first.start("interrupted", phones, PROMO)
+    time.sleep(len(phones) / args.rate / 3)
+    first.stop()
+    paused = dict(first.history[-1])
+    resumed = make_runner()
+    resumed.resume()
+    resumed.join()
+    transport.release.set()
+    sender.join()
+    sender.stop()
+    counts = Counter(to for to, body in transport.sent if body == PROMO)
+    return paused, resumed.history[-1], counts, len(queued)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=200)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    args = parser.parse_args()
+
+    phones = [f"+2771{i:07d}" for i in range(args.users)]
+    serial_rate = run_serial(phones[:200], args.latency)
+    print(f"serial loop: {serial_rate:.1f} msg/s -> 50k users in {50000 / serial_rate / 3600:.1f}h")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        metrics = run_campaign(phones, args, tmp)
+        print(f"campaign: {metrics['sent']} sent, {metrics['failed']} failed in {metrics['elapsed']:.1f}s "
+              f"-> {metrics['sent_per_sec']:.1f} msg/s (budget {args.rate:.0f}/s) "
+              f"-> 50k users in {50000 / metrics['sent_per_sec'] / 60:.1f}min")
+
+        paused, resumed, counts, queued = run_interrupted(phones, args, tmp)
+        print(f"interrupted after {paused['next_batch']} batches ({paused['sent']} sent), resumed: "
+              f"{resumed['sent']} sent, {resumed['skipped']} skipped; "
+              f"{len(counts)} users promoted, {sum(1 for c in counts.values() if c > 1)} twice, "
+              f"{queued} had a reply queued")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Cold start of a worker process: time to import app.py and to be ready for requests
+# (after the services gunicorn.conf.py starts in each worker), then latency of the first
+# keyword reply and the first AI reply (OpenAI and Twilio served by the local stub),
+# each measured in a fresh interpreter. --workers processes are also started side by
+# side on one scheduler lock, counting how many of them run the background schedulers
+# (follow-ups, reminders, promo campaigns) -- there should be exactly one.
+# Point --root at another checkout (e.g. a git worktree) to compare revisions.
+#
+#   python benchmarks/bench_cold_start.py --runs 5 --workers 4
+#   git worktree add /tmp/before HEAD~1 && python benchmarks/bench_cold_start.py --root /tmp/before
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_loader import BENCH_ENV, ROOT
+from stub_servers import start_stub_server
+
+# Runs in the fresh interpreter: argv is (root, hold seconds)
+CHILD = r"""
+import importlib.util, json, os, sys, threading, time
+start = time.perf_counter()
+root, hold = sys.argv[1], float(sys.argv[2])
+sys.path.insert(0, root)
+spec = importlib.util.spec_from_file_location("whatsapp_app", os.path.join(root, "app.py"))
+app = importlib.util.module_from_spec(spec)
+sys.modules["whatsapp_app"] = app
+spec.loader.exec_module(app)
+imported = time.perf_counter()
+threads = threading.active_count()
+# What gunicorn.conf.py's post_worker_init hook does before the worker takes requests
+if hasattr(app, "start_services"):
+    app.start_services()
+ready = time.perf_counter()
+client = app.app.test_client()
+
+def post(sender, body):
+    begin = time.perf_counter()
+    client.post("/webhook", data={"From": f"whatsapp:{sender}", "Body": body})
+    return time.perf_counter() - begin
+
+keyword = post("+27710000001", "what is the price")
+ai = post("+27710000002", "how long is the warranty")
+app.outbound_queue.join()
+time.sleep(hold)
+leader = getattr(app, "scheduler_leader", None)
+print(json.dumps({"import": imported - start, "ready": ready - start, "keyword": keyword, "ai": ai,
+                  "threads_after_import": threads, "modules_after_import": len(sys.modules), "schedulers": leader.held if leader else True}))
+"""
+
+
+def child_env(port, workdir):
+    env = dict(os.environ, **BENCH_ENV)
+    env.update({
+        "OPENAI_API_BASE": f"http://127.0.0.1:{port}/v1",
+        "TWILIO_API_BASE": f"http://127.0.0.1:{port}",
+        "CONTEXT_SUMMARIES": "False",
+        "CAMPAIGN_CHECKPOINT_DIR": os.path.join(workdir, "campaigns"),
+        "SCHEDULER_LOCK_PATH": os.path.join(workdir, "scheduler.lock"),
+    })
+    return env
+
+
+def spawn(root, env, workdir, hold=0.0):
+    return subprocess.Popen([sys.executable, "-c", CHILD, root, str(hold)], env=env, cwd=workdir,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+
+def collect(process):
+    out, _ = process.communicate()
+    if process.returncode:
+        raise RuntimeError(f"worker exited with status {process.returncode}")
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=ROOT, help="checkout whose app.py is measured")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    port, _ = start_stub_server(0, openai_latency=0.0, twilio_latency=0.0)
+    runs = []
+    for _ in range(args.runs):
+        workdir = tempfile.mkdtemp()
+        start = time.perf_counter()
+        result = collect(spawn(args.root, child_env(port, workdir), workdir))
+        result["process"] = time.perf_counter() - start
+        runs.append(result)
+
+    print(f"{args.root}: median of {args.runs} fresh processes")
+    for key, label in [("import", "import app.py"), ("ready", "worker ready"), ("keyword", "first keyword reply"),
+                       ("ai", "first AI reply"), ("process", "process start to exit")]:
+        print(f"  {label:<22} {statistics.median(run[key] for run in runs) * 1e3:8.1f}ms")
+    print(f"  threads after import   {runs[0]['threads_after_import']:8d}")
+    print(f"  modules after import   {runs[0]['modules_after_import']:8d}")
+
+    workdir = tempfile.mkdtemp()
+    env = child_env(port, workdir)
+    workers = [spawn(args.root, env, workdir, hold=1.0) for _ in range(args.workers)]
+    running = sum(collect(worker)["schedulers"] for worker in workers)
+    print(f"  {args.workers} workers on one host: {running} running the schedulers")
+
+
+if __name__ == "__main__":
+    main()
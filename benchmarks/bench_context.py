@@ -0,0 +1,123 @@
+# Prompt size of AI requests over replayed conversations, with the full stored history
+# (CONTEXT_COMPACTION off) against token-budgeted context building. Conversations mix
+# keyword requests (price list, order flow, installments...) with free-form questions
+# answered by a stub completion. OpenAI latency is modelled from prompt size as
+# --base-latency plus --prefill-ms per prompt token, so no calls or sleeps are made.
+#
+#   python benchmarks/bench_context.py --users 200 --messages 30
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai
+
+from app_loader import load_app_module
+from context_builder import ContextBuilder
+from conversation_store import MemoryConversationStore
+
+KEYWORD_MESSAGES = [
+    "what is the price", "do you have a monthly plan", "recommend a bundle", "can I see pictures",
+    "I want to buy an iPhone 13", "Hi, I’m interested in buying an iPhone 14 Pro (Deep Purple, 256GB)",
+    "Hi, I’m interested in buying an iPhone 13 (Pink, 128GB)",
+]
+AI_MESSAGES = [
+    "does the iphone 13 have face id", "how long is the warranty", "do you deliver to Durban",
+    "is the battery original", "which one has the better camera", "can I trade in my old phone",
+    "how long does delivery take", "what is the difference between the pro and the pro max",
+]
+AI_ANSWER = ("Yes! All our iPhones come with a 12-month warranty and original batteries. "
+             "Delivery takes 3-5 working days nationwide. Would you like me to reserve one for you?")
+
+
+# Recorded conversations: each user sends `messages` messages, roughly half of them keyword requests
+def conversations(users, messages, rng):
+    return [[rng.choice(KEYWORD_MESSAGES if rng.random() < 0.5 else AI_MESSAGES) for _ in range(messages)]
+            for _ in range(users)]
+
+
+class StubCompletion:
+    def __init__(self, counter):
+        self.counter = counter
+        self.prompt_tokens = []
+        self.summary_tokens = []
+
+    def create(self, model, messages, **kwargs):
+        tokens = self.counter.messages(messages)
+        if messages[0]["content"].startswith("Summarize"):
+            self.summary_tokens.append(tokens)
+            content = "The customer asked about iPhone prices, warranty and delivery, and was quoted an iPhone 13."
+        else:
+            self.prompt_tokens.append(tokens)
+            content = AI_ANSWER
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def replay(app, recorded, compaction):
+    app.CONTEXT_COMPACTION = compaction
+    app.conversation_store = MemoryConversationStore(max_turns=app.CONVERSATION_MAX_TURNS)
+    app.context_builder.stop()
+    app.context_builder = ContextBuilder(app.AI_PROMPT, max_prompt_tokens=app.OPENAI_MAX_PROMPT_TOKENS,
+                                         keep_turns=app.CONTEXT_KEEP_TURNS, summarize=app.summarize_conversation,
+                                         summarize_batch=app.CONTEXT_SUMMARY_BATCH)
+    app.context_builder.start()
+    stub = StubCompletion(app.context_builder.counter)
+    openai.ChatCompletion.create = stub.create
+
+    build_seconds = 0.0
+    for index, messages in enumerate(recorded):
+        sender = f"+2773{index:07d}"
+        for message in messages:
+            trace = app.metrics.trace()
+            intent = app.begin_message(sender, message, trace)
+            response = app.reply_for_intent(sender, message, intent)
+            if response is None:
+                start = time.perf_counter()
+                context = app.get_user_context(sender, message)
+                build_seconds += time.perf_counter() - start
+                response = app.query_openai(message, context)
+            app.finish_message(sender, message, intent, response, trace)
+            # Customers take a while to reply; let background summaries land in between
+            app.context_builder.join()
+    return stub, build_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=30)
+    parser.add_argument("--base-latency", type=float, default=0.35)
+    parser.add_argument("--prefill-ms", type=float, default=0.25)
+    args = parser.parse_args()
+
+    app = load_app_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    app.OPENAI_CACHE_ENABLED = False
+    app.OPENAI_STREAMING = False
+    recorded = conversations(args.users, args.messages, random.Random(14))
+
+    results = {}
+    for label, compaction in [("full history", False), ("token-budgeted", True)]:
+        stub, build_seconds = replay(app, recorded, compaction)
+        tokens = sorted(stub.prompt_tokens)
+        latency = [args.base_latency + t * args.prefill_ms / 1000 for t in tokens]
+        results[label] = statistics.mean(tokens), statistics.mean(latency)
+        print(f"{label:<15} {len(tokens)} AI requests | prompt tokens mean {statistics.mean(tokens):,.0f} "
+              f"p95 {tokens[int(len(tokens) * 0.95)]:,} max {tokens[-1]:,} | "
+              f"modelled OpenAI latency {statistics.mean(latency) * 1e3:,.0f} ms | "
+              f"summaries {len(stub.summary_tokens)} ({sum(stub.summary_tokens):,} tokens) | "
+              f"context build {build_seconds / len(tokens) * 1e6:.1f} us")
+    (full_tokens, full_latency), (budget_tokens, budget_latency) = results.values()
+    print(f"prompt tokens -{(1 - budget_tokens / full_tokens) * 100:.0f}%, "
+          f"modelled latency -{(1 - budget_latency / full_latency) * 100:.0f}%")
+    app.context_builder.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Memory footprint and lookup latency of the conversation stores at 100k users.
+#
+#   python benchmarks/bench_conversation_store.py --users 100000 --turns 20
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_store import MemoryConversationStore, SQLiteConversationStore
+
+REPLIES = [
+    "The iPhone 13 (128GB) is R7,549. Would you like to order?",
+    "Yes, we deliver nationwide within 3-5 working days.",
+    "We have Pink, Blue, Midnight, Starlight, Red and Green in stock.",
+]
+
+
+def fill(store, users, turns):
+    for i in range(users):
+        phone = f"+2771{i:07d}"
+        for turn in range(turns // 2):
+            store.append(phone, "user", f"question {turn} from {phone}")
+            store.append(phone, "assistant", REPLIES[turn % len(REPLIES)])
+
+
+def latency(store, users, lookups):
+    samples = []
+    for _ in range(lookups):
+        phone = f"+2771{random.randrange(users):07d}"
+        start = time.perf_counter()
+        store.get(phone)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--skip-sqlite", action="store_true")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = MemoryConversationStore(max_turns=args.turns, max_users=args.users)
+    start = time.perf_counter()
+    fill(store, args.users, args.turns)
+    fill_time = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    p50, p99 = latency(store, args.users, args.lookups)
+    print(f"memory: {args.users} users x {args.turns} turns, {used / 2**20:.1f} MiB "
+          f"({used / args.users:.0f} B/user), fill {fill_time:.1f}s, "
+          f"get p50 {p50 * 1e6:.1f}us p99 {p99 * 1e6:.1f}us")
+
+    if args.skip_sqlite:
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "conversations.db")
+        store = SQLiteConversationStore(path, max_turns=args.turns)
+        start = time.perf_counter()
+        fill(store, args.users, args.turns)
+        fill_time = time.perf_counter() - start
+        p50, p99 = latency(store, args.users, args.lookups)
+        store.close()
+        print(f"sqlite: {args.users} users x {args.turns} turns, {os.path.getsize(path) / 2**20:.1f} MiB on disk, "
+              f"fill {fill_time:.1f}s, get p50 {p50 * 1e6:.1f}us p99 {p99 * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
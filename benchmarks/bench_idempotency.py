@@ -0,0 +1,113 @@
+# Replays bursty duplicate webhook deliveries, as Twilio sends when a webhook is
+# slow: every message arrives once plus up to --max-duplicates redeliveries, some
+# while the first is still in flight and some after it finished. Compares upstream
+# work (OpenAI calls, WhatsApp sends, pending sales) with no deduplication and with
+# the memory and SQLite MessageSid stores, and checks duplicates got the same response.
+#
+#   python benchmarks/bench_idempotency.py --messages 200 --openai-latency 0.2
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_loader import load_app_module
+from idempotency import MemoryIdempotencyStore, SQLiteIdempotencyStore
+
+MESSAGES = ["does the iphone 13 have face id", "how long is the warranty", "I want to buy an iPhone 13",
+            "Hi, I’m interested in buying an iPhone 14 Pro (Deep Purple, 256GB)", "what is the price"]
+
+
+class CountingTransport:
+    def __init__(self):
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        with self._lock:
+            self.sent += 1
+
+
+# (delay, MessageSid, sender, body) for every delivery, first deliveries at a steady rate
+def deliveries(count, max_duplicates, window, rng, run):
+    schedule = []
+    for i in range(count):
+        first = i * 0.005
+        form = (f"SM{run}{i:08d}", f"+2774{run}{i:06d}", MESSAGES[i % len(MESSAGES)])
+        schedule.append((first,) + form)
+        for _ in range(rng.randint(0, max_duplicates)):
+            schedule.append((first + rng.uniform(0.0, window),) + form)
+    return schedule
+
+
+def replay(app, store, schedule, openai_latency):
+    app.idempotency = store
+    calls = [0]
+    lock = threading.Lock()
+
+    def completion(message, context):
+        with lock:
+            calls[0] += 1
+        time.sleep(openai_latency)
+        return f"Stub answer to: {message}"
+
+    app.openai_completion = completion
+    transport = app.outbound_queue.transport = CountingTransport()
+    sales_before = len(app.sales_ledger)
+    responses = {}
+
+    def deliver(delay, message_sid, sender, body):
+        time.sleep(max(0.0, delay - (time.perf_counter() - start)))
+        response = app.app.test_client().post("/webhook", data={
+            "MessageSid": message_sid, "From": f"whatsapp:{sender}", "Body": body})
+        with lock:
+            responses.setdefault(message_sid, []).append(response.get_json())
+
+    threads = [threading.Thread(target=deliver, args=job) for job in schedule]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    app.outbound_queue.join()
+    # A duplicate matches if it replayed the first delivery's reply (or was still waiting on it)
+    mismatched = sum(1 for replies in responses.values() for reply in replies
+                     if reply.get("status") != "processing" and reply != replies[0] and replies[0].get("status") != "processing")
+    return {"openai": calls[0], "sent": transport.sent, "sales": len(app.sales_ledger) - sales_before,
+            "mismatched": mismatched, "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--max-duplicates", type=int, default=3)
+    parser.add_argument("--window", type=float, default=0.6, help="seconds over which redeliveries arrive")
+    parser.add_argument("--openai-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    app = load_app_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    app.OPENAI_CACHE_ENABLED = False
+    app.OPENAI_STREAMING = False
+    tmp = tempfile.mkdtemp()
+
+    for run, (label, store) in enumerate([
+        ("no dedup", None),
+        ("memory", MemoryIdempotencyStore()),
+        ("sqlite", SQLiteIdempotencyStore(os.path.join(tmp, "idempotency.db"))),
+    ]):
+        schedule = deliveries(args.messages, args.max_duplicates, args.window, random.Random(15), run)
+        result = replay(app, store, schedule, args.openai_latency)
+        print(f"{label:<9} {len(schedule)} deliveries of {args.messages} messages: "
+              f"{result['openai']} OpenAI calls, {result['sent']} replies sent, {result['sales']} pending sales, "
+              f"{result['mismatched']} mismatched duplicate responses ({result['elapsed']:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Micro-benchmark: the old webhook keyword cascade vs the compiled IntentRouter.
+#
+#   python benchmarks/bench_intent_router.py --rounds 2000
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_router import IntentRouter
+
+SECRET_PHRASE = "admin access granted"
+
+CORPUS = [
+    "Hi, what is the price of the iPhone 13?",
+    "PAID iPhone 12 Pro",
+    "I'm interested in buying an iPhone 13 (Pink, 128GB) for R7549",
+    "Remind me in 2 days about my order",
+    "I want to buy iphone 14 pro max",
+    "Tell me more about this ad",
+    "Can you recommend a bundle with accessories?",
+    "Do you have a monthly installment plan?",
+    "Can I see pictures of the 15 pro?",
+    "Hello, how long does delivery to Durban take?",
+    "admin access granted",
+    "Is the battery health good on the refurbished units? My last phone died quickly",
+]
+
+
+# The pre-router cascade from webhook(), kept here as the baseline
+def legacy_route(message_body):
+    def parse_purchase_request(message):
+        pattern = r"i(?:'| a)m interested in buying an? (iPhone [^\s(]+(?: Pro Max| Pro)?) \(([^,]+),\s*(\d+GB)\)(?:\s*for\s*R(\d+))?"
+        return bool(re.search(pattern, message.lower()))
+
+    def parse_reminder(message):
+        match = re.search(r"remind me in (\d+) (minute|minutes|hour|hours|day|days)", message.lower())
+        return int(match.group(1)) if match else 0
+
+    def is_ad_reply(message):
+        ad_keywords = ["know more", "tell me more", "about this", "interested", "details", "what’s this", "ad", "advertisement"]
+        purchase_keywords = ["buy", "order", "purchase", "pay", "eft", "transfer", "secure"]
+        return any(k in message.lower() for k in ad_keywords) and not any(k in message.lower() for k in purchase_keywords)
+
+    if SECRET_PHRASE.lower() in message_body.lower():
+        name = "admin"
+    elif message_body.lower().startswith("paid"):
+        name = "paid"
+    elif parse_purchase_request(message_body):
+        parse_purchase_request(message_body)
+        name = "purchase_request"
+    elif parse_reminder(message_body):
+        parse_reminder(message_body)
+        name = "reminder"
+    elif any(k in message_body.lower() for k in ["buy", "order", "purchase", "pay", "eft", "transfer", "secure"]):
+        name = "purchase"
+    elif is_ad_reply(message_body):
+        name = "ad_reply"
+    elif any(k in message_body.lower() for k in ["price", "model", "discount", "cost"]):
+        name = "price"
+    elif any(k in message_body.lower() for k in ["recommend", "suggest", "bundle", "accessories"]):
+        name = "recommend"
+    elif any(k in message_body.lower() for k in ["installment", "installments", "monthly", "plan"]):
+        name = "installment"
+    elif any(k in message_body.lower() for k in ["picture", "pictures", "image", "images", "see", "look"]):
+        name = "picture"
+    else:
+        name = "ai"
+    # The state update step re-parsed reminders for every message
+    parse_reminder(message_body)
+    parse_reminder(message_body)
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    router = IntentRouter(SECRET_PHRASE)
+    for message in CORPUS:
+        old, new = legacy_route(message), router.route(message).name
+        marker = "" if old == new else "   <- differs"
+        print(f"{new:>16}  {message[:50]}{marker}")
+
+    for name, fn in [("legacy cascade", legacy_route), ("intent router", router.route)]:
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                for message in CORPUS:
+                    fn(message)
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:>16}: {best * 1e6 / (args.rounds * len(CORPUS)):.2f} us/message (best of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Purchase-request lookups: the old exact-case get_purchase_details against the
+# InventoryIndex, on requests parsed by the intent router. Reports how many valid
+# requests each one recognises, lookup cost, and catalog rebuild time.
+#
+#   python benchmarks/bench_inventory.py --lookups 200000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_loader import load_app_module
+from intent_router import IntentRouter
+
+
+# Old lookup: exact INVENTORY key and color match, "GB" suffix only
+def legacy_purchase_details(inventory, model, color, storage):
+    if model in inventory:
+        inv = inventory[model]
+        storage_int = int(storage.replace("GB", ""))
+        if storage_int in inv["storage"] and color in inv["colors"]:
+            return inv["base_price"] + inv["storage"][storage_int], True
+        return 0, False
+    return 0, False
+
+
+def requests_corpus(inventory, count, rng):
+    messages = []
+    for _ in range(count):
+        model = rng.choice(list(inventory))
+        spec = inventory[model]
+        color = rng.choice(spec["colors"])
+        storage = rng.choice(list(spec["storage"]))
+        storage_text = rng.choice([f"{storage}GB", f"{storage}gb", f"{storage} GB"])
+        if storage == 1024:
+            storage_text = rng.choice(["1TB", "1tb"])
+        messages.append(f"Hi, I’m interested in buying an {rng.choice([model, model.lower()])} "
+                        f"({rng.choice([color, color.lower()])}, {storage_text})")
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+
+    app = load_app_module()
+    rng = random.Random(3)
+    router = IntentRouter("admin access granted")
+    intents = [router.route(message) for message in requests_corpus(app.INVENTORY, args.requests, rng)]
+    parsed = [intent for intent in intents if intent.name == "purchase_request"]
+
+    legacy_hits = sum(legacy_purchase_details(app.INVENTORY, i.model, i.color, i.storage.replace("gb", "GB"))[1]
+                      for i in parsed if "gb" in i.storage)
+    index = app.inventory.index
+    index_hits = sum(index.lookup(i.model, i.color, i.storage) is not None for i in parsed)
+    print(f"valid requests recognised: legacy {legacy_hits}/{len(intents)}, index {index_hits}/{len(intents)} "
+          f"(router parsed {len(parsed)})")
+
+    keys = [(i.model, i.color, i.storage.replace("gb", "GB")) for i in parsed if "gb" in i.storage]
+    sample = [rng.choice(keys) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for model, color, storage in sample:
+        legacy_purchase_details(app.INVENTORY, model, color, storage)
+    legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    for model, color, storage in sample:
+        index.lookup(model, color, storage)
+    indexed = time.perf_counter() - start
+    print(f"lookup: legacy {legacy * 1e6 / len(sample):.2f} us, index {indexed * 1e6 / len(sample):.2f} us")
+
+    start = time.perf_counter()
+    app.inventory.reload(app.INVENTORY)
+    print(f"catalog rebuild ({len(app.inventory.index)} configurations + price list): "
+          f"{(time.perf_counter() - start) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Compare serial Twilio sends (the old webhook path) with the outbound queue,
+# using a local fake transport with a fixed per-call latency.
+#
+#   python benchmarks/bench_outbound.py --messages 400 --latency 0.02 --workers 8
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbound import FakeTransport, OutboundQueue
+
+
+def run_serial(messages, latency):
+    transport = FakeTransport(latency=latency)
+    sender = OutboundQueue(transport, workers=1)
+    start = time.perf_counter()
+    for to, body in messages:
+        sender.send_now(to, body)
+    return len(transport.sent), time.perf_counter() - start
+
+
+def run_queued(messages, latency, workers, rate_limit_every):
+    transport = FakeTransport(latency=latency, rate_limit_every=rate_limit_every)
+    sender = OutboundQueue(transport, workers=workers, max_pending=len(messages) + workers, backoff_base=0.01)
+    sender.start()
+    start = time.perf_counter()
+    for to, body in messages:
+        sender.enqueue(to, body)
+    enqueued = time.perf_counter() - start
+    sender.join()
+    elapsed = time.perf_counter() - start
+    sender.stop()
+
+    # Chunks must reach each recipient in the order they were queued
+    last_seen = {}
+    for to, body in transport.sent:
+        seq = int(body.split(":", 1)[0])
+        assert seq > last_seen.get(to, -1), f"out of order delivery to {to}"
+        last_seen[to] = seq
+    return len(transport.sent), elapsed, enqueued, sender.stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--recipients", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    args = parser.parse_args()
+
+    messages = [(f"+2771{i % args.recipients:07d}", f"{i}: hello") for i in range(args.messages)]
+
+    sent, elapsed = run_serial(messages, args.latency)
+    print(f"serial:  {sent} msgs in {elapsed:.2f}s -> {sent / elapsed:.1f} msg/s")
+
+    sent, elapsed, enqueued, stats = run_queued(messages, args.latency, args.workers, args.rate_limit_every)
+    print(f"queued:  {sent} msgs in {elapsed:.2f}s -> {sent / elapsed:.1f} msg/s "
+          f"(webhook-side enqueue {enqueued * 1e6 / len(messages):.1f} us/msg, {stats})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# Flood test for the webhook rate limits and OpenAI load shedding. --spammers numbers
+# post unique AI questions as fast as --flood-threads threads can, while --customers
+# real customers ask a question every --think-time seconds, all sharing an OpenAI quota
+# of --openai-capacity concurrent completions. Compares OpenAI calls, WhatsApp sends,
+# busy replies and customer latency with no protection, with load shedding alone (as
+# against a flood spread over many numbers) and with the rate limits too, then measures
+# what the checks cost per request: the limiter alone, and end to end on keyword replies.
+#
+#   python benchmarks/bench_rate_limit.py --duration 10 --spammers 2 --customers 40
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+import timeit
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai
+
+from app_loader import load_app_module
+from bench_replay import FakeChatCompletion, percentile
+from rate_limit import InFlightLimiter, WebhookRateLimiter
+
+
+class CountingTransport:
+    def __init__(self):
+        self.sent = Counter()
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        with self._lock:
+            self.sent[to] += 1
+
+
+def flood(app, args):
+    transport = app.outbound_queue.transport = CountingTransport()
+    fake_openai = FakeChatCompletion(args.openai_latency, 0.0)
+    upstream = threading.Semaphore(args.openai_capacity)
+
+    def create(**kwargs):
+        with upstream:
+            return fake_openai.create(**kwargs)
+
+    openai.ChatCompletion.create = create
+    spammers = [f"+2779{i:07d}" for i in range(args.spammers)]
+    stop = threading.Event()
+    shed_before = app.shed_questions._values.get("", 0)
+    latencies, flood_requests = [], [0]
+    lock = threading.Lock()
+
+    def spam(index):
+        client = app.app.test_client()
+        sender, count = spammers[index % len(spammers)], 0
+        while not stop.is_set():
+            client.post("/webhook", data={"From": f"whatsapp:{sender}", "Body": f"question {index}-{count}: is the battery original"})
+            count += 1
+        with lock:
+            flood_requests[0] += count
+
+    def customer(index):
+        client = app.app.test_client()
+        local, count = [], 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.post("/webhook", data={"From": f"whatsapp:+2778{index:07d}",
+                                          "Body": f"does the iPhone {index}-{count} come with a charger"})
+            local.append(time.perf_counter() - start)
+            count += 1
+            stop.wait(args.think_time)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=spam, args=(i,)) for i in range(args.flood_threads)]
+    threads += [threading.Thread(target=customer, args=(i,)) for i in range(args.customers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    app.outbound_queue.join()
+    latencies.sort()
+    shed = app.shed_questions._values.get("", 0)
+    return {
+        "shed": shed - shed_before,
+        "flood_rate": flood_requests[0] / args.duration,
+        "openai": fake_openai.calls,
+        "spammer_sends": sum(transport.sent[s] for s in spammers),
+        "customer_sends": sum(transport.sent.values()) - sum(transport.sent[s] for s in spammers),
+        "customer_requests": len(latencies),
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+# Seconds per keyword webhook request from distinct senders (so nobody is limited)
+def keyword_request_time(app, requests, offset):
+    client = app.app.test_client()
+    start = time.perf_counter()
+    for i in range(requests):
+        client.post("/webhook", data={"From": f"whatsapp:+2777{offset + i:07d}", "Body": "what is the price"})
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--spammers", type=int, default=2)
+    parser.add_argument("--flood-threads", type=int, default=16)
+    parser.add_argument("--customers", type=int, default=40)
+    parser.add_argument("--think-time", type=float, default=3.0)
+    parser.add_argument("--openai-latency", type=float, default=0.3)
+    parser.add_argument("--openai-capacity", type=int, default=8, help="completions OpenAI serves at once (quota)")
+    parser.add_argument("--requests", type=int, default=5000, help="keyword requests per overhead round")
+    args = parser.parse_args()
+
+    app = load_app_module()
+    logging.getLogger().setLevel(logging.ERROR)
+    app.OPENAI_CACHE_ENABLED = False
+    limiter, shedding = app.rate_limiter, app.openai_in_flight
+    if limiter is None:
+        limiter = WebhookRateLimiter(app.SENDER_RATE_LIMIT / 60 or 20 / 60, app.SENDER_RATE_BURST)
+
+    for label, rate_limiter, in_flight in [("no limits", None, InFlightLimiter(0)),
+                                           ("shedding", None, shedding),
+                                           ("rate limits", limiter, shedding)]:
+        app.rate_limiter, app.openai_in_flight = rate_limiter, in_flight
+        result = flood(app, args)
+        print(f"{label:<11} flood {result['flood_rate']:6,.0f} req/s | OpenAI calls {result['openai']:5,} | "
+              f"busy replies {result['shed']:5,} | sends to spammers {result['spammer_sends']:5,} | "
+              f"customers: {result['customer_requests']:,} requests, p50 {result['p50'] * 1e3:7.1f}ms "
+              f"p99 {result['p99'] * 1e3:7.1f}ms")
+
+    senders = [f"+2776{i:07d}" for i in range(100000)]
+    check = WebhookRateLimiter(20 / 60, 8, global_rate=1e9, global_burst=1e9)
+    per_check = min(timeit.repeat(lambda: [check.acquire(s) for s in senders], number=1, repeat=3)) / len(senders)
+    print(f"limiter check: {per_check * 1e9:,.0f} ns per message (per-sender and global bucket, 100k senders)")
+
+    # Alternate configurations so drift affects both equally; keep the best round
+    best = {}
+    for round_index in range(3):
+        for label, rate_limiter in [("off", None), ("on", limiter)]:
+            app.rate_limiter = rate_limiter
+            offset = (round_index * 2 + (label == "on")) * args.requests
+            best[label] = min(best.get(label, 1.0), keyword_request_time(app, args.requests, offset))
+    print(f"keyword webhook request: {best['off'] * 1e6:,.1f} us without limits, {best['on'] * 1e6:,.1f} us with "
+          f"({(best['on'] - best['off']) * 1e6:+.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+# Offline replay / load benchmark for the whole assistant. Runs the Flask app
+# in-process with fake Twilio and OpenAI backends (configurable latency), replays a
+# corpus of WhatsApp conversations covering every intent (ad replies, price list,
+# purchase requests, PAID, reminders, installments, AI fallback...) from
+# --concurrency simulated customers, and reports requests/sec, p50/p95/p99 latency
+# overall and per intent, and memory growth. App settings come from the environment
+# as usual (e.g. OPENAI_STREAMING=True, STATE_JOURNAL=file).
+#
+# Save a run with --json and pass it to --compare on the next one to flag throughput
+# or tail-latency regressions beyond --tolerance (the exit status is 1 if any).
+# A recorded corpus is a JSONL file of {"from": "+27...", "body": "..."} lines;
+# each sender's messages are replayed in file order.
+#
+#   python benchmarks/bench_replay.py --conversations 500 --concurrency 32
+#   python benchmarks/bench_replay.py --json baseline.json
+#   python benchmarks/bench_replay.py --compare baseline.json --tolerance 0.1
+import argparse
+import gc
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai
+
+from app_loader import load_app_module
+from outbound import TwilioTransport
+
+AI_QUESTIONS = [
+    "how long is the warranty", "is the battery original", "do you deliver to Durban",
+    "does it come with a charger", "which one has the better camera", "is it water resistant",
+    "how long does delivery take", "can I collect in Johannesburg", "is the phone unlocked",
+]
+AI_ANSWER = ("All our iPhones come with a 12-month warranty, an original battery and a charging cable. "
+             "Delivery takes 3-5 working days nationwide, and every phone is unlocked for all networks. "
+             "Would you like me to reserve one for you?")
+
+# Relative frequency of each intent in synthetic conversations (after the opening message)
+INTENT_WEIGHTS = {"ai": 30, "price": 14, "purchase_request": 14, "paid": 8, "reminder": 7,
+                  "installment": 8, "picture": 6, "recommend": 6, "purchase": 7}
+
+
+def synthetic_message(intent, inventory, rng):
+    model = rng.choice(list(inventory))
+    spec = inventory[model]
+    storage = rng.choice(list(spec["storage"]))
+    storage_text = "1TB" if storage == 1024 else f"{storage}GB"
+    if intent == "ad_reply":
+        return rng.choice(["Hi, tell me more about this", "Hi! I'm interested, send details please"])
+    if intent == "price":
+        return rng.choice(["what is the price", "how much does the iPhone 13 cost", "any discount on the 14 Pro?"])
+    if intent == "purchase_request":
+        return f"Hi, I’m interested in buying an {model} ({rng.choice(spec['colors'])}, {storage_text})"
+    if intent == "purchase":
+        return f"I want to buy an {model}"
+    if intent == "paid":
+        return f"PAID {model} {storage_text}"
+    if intent == "reminder":
+        return f"remind me in {rng.randint(2, 48)} hours about the {model}"
+    if intent == "installment":
+        return rng.choice(["do you have a monthly plan", "can I pay in installments"])
+    if intent == "picture":
+        return rng.choice(["can I see pictures", "send me images of the phones"])
+    if intent == "recommend":
+        return rng.choice(["what do you recommend", "any accessories bundle?"])
+    return rng.choice(AI_QUESTIONS)
+
+
+# Synthetic conversations: an opening message, then intents drawn by INTENT_WEIGHTS
+def synthetic_corpus(conversations, messages, inventory, rng):
+    intents, weights = zip(*INTENT_WEIGHTS.items())
+    corpus = []
+    for index in range(conversations):
+        opening = "ad_reply" if rng.random() < 0.4 else "price"
+        turns = [opening] + rng.choices(intents, weights, k=rng.randint(1, messages * 2 - 1))
+        corpus.append((f"+2776{index:07d}", [synthetic_message(intent, inventory, rng) for intent in turns]))
+    return corpus
+
+
+def recorded_corpus(path):
+    conversations = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                conversations.setdefault(record["from"].replace("whatsapp:", ""), []).append(record["body"])
+    return list(conversations.items())
+
+
+# Stands in for twilio.rest.Client: messages.create sleeps `latency` seconds
+class FakeTwilioClient:
+    def __init__(self, latency):
+        self.messages = self
+        self.latency = latency
+        self.created = 0
+        self._lock = threading.Lock()
+
+    def create(self, body, from_, to):
+        time.sleep(self.latency)
+        with self._lock:
+            self.created += 1
+        return SimpleNamespace(sid="SMfake", status="queued")
+
+
+# Stands in for openai.ChatCompletion: answers after `latency` seconds, or streams the
+# answer word by word `token_delay` apart when called with stream=True
+class FakeChatCompletion:
+    def __init__(self, latency, token_delay):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if stream:
+            return self._stream()
+        time.sleep(self.token_delay * len(AI_ANSWER.split()))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=AI_ANSWER))])
+
+    def _stream(self):
+        for word in AI_ANSWER.split(" "):
+            time.sleep(self.token_delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta={"content": word + " "})])
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+# Replay conversations from `concurrency` threads; each thread plays one customer at a time
+def replay(app, corpus, concurrency, think_time, sids):
+    conversations = queue.Queue()
+    for conversation in corpus:
+        conversations.put(conversation)
+    samples = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def customer():
+        client = app.app.test_client()
+        local, failed = [], 0
+        while True:
+            try:
+                sender, messages = conversations.get_nowait()
+            except queue.Empty:
+                break
+            for body in messages:
+                intent = app.intent_router.route(body).name
+                start = time.perf_counter()
+                response = client.post("/webhook", data={
+                    "MessageSid": f"SM{next(sids):032d}", "From": f"whatsapp:{sender}", "Body": body})
+                local.append((intent, time.perf_counter() - start))
+                failed += response.status_code != 200
+                if think_time:
+                    time.sleep(think_time)
+        with lock:
+            samples.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=customer) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    app.outbound_queue.join()
+    return samples, errors[0], elapsed
+
+
+def summarize(samples):
+    latencies = sorted(latency for _, latency in samples)
+    return {"requests": len(latencies), "p50_ms": percentile(latencies, 0.50) * 1e3,
+            "p95_ms": percentile(latencies, 0.95) * 1e3, "p99_ms": percentile(latencies, 0.99) * 1e3,
+            "mean_ms": statistics.mean(latencies) * 1e3}
+
+
+def compare(result, baseline, tolerance):
+    regressions = []
+    checks = [("req_per_s", -1)] + [(key, 1) for key in ("p50_ms", "p95_ms", "p99_ms")]
+    for key, direction in checks:
+        old = baseline["overall"][key] if key != "req_per_s" else baseline[key]
+        new = result["overall"][key] if key != "req_per_s" else result[key]
+        change = (new - old) / old if old else 0.0
+        flag = change * direction > tolerance
+        print(f"  {key:<10} {old:10.2f} -> {new:10.2f} ({change * 100:+.1f}%){'  REGRESSION' if flag else ''}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=6, help="mean messages per synthetic conversation")
+    parser.add_argument("--corpus", help="recorded JSONL corpus instead of synthetic conversations")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds a customer waits between messages")
+    parser.add_argument("--openai-latency", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--twilio-latency", type=float, default=0.02)
+    parser.add_argument("--warmup", type=int, default=50, help="conversations replayed before measuring")
+    parser.add_argument("--seed", type=int, default=16)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline results written by --json")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    app = load_app_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    fake_twilio = FakeTwilioClient(args.twilio_latency)
+    fake_openai = FakeChatCompletion(args.openai_latency, args.token_delay)
+    app.twilio_client = fake_twilio
+    app.outbound_queue.transport = TwilioTransport(fake_twilio, app.TWILIO_PHONE_NUMBER)
+    openai.ChatCompletion.create = fake_openai.create
+    # Each customer's messages are replayed back to back, far faster than anyone types
+    app.rate_limiter = None
+
+    rng = random.Random(args.seed)
+    corpus = recorded_corpus(args.corpus) if args.corpus else \
+        synthetic_corpus(args.conversations + args.warmup, args.messages, app.INVENTORY, rng)
+    warmup, corpus = corpus[:args.warmup], corpus[args.warmup:]
+    sids = itertools.count()
+
+    replay(app, warmup, args.concurrency, 0.0, sids)
+    gc.collect()
+    rss_before = rss_bytes()
+    openai_before, twilio_before = fake_openai.calls, fake_twilio.created
+    samples, errors, elapsed = replay(app, corpus, args.concurrency, args.think_time, sids)
+    gc.collect()
+    rss_after = rss_bytes()
+
+    result = {
+        "req_per_s": len(samples) / elapsed,
+        "errors": errors,
+        "overall": summarize(samples),
+        "intents": {intent: summarize([s for s in samples if s[0] == intent])
+                    for intent in sorted({intent for intent, _ in samples})},
+        "openai_calls": fake_openai.calls - openai_before,
+        "twilio_sends": fake_twilio.created - twilio_before,
+        "rss_growth_bytes": rss_after - rss_before,
+        "rss_bytes": rss_after,
+        "config": {key: getattr(args, key) for key in ("concurrency", "think_time", "openai_latency",
+                                                       "token_delay", "twilio_latency", "corpus")},
+    }
+
+    overall = result["overall"]
+    print(f"{overall['requests']} requests from {len(corpus)} conversations at concurrency {args.concurrency}: "
+          f"{result['req_per_s']:,.0f} req/s, errors {errors}")
+    print(f"latency p50 {overall['p50_ms']:.1f}ms  p95 {overall['p95_ms']:.1f}ms  p99 {overall['p99_ms']:.1f}ms")
+    for intent, stats in result["intents"].items():
+        print(f"  {intent:<17} {stats['requests']:>6}  p50 {stats['p50_ms']:7.1f}ms  "
+              f"p95 {stats['p95_ms']:7.1f}ms  p99 {stats['p99_ms']:7.1f}ms")
+    print(f"upstream: {result['openai_calls']} OpenAI calls, {result['twilio_sends']} Twilio sends")
+    print(f"memory: RSS {rss_after / 2**20:.1f} MiB, growth {result['rss_growth_bytes'] / 2**20:+.1f} MiB "
+          f"({result['rss_growth_bytes'] / max(1, overall['requests']) * 1000 / 2**10:+.1f} KiB per 1k requests)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"against {args.compare} (tolerance {args.tolerance * 100:.0f}%):")
+        if compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
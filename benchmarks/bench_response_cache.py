@@ -0,0 +1,90 @@
+# Drive the AI fallback cache with a stub OpenAI client that sleeps like the real
+# API, replaying a skewed mix of near-duplicate questions from concurrent threads.
+#
+#   python benchmarks/bench_response_cache.py --requests 400 --threads 16 --latency 0.5
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache
+
+QUESTIONS = [
+    "Do you have iPhone 13 in pink?",
+    "do you have iphone 13 in pink",
+    "Do you have the iPhone 13 in Pink??",
+    "How long does delivery take?",
+    "how long does delivery take",
+    "Is the iPhone 12 Pro refurbished?",
+    "Do you deliver to Cape Town?",
+    "What warranty do you offer?",
+    "Can I collect in Johannesburg?",
+    "Does the 15 Pro Max come with a charger?",
+]
+
+
+# Mimics openai.ChatCompletion (openai==0.28) closely enough for query_openai
+class StubChatCompletion:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, temperature, max_tokens):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        answer = f"Stub answer to: {messages[-1]['content']}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+
+def ask(client, cache, question):
+    messages = [{"role": "system", "content": "prompt"}, {"role": "user", "content": question}]
+    loader = lambda: client.create(model="gpt-3.5-turbo", messages=messages, temperature=0.7,
+                                   max_tokens=300).choices[0].message.content.strip()
+    start = time.perf_counter()
+    if cache is None:
+        loader()
+    else:
+        cache.get_or_load(question, [], loader)
+    return time.perf_counter() - start
+
+
+def run(requests, threads, latency, cached):
+    client = StubChatCompletion(latency)
+    cache = ResponseCache() if cached else None
+    weights = [1 / (rank + 1) for rank in range(len(QUESTIONS))]
+    questions = random.Random(42).choices(QUESTIONS, weights=weights, k=requests)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = sorted(pool.map(lambda q: ask(client, cache, q), questions))
+    elapsed = time.perf_counter() - start
+    return client.calls, elapsed, latencies, cache.snapshot() if cache else {}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    for label, cached in [("uncached", False), ("cached", True)]:
+        calls, elapsed, latencies, stats = run(args.requests, args.threads, args.latency, cached)
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[int(len(latencies) * 0.99)]
+        print(f"{label:>8}: {calls} upstream calls, {args.requests / elapsed:.1f} req/s, "
+              f"p50 {p50 * 1e3:.1f}ms p99 {p99 * 1e3:.1f}ms")
+        if stats:
+            print(f"          hits {stats['hits']} misses {stats['misses']} coalesced {stats['coalesced']} "
+                  f"hit ratio {stats['hit_ratio']:.2f} avg upstream {stats['upstream_avg_seconds'] * 1e3:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
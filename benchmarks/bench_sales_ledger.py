@@ -0,0 +1,91 @@
+# PAID transitions and admin reports: the old sales_data lists vs SalesLedger,
+# with 1M historical completed sales and a backlog of pending ones.
+#
+#   python benchmarks/bench_sales_ledger.py --history 1000000 --pending 20000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sales_ledger import SalesLedger
+
+TODAY = "2025-03-01"
+
+
+# Old PAID branch: scan pending for the phone, then list.remove
+def legacy_paid(sales_data, phone):
+    pending = [p for p in sales_data["pending"] if p["phone"] == phone]
+    if pending:
+        sale = pending[0]
+        sales_data["pending"].remove(sale)
+        sale["date"] = TODAY
+        sales_data["completed"].append(sale)
+
+
+# Old generate_sales_report body
+def legacy_report(sales_data, today="Saturday"):
+    promised_today = [p for p in sales_data["promised"] if p["day"] == today]
+    report = "📊 Sales Report\n\n"
+    report += f"Completed Sales: {len(sales_data['completed'])}\n"
+    for sale in sales_data["completed"]:
+        report += f"- {sale['phone']}: {sale['item']} (R{sale['amount']}) on {sale['date']}\n"
+    report += "\n"
+    report += f"Pending Sales: {len(sales_data['pending'])}\n"
+    for pend in sales_data["pending"]:
+        report += f"- {pend['phone']}: {pend['item']} (R{pend['amount']})\n"
+    report += "\n"
+    report += f"Promised Today ({today}): {len(promised_today)}\n"
+    for prom in promised_today:
+        report += f"- {prom['phone']}: {prom['item']} (R{prom['amount']})\n"
+    return report
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", type=int, default=1000000)
+    parser.add_argument("--pending", type=int, default=20000)
+    parser.add_argument("--payments", type=int, default=200)
+    args = parser.parse_args()
+
+    phones = [f"+2771{i:07d}" for i in range(args.pending)]
+    sales_data = {"completed": [], "pending": [], "promised": []}
+    ledger = SalesLedger()
+
+    _, build_legacy = timed(lambda: [
+        sales_data["completed"].append({"phone": f"+2772{i:07d}", "item": "iPhone 13 (Pink, 128GB)",
+                                        "amount": 7549, "date": TODAY}) for i in range(args.history)])
+    _, build_ledger = timed(lambda: [
+        ledger.add_completed(f"+2772{i:07d}", "iPhone 13 (Pink, 128GB)", 7549, TODAY) for i in range(args.history)])
+    for phone in phones:
+        sales_data["pending"].append({"phone": phone, "item": "iphone 14 pro", "amount": 9599})
+        ledger.add_pending(phone, "iphone 14 pro", 9599)
+    print(f"build {args.history} completed: lists {build_legacy:.2f}s, ledger {build_ledger:.2f}s")
+
+    payers = random.Random(7).sample(phones, args.payments)
+    _, legacy = timed(lambda: [legacy_paid(sales_data, phone) for phone in payers])
+    _, indexed = timed(lambda: [ledger.complete_pending(phone, TODAY) for phone in payers])
+    print(f"PAID transition ({args.pending} pending): lists {legacy * 1e3 / args.payments:.3f}ms, "
+          f"ledger {indexed * 1e6 / args.payments:.2f}us")
+
+    old_report, legacy = timed(lambda: legacy_report(sales_data))
+    new_report, first = timed(lambda: ledger.report("Saturday"))
+    ledger.add_completed("+27730000000", "iPhone X (Silver, 64GB)", 4799, TODAY)
+    _, incremental = timed(lambda: ledger.report("Saturday"))
+    _, unchanged = timed(lambda: ledger.report("Saturday"))
+    assert old_report == new_report, "ledger report differs from the old report"
+    print(f"report ({len(old_report) / 2**20:.0f} MiB): lists {legacy * 1e3:.0f}ms, ledger first {first * 1e3:.0f}ms, "
+          f"after one sale {incremental * 1e3:.0f}ms, unchanged {unchanged * 1e3:.1f}ms")
+    print(f"totals: {ledger.totals}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Tick cost of the old full-scan follow-up/promo loops vs the heap scheduler as
+# the number of users grows. Nothing is due during the measured ticks, which is
+# the common case: the scan still walks every user while the heap peeks once.
+#
+#   python benchmarks/bench_scheduler.py --users 1000 10000 100000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import TimerScheduler
+
+FOLLOW_UP_INTERVAL = 12 * 3600
+PROMO_INTERVAL = 2 * 24 * 3600
+
+
+# Equivalent of the old follow_up_and_reminder_thread + promo_thread bodies
+def full_scan_tick(user_states, current_time):
+    for phone_number, state in list(user_states.items()):
+        if state["follow_up_count"] < 3 and current_time - state["last_message_time"] >= FOLLOW_UP_INTERVAL:
+            pass
+        if state["reminder_time"] and current_time >= state["reminder_time"]:
+            pass
+        if current_time - state["last_promo_time"] >= PROMO_INTERVAL:
+            pass
+
+
+def build(users, now):
+    user_states = {}
+    scheduler = TimerScheduler(clock=lambda: now)
+    for handler in ("follow_up", "reminder", "promo"):
+        scheduler.register(handler, lambda phone, t: None)
+    for i in range(users):
+        phone = f"+2771{i:07d}"
+        last = now - random.uniform(0, FOLLOW_UP_INTERVAL - 60)
+        user_states[phone] = {"last_message_time": last, "follow_up_count": 0,
+                              "reminder_time": 0, "last_promo_time": now - 3600}
+        scheduler.schedule("follow_up", phone, last + FOLLOW_UP_INTERVAL)
+        scheduler.schedule("promo", phone, now - 3600 + PROMO_INTERVAL)
+    return user_states, scheduler
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    now = time.time()
+    print(f"{'users':>8} {'scan tick':>12} {'heap tick':>12} {'reschedule':>12}")
+    for users in args.users:
+        user_states, scheduler = build(users, now)
+        scan = timeit(lambda: full_scan_tick(user_states, now), args.repeat)
+        heap = timeit(lambda: scheduler.run_due(now), args.repeat)
+        phones = list(user_states)
+        reschedule = timeit(lambda: scheduler.schedule("follow_up", random.choice(phones), now + FOLLOW_UP_INTERVAL), 10000)
+        print(f"{users:>8} {scan * 1e3:>10.3f}ms {heap * 1e6:>10.2f}us {reschedule * 1e6:>10.2f}us")
+
+
+if __name__ == "__main__":
+    main()
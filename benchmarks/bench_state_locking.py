@@ -0,0 +1,83 @@
+# Webhook throughput vs thread count with one global user-state lock (1 shard)
+# and with lock-striped shards. Each thread runs the webhook pipeline directly
+# (route, reply, AI fallback, state update, journal, send) for its own users;
+# AI answers come from a stub that sleeps like a real OpenAI call.
+#
+#   python benchmarks/bench_state_locking.py --threads 1 2 4 8 16 32 --openai-latency 0.02
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MESSAGES = ["what is the price", "hello, is anyone there?", "do you have a monthly plan",
+            "which phone has the best camera", "can I see pictures", "remind me in 2 hours about the deal"]
+
+
+def run(app, threads, per_thread, openai_latency):
+    def pipeline(sender_number, message_body):
+        trace = app.metrics.trace()
+        intent = app.begin_message(sender_number, message_body, trace)
+        response_message = app.reply_for_intent(sender_number, message_body, intent)
+        if response_message is None:
+            response_message = app.query_openai(message_body, app.get_user_context(sender_number, message_body))
+        app.finish_message(sender_number, message_body, intent, response_message, trace)
+        app.send_whatsapp_message(sender_number, response_message)
+        trace.finish()
+
+    def worker(index):
+        for i in range(per_thread):
+            pipeline(f"+2771{index:03d}{i % 200:04d}", MESSAGES[i % len(MESSAGES)])
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * per_thread / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--per-thread", type=int, default=300)
+    parser.add_argument("--openai-latency", type=float, default=0.02)
+    parser.add_argument("--shards", type=int, default=64)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("STATE_JOURNAL", "file")
+    os.environ.setdefault("STATE_JOURNAL_PATH", os.path.join(tmp, "state.journal"))
+    os.environ.setdefault("CAMPAIGN_CHECKPOINT_DIR", os.path.join(tmp, "campaigns"))
+    from app_loader import load_app_module
+    from user_state import ShardedUserStates
+
+    app = load_app_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    app.OPENAI_CACHE_ENABLED = False
+    app.openai_completion = lambda message, context: time.sleep(args.openai_latency) or "Stub answer"
+    app.outbound_queue.transport = type("NullTransport", (), {"send": lambda self, to, body: None})()
+
+    # Total time requests spent waiting for a user-state lock, from the stage histogram
+    def lock_wait():
+        series = app.metrics.stage_seconds._series.get("lock_wait")
+        return series[1] if series else 0.0
+
+    print(f"{'threads':>8} {'1 shard':>12} {'lock wait':>10} {f'{args.shards} shards':>12} {'lock wait':>10}")
+    for threads in args.threads:
+        row = []
+        for shards in (1, args.shards):
+            app.user_states = ShardedUserStates(shards)
+            waited = lock_wait()
+            rate = run(app, threads, args.per_thread, args.openai_latency)
+            row += [f"{rate:>10,.0f}/s", f"{(lock_wait() - waited) * 1e3:>8.1f}ms"]
+        print(f"{threads:>8} " + " ".join(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Time to first WhatsApp message for AI answers: the buffered path (wait for the
+# whole completion, then send) against streaming (send each sentence-bounded chunk
+# as it completes), on both the sync and async webhooks. The OpenAI stub streams a
+# --reply-tokens answer one token every --token-delay seconds after --openai-latency.
+#
+#   python benchmarks/bench_streaming.py --senders 20 --reply-tokens 300 --token-delay 0.02
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_servers import start_stub_server
+
+QUESTION = "tell me everything about the battery and display"
+
+
+# Records when the first and last message reached each recipient
+class SendRecorder:
+    def __init__(self):
+        self.sends = {}
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        now = time.perf_counter()
+        with self._lock:
+            first, _, count = self.sends.get(to, (now, now, 0))
+            self.sends[to] = (first, now, count + 1)
+
+    async def send_async(self, to, body):
+        self.send(to, body)
+
+
+def sync_round(app, senders):
+    client = app.app.test_client()
+
+    def post(sender):
+        client.post("/webhook", data={"From": f"whatsapp:{sender}", "Body": QUESTION})
+
+    threads = [threading.Thread(target=post, args=(sender,)) for sender in senders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    app.outbound_queue.join()
+
+
+async def async_round(app, senders):
+    await asyncio.gather(*(app.webhook_async({"From": f"whatsapp:{sender}", "Body": QUESTION}) for sender in senders))
+    await asyncio.gather(*app.background_sends)
+
+
+def report(label, start, recorder, senders):
+    first = [recorder.sends[s][0] - start for s in senders]
+    last = [recorder.sends[s][1] - start for s in senders]
+    messages = statistics.mean(recorder.sends[s][2] for s in senders)
+    print(f"{label:<18} first message p50 {statistics.median(first):6.2f}s max {max(first):6.2f}s | "
+          f"last message p50 {statistics.median(last):6.2f}s | {messages:.1f} messages per answer")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--senders", type=int, default=20)
+    parser.add_argument("--openai-latency", type=float, default=0.3)
+    parser.add_argument("--reply-tokens", type=int, default=300)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--min-chunk", type=int, default=200)
+    args = parser.parse_args()
+
+    port, _ = start_stub_server(0, args.openai_latency, 0.0, args.reply_tokens, args.token_delay)
+    os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{port}/v1"
+    from app_loader import load_app_module
+
+    app = load_app_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    app.OPENAI_CACHE_ENABLED = False
+    app.OPENAI_STREAM_MIN_CHUNK = args.min_chunk
+    recorder = SendRecorder()
+    app.outbound_queue.transport = recorder
+    app.get_async_twilio().send = recorder.send_async
+
+    loop = asyncio.new_event_loop()
+    for round_index, (label, streaming, run_async) in enumerate([
+        ("sync buffered", False, False), ("sync streaming", True, False),
+        ("async buffered", False, True), ("async streaming", True, True),
+    ]):
+        app.OPENAI_STREAMING = streaming
+        senders = [f"+2772{round_index}{i:06d}" for i in range(args.senders)]
+        start = time.perf_counter()
+        if run_async:
+            loop.run_until_complete(async_round(app, senders))
+        else:
+            sync_round(app, senders)
+        report(label, start, recorder, senders)
+    loop.run_until_complete(app.close_async_clients())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Memory held by user_states for --contacts simulated contacts: the previous free-form
+# dict per user (keeping the full text of the last reply) against UserState slots
+# records (keeping a response ID), each built in a fresh process and reported as
+# bytes per user and total RSS. Contacts' last activity is spread over --days days,
+# with replies in the replay benchmark's intent mix; the slots run then sweeps them
+# with the app's idle-user eviction (USER_STATE_TTL, default 14 days), reports what is
+# left, and refills up to --contacts with new ones to show RSS stays bounded.
+#
+#   python benchmarks/bench_user_states.py --contacts 1000000
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_replay import AI_ANSWER, INTENT_WEIGHTS, rss_bytes
+
+DAY = 24 * 3600
+
+
+# (phone, seconds since last activity, intent of the last reply, reminder due or 0) per contact
+def contacts(count, days, seed):
+    rng = random.Random(seed)
+    intents, weights = zip(*INTENT_WEIGHTS.items())
+    now = time.time()
+    for i, intent in enumerate(rng.choices(intents, weights, k=count)):
+        age = rng.uniform(0, days * DAY)
+        reminder = now + rng.uniform(0, 2 * DAY) if intent == "reminder" and rng.random() < 0.5 else 0
+        yield f"+2776{i:07d}", age, intent, reminder
+
+
+# Text the old dict kept in "last_message": keyword replies share one string, while AI
+# answers and purchase quotes were built per message
+def reply_text(app, intent, i):
+    if intent == "ai":
+        return f"{AI_ANSWER} (ref {i})"
+    if intent == "purchase_request":
+        return f"✅ Your iPhone 13 (Pink, 128GB) is R7,549 (ref {i}).\n\nPayment Options:\n" + app.ORDER_FLOW[40:400]
+    return {"price": app.inventory.index.price_list, "installment": app.INSTALLMENT_PLAN,
+            "recommend": app.RECOMMENDATIONS, "picture": app.PICTURE_LINK}.get(intent, app.ORDER_FLOW)
+
+
+def follow_ups_sent(app, age):
+    return min(app.MAX_FOLLOW_UPS, int(age // app.FOLLOW_UP_INTERVAL))
+
+
+def child(layout, count, days, seed):
+    from app_loader import load_app_module
+    from user_state import UserState
+
+    app = load_app_module()
+    now = time.time()
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    for i, (phone, age, intent, reminder) in enumerate(contacts(count, days, seed)):
+        sent = follow_ups_sent(app, age)
+        # Each follow-up moves last_message_time up to when it was sent
+        last_activity = now - age + sent * app.FOLLOW_UP_INTERVAL
+        with app.user_states.lock(phone):
+            if layout == "dict":
+                state = {"last_message_time": last_activity, "follow_up_count": sent,
+                         "last_message": reply_text(app, intent, i), "last_promo_time": 0}
+                if reminder:
+                    state.update({"reminder_time": reminder, "reminder_text": "the iPhone 13 deal"})
+            else:
+                state = UserState(last_activity, sent, intent, 0,
+                                  reminder, "the iPhone 13 deal" if reminder else "")
+            app.user_states[phone] = state
+    built = time.perf_counter() - start
+    gc.collect()
+    after = rss_bytes()
+    result = {"users": len(app.user_states), "bytes_per_user": (after - before) / count, "rss": after,
+              "build_seconds": built}
+
+    if layout == "slots":
+        start = time.perf_counter()
+        app.run_state_eviction("users", now)
+        result["sweep_seconds"] = time.perf_counter() - start
+        gc.collect()
+        result["users_after_eviction"] = len(app.user_states)
+        result["rss_after_eviction"] = rss_bytes()
+        # Freed records stay with the allocator; new contacts reuse them instead of growing RSS
+        for i in range(count - len(app.user_states)):
+            app.user_states[f"+2777{i:07d}"] = UserState(now, 0, "ad_reply")
+        gc.collect()
+        result["rss_after_refill"] = rss_bytes()
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=1000000)
+    parser.add_argument("--days", type=float, default=60, help="spread of contacts' last activity")
+    parser.add_argument("--seed", type=int, default=18)
+    parser.add_argument("--child", choices=["dict", "slots"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.contacts, args.days, args.seed)
+        return
+
+    for layout, label in [("dict", "dict + reply text"), ("slots", "UserState + response ID")]:
+        out = subprocess.run([sys.executable, __file__, "--child", layout, "--contacts", str(args.contacts),
+                              "--days", str(args.days), "--seed", str(args.seed)],
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(f"{label:<24} {result['users']:>9,} users  {result['bytes_per_user']:6.0f} bytes/user  "
+              f"RSS {result['rss'] / 2**20:7.1f} MiB  (built in {result['build_seconds']:.1f}s)")
+        if layout == "slots":
+            print(f"{'after idle eviction':<24} {result['users_after_eviction']:>9,} users  "
+                  f"RSS {result['rss_after_eviction'] / 2**20:7.1f} MiB  (sweep {result['sweep_seconds']:.2f}s)")
+            print(f"{'refilled with new':<24} {args.contacts:>9,} users  RSS {result['rss_after_refill'] / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# Horizontal scaling across gunicorn workers on one host. For each --workers count the app
+# runs with STATE_BACKEND=sqlite against the local OpenAI/Twilio stubs, and --senders
+# customers each hold a conversation of --messages messages (AI questions, with a purchase
+# every third message), waiting for each reply before sending the next. Reports webhook
+# throughput and latency, then checks every worker agrees on the state: an admin sales report
+# from each worker must count every purchase, and every conversation must hold each of its
+# exchanges in order. A last round has each customer send --burst messages at once, with the
+# per-user lease and without it, counting conversations whose exchanges were interleaved; the
+# memory backend at the largest worker count shows what separate per-process state looks like.
+#
+#   python benchmarks/bench_workers.py --workers 1 2 4 8 --senders 64 --messages 6
+import argparse
+import asyncio
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app_loader import BENCH_ENV, ROOT
+from load_test_webhook import free_port
+from stub_servers import start_stub_server
+
+SECRET_PHRASE = "admin access granted"
+
+
+def start_workers(workers, port, stub_url, workdir, extra_env, log):
+    env = dict(os.environ, **BENCH_ENV)
+    env.update({
+        "OPENAI_API_BASE": f"{stub_url}/v1", "TWILIO_API_BASE": stub_url,
+        "OPENAI_CACHE_ENABLED": "False", "OPENAI_MAX_IN_FLIGHT": "0", "SENDER_RATE_LIMIT": "0",
+        "CONTEXT_SUMMARIES": "False", "SECRET_PHRASE": SECRET_PHRASE,
+        "STATE_JOURNAL_PATH": os.path.join(workdir, "state.db"),
+        "CONVERSATION_DB": os.path.join(workdir, "conversations.db"),
+        "IDEMPOTENCY_DB": os.path.join(workdir, "idempotency.db"),
+        "SCHEDULER_LOCK_PATH": os.path.join(workdir, "scheduler.lock"),
+        "CAMPAIGN_CHECKPOINT_DIR": os.path.join(workdir, "campaigns"),
+    })
+    env.update(extra_env)
+    # Run from the repo root so gunicorn.conf.py starts each worker's services
+    command = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+               "--log-level", "warning", "--backlog", "4096", "--timeout", "120",
+               "benchmarks.app_loader:wsgi_app()"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("gunicorn did not start")
+
+
+def sender(index):
+    return f"+2775{index:07d}"
+
+
+def message(index, k):
+    if k % 3 == 2:
+        return "I want to buy an iPhone 12"
+    return f"question {index}-{k}: does it come with a charger"
+
+
+async def post(client, url, phone, body, message_sid):
+    async with client.post(url, data={"From": f"whatsapp:{phone}", "Body": body, "MessageSid": message_sid}) as response:
+        return response.status, await response.json()
+
+
+# Each sender sends `messages` messages, `burst` at a time, waiting for the replies in between
+async def converse(url, senders, messages, burst):
+    latencies, errors = [], 0
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as client:
+        async def one(index, k):
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                status, _ = await post(client, url, sender(index), message(index, k), f"SM{index:07d}{k:04d}")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            errors += status != 200
+
+        async def customer(index):
+            for k in range(0, messages, burst):
+                await asyncio.gather(*(one(index, j) for j in range(k, min(k + burst, messages))))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(customer(i) for i in range(senders)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, latencies, errors
+
+
+# Pending sales counted by admin reports sent from distinct numbers, so they land on different workers
+async def reported_pending(url, reports):
+    async with aiohttp.ClientSession() as client:
+        replies = await asyncio.gather(*(post(client, url, f"+2774{i:07d}", SECRET_PHRASE, f"SMadmin{i}")
+                                         for i in range(reports)))
+    return sorted({int(re.search(r"Pending Sales: (\d+)", body["response"]).group(1)) for _, body in replies})
+
+
+# Conversations missing turns, and conversations where two exchanges were interleaved
+def check_conversations(path, senders, messages):
+    with sqlite3.connect(path) as db:
+        rows = db.execute("SELECT user, role FROM conversation_turns ORDER BY user, seq").fetchall()
+    roles = {}
+    for user, role in rows:
+        roles.setdefault(user, []).append(role)
+    expected = ["user", "assistant"] * messages
+    incomplete = sum(len(roles.get(sender(i), [])) != len(expected) for i in range(senders))
+    interleaved = sum(roles.get(sender(i), []) != expected for i in range(senders)) - incomplete
+    return incomplete, interleaved
+
+
+def run(args, stub_url, workers, messages, burst, extra_env):
+    workdir = tempfile.mkdtemp()
+    port = free_port()
+    log = open(os.path.join(workdir, "gunicorn.log"), "w")
+    process = start_workers(workers, port, stub_url, workdir, extra_env, log)
+    url = f"http://127.0.0.1:{port}/webhook"
+    try:
+        elapsed, latencies, errors = asyncio.run(converse(url, args.senders, messages, burst))
+        pending = asyncio.run(reported_pending(url, 4 * workers))
+    finally:
+        process.terminate()
+        process.wait()
+        log.close()
+    result = {"rate": len(latencies) / elapsed, "p50": latencies[len(latencies) // 2],
+              "p99": latencies[int(len(latencies) * 0.99) - 1], "errors": errors, "pending": pending,
+              "expected_pending": args.senders * sum(message(0, k).startswith("I want") for k in range(messages))}
+    conversations = os.path.join(workdir, "conversations.db")
+    result["incomplete"], result["interleaved"] = (check_conversations(conversations, args.senders, messages)
+                                                   if os.path.exists(conversations) else (None, None))
+    return result
+
+
+def describe(label, result):
+    pending = ",".join(map(str, result["pending"]))
+    consistent = result["pending"] == [result["expected_pending"]]
+    conversations = ("n/a (per-process)" if result["incomplete"] is None
+                     else f"{result['incomplete']} incomplete, {result['interleaved']} interleaved")
+    print(f"{label:<24} {result['rate']:7.1f} msg/s  p50 {result['p50'] * 1e3:6.0f}ms  p99 {result['p99'] * 1e3:6.0f}ms  "
+          f"errors {result['errors']}  pending sales seen {pending} "
+          f"(expected {result['expected_pending']}{', ok' if consistent else ''})  conversations: {conversations}")
+    return result["rate"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--senders", type=int, default=64)
+    parser.add_argument("--messages", type=int, default=6, help="messages per sender (at most 10, the stored history)")
+    parser.add_argument("--burst", type=int, default=3, help="messages each sender sends at once in the ordering round")
+    parser.add_argument("--openai-latency", type=float, default=0.2)
+    parser.add_argument("--twilio-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    stub_port, _ = start_stub_server(0, args.openai_latency, args.twilio_latency)
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    print(f"{os.cpu_count()} CPUs, OpenAI latency {args.openai_latency * 1e3:.0f}ms, "
+          f"{args.senders} senders x {args.messages} messages")
+
+    base = None
+    for workers in args.workers:
+        rate = describe(f"sqlite, {workers} workers", run(args, stub_url, workers, args.messages, 1, {"STATE_BACKEND": "sqlite"}))
+        base = base or rate / workers
+        print(f"{'':<24} {rate / (base * workers):7.0%} of linear scaling from {args.workers[0]} worker(s)")
+
+    workers = max(args.workers)
+    print(f"bursts of {args.burst} messages per sender, {workers} workers:")
+    describe("sqlite, leases", run(args, stub_url, workers, args.messages, args.burst, {"STATE_BACKEND": "sqlite"}))
+    describe("sqlite, no leases", run(args, stub_url, workers, args.messages, args.burst,
+                                      {"STATE_BACKEND": "sqlite", "USER_LEASES": "False"}))
+    describe("memory (per process)", run(args, stub_url, workers, args.messages, 1, {"STATE_BACKEND": "memory"}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Load test the sync (gunicorn sync workers) and async (uvicorn + asgi_app) webhook
+# paths against local OpenAI/Twilio stubs. Every message falls through to the AI
+# fallback, with the response cache disabled, so each request waits on the stub.
+#
+#   python benchmarks/load_test_webhook.py --requests 400 --concurrency 100 --openai-latency 0.5
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_servers import start_stub_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_target(mode, port, stub_url, workers, log):
+    env = dict(os.environ,
+               OPENAI_API_KEY="sk-bench", OPENAI_API_BASE=f"{stub_url}/v1",
+               TWILIO_ACCOUNT_SID="ACbench", TWILIO_AUTH_TOKEN="bench", TWILIO_PHONE_NUMBER="+15550000000",
+               TWILIO_API_BASE=stub_url, OPENAI_CACHE_ENABLED="False", OPENAI_MAX_IN_FLIGHT="0")
+    if mode == "sync":
+        command = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+                   "--log-level", "warning", "--backlog", "4096", "--timeout", "120",
+                   "benchmarks.app_loader:wsgi_app()"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "--factory", "benchmarks.app_loader:asgi_app",
+                   "--port", str(port), "--log-level", "warning", "--workers", str(workers),
+                   "--timeout-keep-alive", "30", "--backlog", "4096"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+async def fire(url, requests, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    async with client.post(url, data={"From": f"whatsapp:+2771{i:07d}",
+                                                      "Body": f"hello, question {i} on warranty"}) as response:
+                        await response.read()
+                        ok = response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--twilio-latency", type=float, default=0.05)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"])
+    args = parser.parse_args()
+
+    stub_port, stats = start_stub_server(0, args.openai_latency, args.twilio_latency)
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    for mode in args.modes:
+        port = free_port()
+        log = open(os.path.join(tempfile.gettempdir(), f"load_test_{mode}.log"), "w")
+        process = start_target(mode, port, stub_url, args.workers, log)
+        try:
+            elapsed, latencies, errors = asyncio.run(fire(f"http://127.0.0.1:{port}/webhook", args.requests, args.concurrency))
+        finally:
+            process.terminate()
+            process.wait()
+            log.close()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"{mode:>5} ({args.workers} workers): {args.requests / elapsed:7.1f} req/s, "
+              f"p50 {p50 * 1e3:7.1f}ms, p99 {p99 * 1e3:7.1f}ms, errors {errors}")
+    print(f"stub calls: openai {stats.get('openai', 0)}, twilio {stats.get('twilio', 0)}")
+
+
+if __name__ == "__main__":
+    main()
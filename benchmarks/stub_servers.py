@@ -0,0 +1,129 @@
+# Local stand-ins for the OpenAI and Twilio HTTP APIs with configurable latency.
+# Runs on its own asyncio loop so thousands of concurrent keep-alive connections
+# cost nothing, keeping the stub out of the measurement. With --reply-tokens the
+# OpenAI stub generates a long answer one token every --token-delay seconds,
+# streamed as server-sent events when the request asks for "stream": true.
+#
+#   python benchmarks/stub_servers.py --port 8099 --openai-latency 0.5
+#   python benchmarks/stub_servers.py --openai-latency 0.3 --reply-tokens 300 --token-delay 0.02
+import argparse
+import asyncio
+import json
+import re
+import threading
+
+STUB_SENTENCES = [
+    "The iPhone 13 comes in Pink, Blue, Midnight, Starlight, Red and Green.",
+    "It has a 6.1-inch Super Retina XDR display and the A15 Bionic chip.",
+    "The 128GB model is R7,549 and the 256GB model is R8,049.",
+    "You can pay by card, PayPal or bank transfer.\n",
+    "We also offer an installment plan of up to 24 months with a R750 deposit.",
+    "Battery life is up to 19 hours of video playback.\n\n",
+    "Let me know which color and storage you would like!",
+]
+
+
+# Answer text split into tokens (words with their trailing whitespace)
+def stub_reply_tokens(question: str, reply_tokens: int):
+    tokens = re.findall(r"\S+\s*", f"Stub answer to: {question}. ")
+    index = 0
+    while len(tokens) < reply_tokens:
+        tokens.extend(re.findall(r"\S+\s*", STUB_SENTENCES[index % len(STUB_SENTENCES)] + " "))
+        index += 1
+    return tokens
+
+
+def _sse_chunk(data: bytes) -> bytes:
+    return f"{len(data):x}\r\n".encode() + data + b"\r\n"
+
+
+async def _handle(reader, writer, openai_latency, twilio_latency, stats, reply_tokens=0, token_delay=0.0):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+            payload = await reader.readexactly(int(headers.get("content-length", 0)))
+            path = request_line.split(" ")[1]
+
+            if path.endswith("/chat/completions"):
+                await asyncio.sleep(openai_latency)
+                request = json.loads(payload)
+                question = request["messages"][-1]["content"]
+                status, counter = 200, "openai"
+                if not reply_tokens:
+                    content = f"Stub answer to: {question}"
+                elif request.get("stream"):
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                                 b"Transfer-Encoding: chunked\r\n\r\n")
+                    for token in stub_reply_tokens(question, reply_tokens):
+                        await asyncio.sleep(token_delay)
+                        event = {"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                        writer.write(_sse_chunk(f"data: {json.dumps(event)}\n\n".encode()))
+                        await writer.drain()
+                    writer.write(_sse_chunk(b"data: [DONE]\n\n") + b"0\r\n\r\n")
+                    await writer.drain()
+                    stats[counter] = stats.get(counter, 0) + 1
+                    continue
+                else:
+                    tokens = stub_reply_tokens(question, reply_tokens)
+                    await asyncio.sleep(token_delay * len(tokens))
+                    content = "".join(tokens).strip()
+                body = {"choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+            elif path.endswith("/Messages.json"):
+                await asyncio.sleep(twilio_latency)
+                status, counter = 201, "twilio"
+                body = {"sid": "SMbench", "status": "queued"}
+            else:
+                status, counter = 404, "other"
+                body = {"error": "not found"}
+
+            data = json.dumps(body).encode()
+            writer.write(f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+            await writer.drain()
+            stats[counter] = stats.get(counter, 0) + 1
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+# Start the stub server on a background thread; returns (port, stats)
+def start_stub_server(port=0, openai_latency=0.5, twilio_latency=0.05, reply_tokens=0, token_delay=0.0):
+    stats = {}
+    ready = threading.Event()
+    bound = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(
+            lambda r, w: _handle(r, w, openai_latency, twilio_latency, stats, reply_tokens, token_delay),
+            "127.0.0.1", port, backlog=4096,
+        ))
+        bound["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return bound["port"], stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--twilio-latency", type=float, default=0.05)
+    parser.add_argument("--reply-tokens", type=int, default=0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    port, _ = start_stub_server(args.port, args.openai_latency, args.twilio_latency, args.reply_tokens, args.token_delay)
+    print(f"Stub OpenAI/Twilio listening on http://127.0.0.1:{port}")
+    threading.Event().wait()
@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+# Token bucket pacing callers to `rate` acquisitions per second, with bursts up to `burst`
+class RateLimiter:
+    def __init__(self, rate: float, burst: Optional[float] = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    # Block until a token is available
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
+
+
+# Sends one message to many recipients in fixed-size batches. Each batch is sent
+# concurrently through the outbound queue's retrying `send_now`, paced by a shared
+# messages-per-second budget. Progress is checkpointed after every batch, so a
+# campaign interrupted by a restart resumes at the first unfinished batch; a campaign
+# started with `checkpoint=False` leaves nothing to resume.
+class CampaignRunner:
+    def __init__(self, outbound, rate: float = 20.0, batch_size: int = 500, concurrency: int = 8,
+                 checkpoint_dir: Optional[str] = None,
+                 should_skip: Optional[Callable[[str], bool]] = None,
+                 on_sent: Optional[Callable[[str, float], None]] = None):
+        self.outbound = outbound
+        self.limiter = RateLimiter(rate)
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.checkpoint_dir = checkpoint_dir
+        self.should_skip = should_skip
+        self.on_sent = on_sent
+        self.history = deque(maxlen=20)
+        self.current: Optional[Dict[str, object]] = None
+        self._thread = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # Run a campaign on a background thread; False if another one is still running
+    def start(self, campaign_id: str, recipients: List[str], body: str, checkpoint: bool = True) -> bool:
+        with self._lock:
+            if self.running:
+                return False
+            self._stopped = False
+            self._thread = threading.Thread(target=self.run, args=(campaign_id, recipients, body, checkpoint),
+                                            name=f"campaign-{campaign_id}", daemon=True)
+            self._thread.start()
+            return True
+
+    # Resume the unfinished campaign left in the checkpoint directory, if any
+    def resume(self) -> bool:
+        unfinished = self._unfinished()
+        if not unfinished:
+            return False
+        recipients, body = self._load_campaign(unfinished[0])
+        logging.info(f"Resuming campaign {unfinished[0]}")
+        return self.start(unfinished[0], recipients, body)
+
+    # Wait for the running campaign to finish
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # Ask the running campaign to stop after its current batch; it can be resumed later
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopped = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # Send a campaign on the calling thread and return its metrics
+    def run(self, campaign_id: str, recipients: List[str], body: str, checkpoint: bool = True) -> Dict[str, object]:
+        recipients = list(dict.fromkeys(recipients))
+        progress = self._load_progress(campaign_id) if checkpoint else None
+        if progress is None:
+            if checkpoint:
+                self._save_campaign(campaign_id, recipients, body)
+            progress = {"next_batch": 0, "sent": 0, "failed": 0, "skipped": 0, "elapsed": 0.0}
+        metrics = dict(progress, campaign=campaign_id, recipients=len(recipients), done=False)
+        self.current = metrics
+        start = time.perf_counter() - progress["elapsed"]
+        batches = range(progress["next_batch"] * self.batch_size, len(recipients), self.batch_size)
+
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix=f"campaign-{campaign_id}") as pool:
+            for offset in batches:
+                if self._stopped:
+                    break
+                batch = recipients[offset:offset + self.batch_size]
+                for outcome in pool.map(lambda to: self._send(to, body), batch):
+                    metrics[outcome] += 1
+                metrics["next_batch"] += 1
+                metrics["elapsed"] = time.perf_counter() - start
+                if checkpoint:
+                    self._save_progress(campaign_id, metrics)
+
+        elapsed = time.perf_counter() - start
+        metrics.update(done=not self._stopped, elapsed=elapsed, sent_per_sec=metrics["sent"] / elapsed if elapsed else 0.0)
+        if checkpoint and metrics["done"]:
+            self._discard(campaign_id)
+        elif checkpoint:
+            self._save_progress(campaign_id, metrics)
+        self.history.append(metrics)
+        self.current = None
+        logging.info(f"Campaign {campaign_id} {'finished' if metrics['done'] else 'paused'}: "
+                     f"{metrics['sent']} sent, {metrics['failed']} failed, {metrics['skipped']} skipped "
+                     f"in {elapsed:.1f}s ({metrics['sent_per_sec']:.1f} msg/s)")
+        return metrics
+
+    def _send(self, to: str, body: str) -> str:
+        if self.outbound.is_queued(to) or (self.should_skip and self.should_skip(to)):
+            return "skipped"
+        self.limiter.acquire()
+        if not self.outbound.send_now(to, body):
+            return "failed"
+        if self.on_sent:
+            try:
+                self.on_sent(to, time.time())
+            except Exception as e:
+                logging.error(f"Campaign on_sent callback failed for {to}: {e}")
+        return "sent"
+
+    # Checkpoint files: `<id>.campaign.json` (recipients and body, written once) and
+    # `<id>.progress.json` (rewritten after each batch); both are removed once it finishes
+    def _path(self, campaign_id: str, kind: str) -> Optional[str]:
+        if not self.checkpoint_dir:
+            return None
+        return os.path.join(self.checkpoint_dir, f"{campaign_id}.{kind}.json")
+
+    def _write_json(self, path: Optional[str], payload: Dict[str, object]) -> None:
+        if path is None:
+            return
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _read_json(self, path: Optional[str]) -> Optional[Dict[str, object]]:
+        if path is None or not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    # The checkpoint directory is created with the first campaign, not when the runner is built
+    def _save_campaign(self, campaign_id: str, recipients: List[str], body: str) -> None:
+        if self.checkpoint_dir:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self._write_json(self._path(campaign_id, "campaign"), {"recipients": recipients, "body": body})
+
+    def _load_campaign(self, campaign_id: str):
+        campaign = self._read_json(self._path(campaign_id, "campaign"))
+        return campaign["recipients"], campaign["body"]
+
+    def _save_progress(self, campaign_id: str, metrics: Dict[str, object]) -> None:
+        self._write_json(self._path(campaign_id, "progress"), {
+            key: metrics[key] for key in ("next_batch", "sent", "failed", "skipped", "elapsed", "done") if key in metrics
+        })
+
+    # Progress of an unfinished campaign, or None if it was never started
+    def _load_progress(self, campaign_id: str) -> Optional[Dict[str, object]]:
+        if self.checkpoint_dir and not os.path.exists(self._path(campaign_id, "campaign")):
+            return None
+        return self._read_json(self._path(campaign_id, "progress"))
+
+    def _discard(self, campaign_id: str) -> None:
+        for kind in ("campaign", "progress"):
+            path = self._path(campaign_id, kind)
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def _unfinished(self) -> List[str]:
+        if not self.checkpoint_dir or not os.path.isdir(self.checkpoint_dir):
+            return []
+        unfinished = []
+        for name in sorted(os.listdir(self.checkpoint_dir)):
+            if name.endswith(".campaign.json"):
+                campaign_id = name[:-len(".campaign.json")]
+                progress = self._read_json(self._path(campaign_id, "progress")) or {}
+                if not progress.get("done"):
+                    unfinished.append(campaign_id)
+        return unfinished
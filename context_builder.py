@@ -0,0 +1,156 @@
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Tokens OpenAI adds around every chat message
+MESSAGE_OVERHEAD = 4
+
+
+# Counts prompt tokens with tiktoken when installed, otherwise estimates ~4 characters
+# per token. Counts are memoized, so stored turns are only tokenized once.
+class TokenCounter:
+    def __init__(self, model: str = "gpt-3.5-turbo", cache_size: int = 65536):
+        self._encoding = tiktoken.encoding_for_model(model) if tiktoken else None
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    def message(self, message: Dict[str, str]) -> int:
+        return self.count(message["content"]) + MESSAGE_OVERHEAD
+
+    def messages(self, messages: List[Dict[str, str]]) -> int:
+        return sum(self.message(message) for message in messages)
+
+    def _count(self, text: str) -> int:
+        if self._encoding is None:
+            return (len(text) + 3) // 4
+        return len(self._encoding.encode(text))
+
+
+# Builds the conversation context sent with each OpenAI call under a token budget.
+# The system prompt is tokenized once; turns older than the last `keep_turns` are
+# folded into a per-user summary on a background thread (when `summarize` is given),
+# and the oldest turns are dropped whenever the prompt would exceed `max_prompt_tokens`.
+class ContextBuilder:
+    def __init__(self, system_prompt: str, max_prompt_tokens: int = 1500, keep_turns: int = 6,
+                 summarize: Optional[Callable[[str, List[Dict[str, str]]], str]] = None,
+                 summarize_batch: int = 6, max_users: int = 100000, ttl: float = 7 * 24 * 3600,
+                 counter: Optional[TokenCounter] = None, clock=time.time):
+        self.counter = counter or TokenCounter()
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.system_tokens = self.counter.message(self.system_message)
+        self.max_prompt_tokens = max_prompt_tokens
+        self.keep_turns = keep_turns
+        self.summarize = summarize
+        self.summarize_batch = max(1, summarize_batch)
+        self.max_users = max_users
+        self.ttl = ttl
+        self.clock = clock
+        # user -> (number of turns the summary covers, summary, updated at)
+        self._summaries: "OrderedDict[str, Tuple[int, str, float]]" = OrderedDict()
+        self._pending = set()
+        self._jobs: queue.Queue = queue.Queue(maxsize=1000)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {"prompts": 0, "turns_dropped": 0, "summaries": 0, "summary_errors": 0, "summaries_skipped": 0}
+
+    def start(self) -> None:
+        if self.summarize is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._worker, name="context-summaries", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        if self._thread is None:
+            return
+        self._jobs.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # Context turns for `user` (between the system prompt and the customer's message);
+    # `appended` is how many turns the user has had in total, the last of them history[-1]
+    def build(self, user: str, history: List[Dict[str, str]], customer_message: str,
+              appended: int) -> List[Dict[str, str]]:
+        summary, turns = self._split(user, history, appended)
+        if self.summarize is not None and len(turns) - self.keep_turns >= self.summarize_batch:
+            self._schedule(user, summary, turns[:len(turns) - self.keep_turns], appended - self.keep_turns)
+
+        summary_messages = [{"role": "system", "content": f"Summary of the earlier conversation: {summary}"}] if summary else []
+        budget = self.max_prompt_tokens - self.system_tokens - self.counter.count(customer_message) - MESSAGE_OVERHEAD
+        used = self.counter.messages(summary_messages) + self.counter.messages(turns)
+        first = 0
+        while first < len(turns) and used > budget:
+            used -= self.counter.message(turns[first])
+            first += 1
+        if used > budget:
+            summary_messages = []
+        with self._lock:
+            self.stats["prompts"] += 1
+            self.stats["turns_dropped"] += first
+        return summary_messages + turns[first:]
+
+    # Prompt tokens for a full request: system prompt, context and the customer's message
+    def prompt_tokens(self, context: List[Dict[str, str]], customer_message: str) -> int:
+        return self.system_tokens + self.counter.messages(context) + self.counter.count(customer_message) + MESSAGE_OVERHEAD
+
+    # Wait until queued summaries are written
+    def join(self) -> None:
+        self._jobs.join()
+
+    # The user's summary and the turns it does not cover yet
+    def _split(self, user: str, history: List[Dict[str, str]], appended: int) -> Tuple[str, List[Dict[str, str]]]:
+        with self._lock:
+            entry = self._summaries.get(user)
+            # A summary past the end of the history belongs to an expired or cleared conversation
+            if entry is not None and (entry[0] > appended or self.clock() - entry[2] > self.ttl):
+                del self._summaries[user]
+                entry = None
+        if entry is None:
+            return "", history
+        covered, summary, _ = entry
+        return summary, history[max(0, covered - (appended - len(history))):]
+
+    def _schedule(self, user: str, summary: str, turns: List[Dict[str, str]], covered: int) -> None:
+        with self._lock:
+            if user in self._pending:
+                return
+            self._pending.add(user)
+        try:
+            self._jobs.put_nowait((user, summary, turns, covered))
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(user)
+                self.stats["summaries_skipped"] += 1
+
+    def _worker(self) -> None:
+        while True:
+            job = self._jobs.get()
+            try:
+                if job is None:
+                    return
+                user, summary, turns, covered = job
+                try:
+                    updated = self.summarize(summary, turns)
+                except Exception as e:
+                    logging.error(f"Summarizing conversation for {user} failed: {e}")
+                    with self._lock:
+                        self.stats["summary_errors"] += 1
+                else:
+                    with self._lock:
+                        self._summaries[user] = (covered, updated, self.clock())
+                        self._summaries.move_to_end(user)
+                        while len(self._summaries) > self.max_users:
+                            self._summaries.popitem(last=False)
+                        self.stats["summaries"] += 1
+                finally:
+                    with self._lock:
+                        self._pending.discard(user)
+            finally:
+                self._jobs.task_done()
@@ -0,0 +1,178 @@
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+# Role strings are interned so every stored turn shares the same two objects
+ROLES = {"user": sys.intern("user"), "assistant": sys.intern("assistant"), "system": sys.intern("system")}
+
+
+# Server-side chat history per user. Turns come back in OpenAI message format.
+class ConversationStore:
+    def get(self, user: str) -> List[Dict[str, str]]:
+        raise NotImplementedError
+
+    # Stored turns plus the number of turns ever appended for the user, so callers can
+    # tell which turns are new since they last looked
+    def history(self, user: str) -> Tuple[int, List[Dict[str, str]]]:
+        raise NotImplementedError
+
+    def append(self, user: str, role: str, content: str) -> None:
+        raise NotImplementedError
+
+    def clear(self, user: str) -> None:
+        raise NotImplementedError
+
+
+# One user's history: a fixed-size ring buffer of (role, content) tuples
+class _Conversation:
+    __slots__ = ("turns", "touched", "appended")
+
+    def __init__(self, max_turns: int, touched: float):
+        self.turns = deque(maxlen=max_turns)
+        self.touched = touched
+        self.appended = 0
+
+
+# In-process store: LRU over users with a size cap, plus idle-TTL eviction
+class MemoryConversationStore(ConversationStore):
+    def __init__(self, max_turns: int = 20, max_users: int = 100000, ttl: float = 7 * 24 * 3600, clock=time.time):
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self.ttl = ttl
+        self.clock = clock
+        self._users: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user: str) -> List[Dict[str, str]]:
+        with self._lock:
+            conversation = self._lookup(user, self.clock())
+            if conversation is None:
+                return []
+            return [{"role": role, "content": content} for role, content in conversation.turns]
+
+    def history(self, user: str) -> Tuple[int, List[Dict[str, str]]]:
+        with self._lock:
+            conversation = self._lookup(user, self.clock())
+            if conversation is None:
+                return 0, []
+            return conversation.appended, [{"role": role, "content": content} for role, content in conversation.turns]
+
+    def append(self, user: str, role: str, content: str) -> None:
+        now = self.clock()
+        with self._lock:
+            conversation = self._lookup(user, now)
+            if conversation is None:
+                conversation = self._users[user] = _Conversation(self.max_turns, now)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            conversation.turns.append((ROLES.get(role, role), content))
+            conversation.appended += 1
+            self._evict_expired(now)
+
+    def clear(self, user: str) -> None:
+        with self._lock:
+            self._users.pop(user, None)
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def _lookup(self, user: str, now: float) -> Optional[_Conversation]:
+        conversation = self._users.get(user)
+        if conversation is None:
+            return None
+        if now - conversation.touched > self.ttl:
+            del self._users[user]
+            return None
+        conversation.touched = now
+        self._users.move_to_end(user)
+        return conversation
+
+    # Users are kept in access order, so expired ones are always at the front
+    def _evict_expired(self, now: float, limit: int = 64) -> None:
+        for _ in range(limit):
+            if not self._users:
+                return
+            user, conversation = next(iter(self._users.items()))
+            if now - conversation.touched <= self.ttl:
+                return
+            del self._users[user]
+
+
+# SQLite-backed store, for history that survives restarts and is shared by workers
+class SQLiteConversationStore(ConversationStore):
+    def __init__(self, path: str, max_turns: int = 20, ttl: float = 7 * 24 * 3600,
+                 sweep_interval: float = 3600, clock=time.time):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._last_sweep = clock()
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    # The database is opened on first use, so building the store (at import, or in a
+    # pre-fork master) creates no file and no connection shared across fork; caller holds the lock
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_turns ("
+                " user TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL,"
+                " content TEXT NOT NULL, created REAL NOT NULL, PRIMARY KEY (user, seq))"
+            )
+            self._connection = db
+        return self._connection
+
+    def get(self, user: str) -> List[Dict[str, str]]:
+        return self.history(user)[1]
+
+    def history(self, user: str) -> Tuple[int, List[Dict[str, str]]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, role, content FROM conversation_turns WHERE user = ? AND created >= ?"
+                " ORDER BY seq DESC LIMIT ?",
+                (user, self.clock() - self.ttl, self.max_turns),
+            ).fetchall()
+        if not rows:
+            return 0, []
+        return rows[0][0], [{"role": role, "content": content} for _, role, content in reversed(rows)]
+
+    def append(self, user: str, role: str, content: str) -> None:
+        now = self.clock()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._db.execute(
+                    "SELECT COALESCE(MAX(seq), 0) + 1 FROM conversation_turns WHERE user = ?", (user,)
+                ).fetchone()[0]
+                self._db.execute(
+                    "INSERT INTO conversation_turns (user, seq, role, content, created) VALUES (?, ?, ?, ?, ?)",
+                    (user, seq, role, content, now),
+                )
+                self._db.execute(
+                    "DELETE FROM conversation_turns WHERE user = ? AND seq <= ?", (user, seq - self.max_turns)
+                )
+                if now - self._last_sweep > self.sweep_interval:
+                    self._db.execute("DELETE FROM conversation_turns WHERE created < ?", (now - self.ttl,))
+                    self._last_sweep = now
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def clear(self, user: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM conversation_turns WHERE user = ?", (user,))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,7 @@
+# Gunicorn settings, read from the working directory (gunicorn app:app in the Procfile)
+
+# Start each worker's services -- state restore, outbound workers, client imports and the
+# scheduler election -- before it accepts requests, so the first webhook does not wait on them
+def post_worker_init(worker):
+    from app import start_services
+    start_services()
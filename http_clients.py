@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import weakref
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from outbound import TransportError, split_message
+
+OPENAI_API_BASE = "https://api.openai.com/v1"
+TWILIO_API_BASE = "https://api.twilio.com"
+
+
+# Parse a Retry-After header (seconds) from a rate-limited response, if present
+def _retry_after(headers) -> Optional[float]:
+    try:
+        return float(headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+# Lazily created aiohttp session; aiohttp sessions must be opened on the running loop
+class _AsyncSession:
+    def __init__(self, max_connections: int, timeout: float, headers: Optional[Dict[str, str]] = None,
+                 auth: Optional[aiohttp.BasicAuth] = None):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.headers = headers
+        self.auth = auth
+        self._session = None
+
+    def get(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=self.headers,
+                auth=self.auth,
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+# Non-blocking OpenAI chat completions over a pooled keep-alive connection set
+class AsyncOpenAIClient:
+    def __init__(self, api_key: str, api_base: str = OPENAI_API_BASE, timeout: float = 30.0,
+                 max_connections: int = 100):
+        self.api_base = api_base.rstrip("/")
+        self._session = _AsyncSession(max_connections, timeout, headers={"Authorization": f"Bearer {api_key}"})
+
+    async def chat(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo",
+                   temperature: float = 0.7, max_tokens: int = 300) -> str:
+        async with self._session.get().post(f"{self.api_base}/chat/completions", json={
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }) as response:
+            response.raise_for_status()
+            payload = await response.json()
+        return payload["choices"][0]["message"]["content"].strip()
+
+    # Stream a chat completion, yielding text deltas as the server-sent events arrive
+    async def chat_stream(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo",
+                          temperature: float = 0.7, max_tokens: int = 300) -> AsyncIterator[str]:
+        async with self._session.get().post(f"{self.api_base}/chat/completions", json={
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    return
+                text = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if text:
+                    yield text
+
+    async def aclose(self) -> None:
+        await self._session.close()
+
+
+# Twilio Messages API over a pooled requests session; a drop-in OutboundQueue transport
+class TwilioRestTransport:
+    def __init__(self, account_sid: str, auth_token: str, from_number: str,
+                 api_base: str = TWILIO_API_BASE, timeout: float = 15.0, max_connections: int = 20):
+        self.from_number = from_number
+        self.timeout = timeout
+        self._url = f"{api_base.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self._session = requests.Session()
+        self._session.auth = (account_sid, auth_token)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def send(self, to: str, body: str) -> None:
+        try:
+            response = self._session.post(self._url, timeout=self.timeout, data={
+                "From": f"whatsapp:{self.from_number}",
+                "To": f"whatsapp:{to}",
+                "Body": body,
+            })
+        except requests.RequestException as e:
+            raise TransportError(str(e)) from e
+        if response.status_code >= 400:
+            raise TransportError(response.text, status=response.status_code, retry_after=_retry_after(response.headers))
+
+    def close(self) -> None:
+        self._session.close()
+
+
+# Non-blocking Twilio sends for the async webhook path. Messages to one recipient
+# are serialized so chunks and consecutive replies arrive in order.
+class AsyncTwilioClient:
+    def __init__(self, account_sid: str, auth_token: str, from_number: str,
+                 api_base: str = TWILIO_API_BASE, timeout: float = 15.0, max_connections: int = 100,
+                 max_retries: int = 5, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 observe_send: Optional[Callable[[float], None]] = None):
+        self.from_number = from_number
+        self.observe_send = observe_send
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._url = f"{api_base.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self._session = _AsyncSession(max_connections, timeout, auth=aiohttp.BasicAuth(account_sid, auth_token))
+        self._recipient_locks = weakref.WeakValueDictionary()
+
+    async def send(self, to: str, body: str) -> None:
+        try:
+            async with self._session.get().post(self._url, data={
+                "From": f"whatsapp:{self.from_number}",
+                "To": f"whatsapp:{to}",
+                "Body": body,
+            }) as response:
+                if response.status >= 400:
+                    raise TransportError(await response.text(), status=response.status,
+                                         retry_after=_retry_after(response.headers))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise TransportError(str(e)) from e
+
+    # Send a full message in chunks, retrying rate limits and transient errors with backoff
+    async def send_message(self, to: str, body: str) -> bool:
+        lock = self._recipient_locks.get(to)
+        if lock is None:
+            lock = self._recipient_locks[to] = asyncio.Lock()
+        async with lock:
+            for chunk in split_message(body):
+                if not await self._deliver(to, chunk):
+                    return False
+        logging.info(f"Message sent to {to}: {body[:50]}...")
+        return True
+
+    async def _send_chunk(self, to: str, chunk: str) -> None:
+        if self.observe_send is None:
+            await self.send(to, chunk)
+            return
+        start = time.perf_counter()
+        try:
+            await self.send(to, chunk)
+        finally:
+            self.observe_send(time.perf_counter() - start)
+
+    async def _deliver(self, to: str, chunk: str) -> bool:
+        attempt = 0
+        while True:
+            try:
+                await self._send_chunk(to, chunk)
+                return True
+            except TransportError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    logging.error(f"Failed to send message to {to}: {e}")
+                    return False
+                delay = e.retry_after or min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self._session.close()
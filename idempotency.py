@@ -0,0 +1,180 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+# Webhook deliveries already seen, keyed on Twilio's MessageSid. The first delivery
+# claims the key with `begin` and records its response with `finish` (or `release`s it
+# if processing failed); redeliveries get that response from `result` instead of
+# being processed again. A claim older than `lease` seconds that never finished is
+# treated as abandoned, so a crashed worker does not swallow the message.
+class IdempotencyStore:
+    def begin(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def finish(self, key: str, status: int, body: Dict) -> None:
+        raise NotImplementedError
+
+    def release(self, key: str) -> None:
+        raise NotImplementedError
+
+    # The first delivery's (status, body), waiting up to `timeout` seconds while it is
+    # still being processed; None if it has not finished by then
+    def result(self, key: str, timeout: float = 0.0) -> Optional[Tuple[int, Dict]]:
+        raise NotImplementedError
+
+
+class _Delivery:
+    __slots__ = ("claimed", "response")
+
+    def __init__(self, claimed: float):
+        self.claimed = claimed
+        self.response: Optional[Tuple[int, Dict]] = None
+
+
+# In-process seen-set: bounded by entry count, entries expire `ttl` seconds after the first delivery
+class MemoryIdempotencyStore(IdempotencyStore):
+    def __init__(self, max_entries: int = 100000, ttl: float = 24 * 3600, lease: float = 60.0, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lease = lease
+        self.clock = clock
+        self._seen: "OrderedDict[str, _Delivery]" = OrderedDict()
+        self._done = threading.Condition()
+
+    def begin(self, key: str) -> bool:
+        now = self.clock()
+        with self._done:
+            self._expire(now)
+            delivery = self._seen.get(key)
+            if delivery is not None and (delivery.response is not None or now - delivery.claimed < self.lease):
+                return False
+            self._seen.pop(key, None)
+            self._seen[key] = _Delivery(now)
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return True
+
+    def finish(self, key: str, status: int, body: Dict) -> None:
+        with self._done:
+            delivery = self._seen.get(key)
+            if delivery is not None:
+                delivery.response = (status, body)
+            self._done.notify_all()
+
+    def release(self, key: str) -> None:
+        with self._done:
+            self._seen.pop(key, None)
+            self._done.notify_all()
+
+    def result(self, key: str, timeout: float = 0.0) -> Optional[Tuple[int, Dict]]:
+        deadline = time.monotonic() + timeout
+        with self._done:
+            while True:
+                delivery = self._seen.get(key)
+                if delivery is None or delivery.response is not None:
+                    return delivery.response if delivery else None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._done.wait(remaining)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    # Entries are kept in claim order, so expired ones are always at the front
+    def _expire(self, now: float, limit: int = 64) -> None:
+        for _ in range(limit):
+            if not self._seen:
+                return
+            key, delivery = next(iter(self._seen.items()))
+            if now - delivery.claimed <= self.ttl:
+                return
+            del self._seen[key]
+
+
+# SQLite-backed seen-set shared by workers on one host; claims are atomic inserts
+class SQLiteIdempotencyStore(IdempotencyStore):
+    def __init__(self, path: str, ttl: float = 24 * 3600, lease: float = 60.0, poll_interval: float = 0.05,
+                 sweep_interval: float = 600, clock=time.time):
+        self.ttl = ttl
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._last_sweep = clock()
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    # Opened on first use, not when the store is built; caller holds the lock
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_deliveries ("
+                " message_sid TEXT PRIMARY KEY, claimed REAL NOT NULL, status INTEGER, body TEXT)"
+            )
+            self._connection = db
+        return self._connection
+
+    def begin(self, key: str) -> bool:
+        now = self.clock()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Drop an expired entry or an abandoned claim for this message so it can be claimed again
+                self._db.execute(
+                    "DELETE FROM webhook_deliveries WHERE message_sid = ?"
+                    " AND (claimed < ? OR (status IS NULL AND claimed < ?))",
+                    (key, now - self.ttl, now - self.lease),
+                )
+                claimed = self._db.execute(
+                    "INSERT OR IGNORE INTO webhook_deliveries (message_sid, claimed) VALUES (?, ?)", (key, now)
+                ).rowcount == 1
+                if now - self._last_sweep > self.sweep_interval:
+                    self._db.execute("DELETE FROM webhook_deliveries WHERE claimed < ?", (now - self.ttl,))
+                    self._last_sweep = now
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def finish(self, key: str, status: int, body: Dict) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE webhook_deliveries SET status = ?, body = ? WHERE message_sid = ?",
+                (status, json.dumps(body), key),
+            )
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM webhook_deliveries WHERE message_sid = ? AND status IS NULL", (key,))
+
+    def result(self, key: str, timeout: float = 0.0) -> Optional[Tuple[int, Dict]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT status, body FROM webhook_deliveries WHERE message_sid = ?", (key,)
+                ).fetchone()
+            if row is None:
+                return None
+            if row[0] is not None:
+                return row[0], json.loads(row[1])
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
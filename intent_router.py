@@ -0,0 +1,148 @@
+import re
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+# Keyword lists per intent (matched as substrings of the normalized message)
+PURCHASE_KEYWORDS = ["buy", "order", "purchase", "pay", "eft", "transfer", "secure"]
+AD_KEYWORDS = ["know more", "tell me more", "about this", "interested", "details", "what's this", "ad", "advertisement"]
+PRICE_KEYWORDS = ["price", "model", "discount", "cost"]
+RECOMMEND_KEYWORDS = ["recommend", "suggest", "bundle", "accessories"]
+INSTALLMENT_KEYWORDS = ["installment", "installments", "monthly", "plan"]
+PICTURE_KEYWORDS = ["picture", "pictures", "image", "images", "see", "look"]
+
+# Keyword intents in precedence order (after admin, PAID, purchase requests and reminders)
+KEYWORD_INTENTS = [
+    ("purchase", PURCHASE_KEYWORDS),
+    ("ad_reply", AD_KEYWORDS),
+    ("price", PRICE_KEYWORDS),
+    ("recommend", RECOMMEND_KEYWORDS),
+    ("installment", INSTALLMENT_KEYWORDS),
+    ("picture", PICTURE_KEYWORDS),
+]
+
+PURCHASE_PATTERN = re.compile(
+    r"i(?:'| a)m interested in buying an? (iphone [^\s(]+(?: pro max| pro| max)?) \(([^,]+),\s*(\d+\s*[gt]b)\)(?:\s*for\s*r(\d+))?"
+)
+REMINDER_PATTERN = re.compile(r"remind me in (\d+) (minute|minutes|hour|hours|day|days)")
+ABOUT_PATTERN = re.compile(r"about", re.IGNORECASE)
+REMINDER_UNITS = {"minute": (60, "minutes"), "hour": (3600, "hours"), "day": (24 * 3600, "days")}
+
+
+# Result of routing one message; purchase and reminder fields are filled in when parsed
+class Intent(NamedTuple):
+    name: str
+    text: str
+    model: str = ""
+    color: str = ""
+    storage: str = ""
+    price: Optional[int] = None
+    reminder_seconds: int = 0
+    reminder_unit: str = ""
+    reminder_text: str = ""
+
+
+# Lowercase once and fold the curly apostrophe phones insert into a plain one
+def normalize_message(message: str) -> str:
+    return message.lower().replace("’", "'")
+
+
+# Parse specific purchase request from normalized text
+def parse_purchase_request(text: str) -> tuple[str, str, str, int, bool]:
+    match = PURCHASE_PATTERN.search(text) if "interested in buying" in text else None
+    if match:
+        model = match.group(1)  # e.g., "iphone 13"
+        color = match.group(2).strip()  # e.g., "pink"
+        storage = match.group(3)  # e.g., "128gb" or "1tb"
+        price = int(match.group(4)) if match.group(4) else None  # e.g., 11000 or None
+        return model.capitalize(), color.capitalize(), storage, price, True
+    return "", "", "", 0, False
+
+
+# Parse reminder request from normalized text
+def parse_reminder(text: str) -> tuple[int, str, bool]:
+    match = REMINDER_PATTERN.search(text) if "remind me in" in text else None
+    if match:
+        seconds, unit = REMINDER_UNITS[match.group(2).rstrip("s")]
+        return int(match.group(1)) * seconds, unit, True
+    return 0, "", False
+
+
+# Build a regex alternation shaped like a trie, so the engine picks a branch by the
+# next character instead of trying every keyword; greedy optional tails make the
+# longest keyword win at each position
+def _trie_pattern(keywords: List[str]) -> str:
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node: Dict[str, dict]) -> str:
+        ends_here = "" in node
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends_here:
+            body = ("(?:" + body + ")" if len(branches) == 1 and len(body) > 1 else body) + "?"
+        return body
+
+    return render(trie)
+
+
+# Single-pass intent router. All keywords are compiled into one trie-shaped alternation
+# inside a lookahead, so one scan finds the longest keyword starting at every position; any
+# shorter keyword starting there is a prefix of it, so each keyword carries the
+# intents of all its prefixes and plain substring semantics are preserved.
+class IntentRouter:
+    def __init__(self, admin_phrase: str, keyword_intents: List[Tuple[str, List[str]]] = KEYWORD_INTENTS):
+        intents_by_keyword: Dict[str, set] = {}
+        for name, keywords in [("admin", [admin_phrase])] + keyword_intents:
+            for keyword in keywords:
+                intents_by_keyword.setdefault(normalize_message(keyword), set()).add(name)
+
+        self._intents: Dict[str, FrozenSet[str]] = {}
+        for keyword in intents_by_keyword:
+            names = set()
+            for other, other_names in intents_by_keyword.items():
+                if keyword.startswith(other):
+                    names |= other_names
+            self._intents[keyword] = frozenset(names)
+
+        # The leading character class lets the engine skip positions where no keyword starts
+        first_chars = re.escape("".join(sorted({keyword[0] for keyword in intents_by_keyword})))
+        self._pattern = re.compile(f"(?=[{first_chars}])(?=({_trie_pattern(sorted(intents_by_keyword))}))")
+        self._precedence = [name for name, _ in keyword_intents]
+
+    # Set of intent names whose keywords occur anywhere in the normalized text
+    def matched_intents(self, text: str) -> set:
+        intents = self._intents
+        found = set()
+        for keyword in set(self._pattern.findall(text)):
+            found |= intents[keyword]
+        return found
+
+    def route(self, message: str) -> Intent:
+        text = normalize_message(message)
+        hits = self.matched_intents(text)
+
+        reminder_seconds, reminder_unit, is_reminder = parse_reminder(text)
+        reminder_text = ""
+        if is_reminder and "about" in text:
+            reminder_text = ABOUT_PATTERN.split(message, 1)[-1].strip()
+
+        name = "ai"
+        model, color, storage, price = "", "", "", None
+        if "admin" in hits:
+            name = "admin"
+        elif text.startswith("paid"):
+            name = "paid"
+        else:
+            model, color, storage, price, is_specific = parse_purchase_request(text)
+            if is_specific:
+                name = "purchase_request"
+            elif reminder_seconds:
+                name = "reminder"
+            elif hits:
+                name = next(intent for intent in self._precedence if intent in hits)
+        return Intent(name, text, model, color, storage, price, reminder_seconds, reminder_unit, reminder_text)
@@ -0,0 +1,174 @@
+import difflib
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+_STORAGE = re.compile(r"(\d+)\s*(gb|tb)?")
+_MODEL_NUMBER = re.compile(r"\d*")
+
+# Spelling variants folded into the catalog's spelling before lookup
+COLOR_ALIASES = {"grey": "gray", "colour": "color"}
+
+# Close-match threshold for misspelled model suffixes and color names. Model numbers are never
+# fuzzy-matched: a model we don't stock must not resolve to a neighbouring generation.
+FUZZY_CUTOFF = 0.8
+
+
+# Lookup key for a model name: "iPhone 13 Pro Max", "Iphone 13 pro max" and "iphone13promax" all give "13promax"
+def model_key(name: str) -> str:
+    key = _NON_ALNUM.sub("", name.lower())
+    for prefix in ("apple", "iphone"):
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+    return key
+
+
+# Split a model key into its number and suffix: "13promax" gives ("13", "promax"), "xs" gives ("", "xs")
+def split_model_key(key: str) -> Tuple[str, str]:
+    number = _MODEL_NUMBER.match(key).group()
+    return number, key[len(number):]
+
+
+# Lookup key for a color name: "Space Grey" and "space gray" both give "spacegray"
+def color_key(name: str) -> str:
+    key = name.lower()
+    for alias, canonical in COLOR_ALIASES.items():
+        key = key.replace(alias, canonical)
+    return _NON_ALNUM.sub("", key)
+
+
+# Storage in GB from text like "128GB", "128 gb", "1TB" or "256"; None if there is no number
+def parse_storage(text: str) -> Optional[int]:
+    match = _STORAGE.search(text.lower())
+    if not match:
+        return None
+    size = int(match.group(1))
+    return size * 1024 if match.group(2) == "tb" else size
+
+
+def format_storage(gb: int) -> str:
+    return f"{gb // 1024}TB" if gb >= 1024 and gb % 1024 == 0 else f"{gb}GB"
+
+
+def format_rand(amount: int) -> str:
+    return f"R{amount:,}"
+
+
+# One purchasable configuration, with display names and the rendered product details
+class Offer(NamedTuple):
+    model: str
+    color: str
+    storage: str
+    price: int
+    details: str
+
+
+# Read-only index over an INVENTORY-style catalog. Every (model, color, storage) is
+# priced up front under normalized keys; names that miss fall back to a close-match
+# search.
+class InventoryIndex:
+    def __init__(self, inventory: Dict[str, dict], price_list_title: str = "iPhone Price List"):
+        self._offers: Dict[Tuple[str, str, int], Offer] = {}
+        self._models: Dict[str, str] = {}
+        self._colors: Dict[str, Dict[str, str]] = {}
+        self._resolved: Dict[Tuple[str, str, str], Optional[Offer]] = {}
+        for model, spec in inventory.items():
+            key = model_key(model)
+            self._models[key] = model
+            self._colors[key] = {color_key(color): color for color in spec["colors"]}
+            for color in spec["colors"]:
+                for storage, extra in spec["storage"].items():
+                    price = spec["base_price"] + extra
+                    offer = Offer(model, color, format_storage(storage), price,
+                                  self._render_details(model, color, storage, price, spec))
+                    self._offers[(key, color_key(color), storage)] = offer
+        self.price_list = self._render_price_list(inventory, price_list_title)
+
+    def __len__(self) -> int:
+        return len(self._offers)
+
+    # The configuration matching the customer's wording, or None if we don't stock it.
+    # Answers are memoized per wording, so repeat requests are a single dict hit.
+    def lookup(self, model: str, color: str, storage: str) -> Optional[Offer]:
+        wording = (model, color, storage)
+        try:
+            return self._resolved[wording]
+        except KeyError:
+            pass
+        offer = self._resolve(model, color, storage)
+        # Bounded: the catalog is small, but customer typos are not
+        if len(self._resolved) > 10000:
+            self._resolved.clear()
+        self._resolved[wording] = offer
+        return offer
+
+    def _resolve(self, model: str, color: str, storage: str) -> Optional[Offer]:
+        gb = parse_storage(storage)
+        if gb is None:
+            return None
+        mkey = model_key(model)
+        ckey = color_key(color)
+        offer = self._offers.get((mkey, ckey, gb))
+        if offer is not None:
+            return offer
+        mkey = mkey if mkey in self._models else self._closest_model(mkey)
+        if mkey is None:
+            return None
+        colors = self._colors[mkey]
+        ckey = ckey if ckey in colors else self._closest(ckey, colors)
+        return self._offers.get((mkey, ckey, gb)) if ckey is not None else None
+
+    # Closest stocked model with exactly the same number, matching on the suffix only
+    def _closest_model(self, key: str) -> Optional[str]:
+        number, suffix = split_model_key(key)
+        suffixes = {}
+        for candidate in self._models:
+            candidate_number, candidate_suffix = split_model_key(candidate)
+            if candidate_number == number:
+                suffixes[candidate_suffix] = candidate
+        closest = self._closest(suffix, suffixes)
+        return suffixes[closest] if closest is not None else None
+
+    @staticmethod
+    def _closest(key: str, choices: Dict[str, str]) -> Optional[str]:
+        matches = difflib.get_close_matches(key, list(choices), n=1, cutoff=FUZZY_CUTOFF)
+        return matches[0] if matches else None
+
+    @staticmethod
+    def _render_details(model: str, color: str, storage: int, price: int, spec: dict) -> str:
+        details = f"✅ Your {model} ({color}, {format_storage(storage)})\n\n"
+        if spec.get("chip"):
+            details += f"The {color} {model} is a stunning choice with a sleek design and powerful {spec['chip']} chip.\n"
+        return details + f"Price: R{price}\n"
+
+    # Price list grouped by tier, in catalog order
+    @staticmethod
+    def _render_price_list(inventory: Dict[str, dict], title: str) -> str:
+        tiers: Dict[str, List[str]] = {}
+        discounts = set()
+        for model, spec in inventory.items():
+            line = f"- {model}: "
+            if spec.get("list_price"):
+                line += f"~~{format_rand(spec['list_price'])}~~ Now "
+                discounts.add(round(100 * (1 - spec["base_price"] / spec["list_price"])))
+            tiers.setdefault(spec.get("tier", "Models"), []).append(line + f"{format_rand(spec['base_price'])}  \n")
+        heading = f"📌 {title}"
+        if len(discounts) == 1:
+            heading += f" – {discounts.pop()}% Discount Applied"
+        sections = [f"{tier}:  \n" + "".join(lines) for tier, lines in tiers.items()]
+        return f"\n{heading}  \n\n" + "\n".join(sections)
+
+
+# Holds the current InventoryIndex. A catalog update builds a new index off to the
+# side and swaps the reference, so requests never wait on a rebuild or see a half-built one.
+class InventoryCatalog:
+    def __init__(self, inventory: Dict[str, dict]):
+        self._reload_lock = threading.Lock()
+        self.index = InventoryIndex(inventory)
+
+    def reload(self, inventory: Dict[str, dict]) -> InventoryIndex:
+        with self._reload_lock:
+            index = InventoryIndex(inventory)
+            self.index = index
+        return index
@@ -0,0 +1,60 @@
+import fcntl
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+
+# Elects one process per host, e.g. among gunicorn workers, to run background jobs:
+# whichever holds an exclusive flock on `path`. The others retry every
+# `retry_interval` seconds, so one of them takes over if the leader exits (the OS
+# releases the lock with the process). `on_elected` runs once, in the new leader.
+class LeaderLock:
+    def __init__(self, path: str, on_elected: Callable[[], None], retry_interval: float = 5.0):
+        self.path = path
+        self.on_elected = on_elected
+        self.retry_interval = retry_interval
+        self._fd: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    # Try to become leader now, and keep trying in the background if another process is
+    def start(self) -> bool:
+        if self.held or self._try_acquire():
+            return True
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._retry, name="leader-election", daemon=True)
+            self._thread.start()
+        return False
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _retry(self) -> None:
+        while not self._stop.wait(self.retry_interval):
+            if self._try_acquire():
+                return
+
+    def _try_acquire(self) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        logging.info(f"Process {os.getpid()} holds {self.path} and runs the background schedulers")
+        try:
+            self.on_elected()
+        except Exception as e:
+            logging.error(f"Starting leader duties failed: {e}")
+        return True
@@ -0,0 +1,190 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds: sub-millisecond in-process stages up to slow OpenAI calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+# Cumulative-bucket histogram, optionally split by one label (e.g. stage)
+class Histogram:
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series: Dict[str, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label_value: str = "") -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_value, (counts, total) in sorted(series.items()):
+            base = [(self.label, label_value)] if self.label else []
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(base + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(base)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(base)} {cumulative}")
+        return lines
+
+
+# Monotonic counter, optionally split by one label (e.g. intent)
+class Counter:
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str = "", amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value: str = "") -> float:
+        return self._values.get(label_value, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_value, value in values:
+            labels = _labels([(self.label, label_value)] if self.label else [])
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+# Gauge read from a callback at scrape time, so nothing is paid on the request path
+class Gauge:
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            logging.error(f"Reading gauge {self.name} failed: {e}")
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_format_value(value)}"]
+
+
+# Stage timings for one request. Every stage goes into the shared histogram; sampled
+# traces also keep them and log one line per request when it finishes.
+class RequestTrace:
+    __slots__ = ("histogram", "sampled", "start", "stages", "tags")
+
+    def __init__(self, histogram: Optional[Histogram], sampled: bool):
+        self.histogram = histogram
+        self.sampled = sampled
+        self.start = time.perf_counter()
+        self.stages: Optional[Dict[str, float]] = {} if sampled else None
+        self.tags: Optional[Dict[str, str]] = {} if sampled else None
+
+    def observe(self, stage: str, seconds: float) -> None:
+        histogram = self.histogram
+        if histogram is not None:
+            histogram.observe(seconds, stage)
+        if self.sampled:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def time(self, stage: str) -> "_StageTimer":
+        return _StageTimer(self, stage)
+
+    def tag(self, name: str, value: str) -> None:
+        if self.sampled:
+            self.tags[name] = value
+
+    def finish(self) -> float:
+        total = time.perf_counter() - self.start
+        self.observe("total", total)
+        if self.sampled:
+            stages = " ".join(f"{stage}={seconds * 1e3:.2f}ms" for stage, seconds in self.stages.items())
+            tags = " ".join(f"{name}={value}" for name, value in self.tags.items())
+            logging.info(f"trace {tags} {stages}")
+        return total
+
+
+class _StageTimer:
+    __slots__ = ("trace", "stage", "start")
+
+    def __init__(self, trace: RequestTrace, stage: str):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+# Metric registry rendered in the Prometheus text exposition format. Per-request
+# cost is a few dict and list updates under uncontended locks.
+class MetricsRegistry:
+    def __init__(self, trace_sample_rate: float = 0.0, enabled: bool = True):
+        self.trace_sample_rate = trace_sample_rate
+        self.enabled = enabled
+        self._metrics: List = []
+        self._random = random.Random()
+        self.stage_seconds = self.histogram("webhook_stage_seconds", "Time spent in each webhook stage", label="stage")
+
+    def histogram(self, name: str, help_text: str, label: Optional[str] = None,
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, label, buckets))
+
+    def counter(self, name: str, help_text: str, label: Optional[str] = None) -> Counter:
+        return self._register(Counter(name, help_text, label))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, help_text, read))
+
+    # Start timing a request; a sampled fraction also gets a trace log line
+    def trace(self) -> RequestTrace:
+        sampled = self.trace_sample_rate > 0 and self._random.random() < self.trace_sample_rate
+        return RequestTrace(self.stage_seconds if self.enabled else None, sampled)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
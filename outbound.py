@@ -0,0 +1,200 @@
+import logging
+import queue
+import random
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+from twilio.base.exceptions import TwilioRestException
+
+# WhatsApp messages sent through Twilio are capped at 1600 characters
+MAX_MESSAGE_LENGTH = 1600
+
+
+# Split a message body into chunks Twilio will accept
+def split_message(body: str, max_length: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    return [body[i:i + max_length] for i in range(0, len(body), max_length)]
+
+
+# Raised by transports; retryable errors (rate limits, 5xx, network) are retried with backoff
+class TransportError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+# Delivers single chunks through the real Twilio REST client
+class TwilioTransport:
+    def __init__(self, client, from_number: str):
+        self.client = client
+        self.from_number = from_number
+
+    def send(self, to: str, body: str) -> None:
+        try:
+            self.client.messages.create(
+                body=body,
+                from_=f"whatsapp:{self.from_number}",
+                to=f"whatsapp:{to}"
+            )
+        except TwilioRestException as e:
+            raise TransportError(str(e), status=e.status) from e
+        except Exception as e:
+            raise TransportError(str(e)) from e
+
+
+# Local stand-in for Twilio used by benchmarks: sleeps `latency` seconds per call
+# and answers every `rate_limit_every`-th call with a 429
+class FakeTransport:
+    def __init__(self, latency: float = 0.0, rate_limit_every: int = 0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.calls = 0
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, to: str, body: str) -> None:
+        with self._lock:
+            self.calls += 1
+            limited = self.rate_limit_every and self.calls % self.rate_limit_every == 0
+        if self.latency:
+            time.sleep(self.latency)
+        if limited:
+            raise TransportError("Too Many Requests", status=429, retry_after=0.01)
+        with self._lock:
+            self.sent.append((to, body))
+
+
+# Outbound delivery queue: a bounded pool of workers, each owning its own FIFO.
+# A recipient always hashes to the same worker, so chunks and consecutive
+# messages to one customer are delivered in order.
+class OutboundQueue:
+    def __init__(self, transport, workers: int = 4, max_pending: int = 10000, max_retries: int = 5,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0, enqueue_timeout: float = 1.0,
+                 observe_send: Optional[Callable[[float], None]] = None):
+        self.transport = transport
+        # Called with the duration of every transport call, e.g. to feed a latency histogram
+        self.observe_send = observe_send
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.enqueue_timeout = enqueue_timeout
+        self._queues = [queue.Queue(maxsize=max(1, max_pending // self.workers)) for _ in range(self.workers)]
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "dropped": 0}
+        # Messages queued but not yet delivered, per recipient
+        self._queued: Dict[str, int] = {}
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for index, q in enumerate(self._queues):
+            thread = threading.Thread(target=self._worker, args=(q,), name=f"outbound-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # Queue a message for delivery; returns False if the queue stayed full
+    def enqueue(self, to: str, body: str) -> bool:
+        q = self._queues[zlib.crc32(to.encode()) % self.workers]
+        self._track(to, 1)
+        try:
+            q.put((to, body), timeout=self.enqueue_timeout)
+            return True
+        except queue.Full:
+            self._track(to, -1)
+            self._count("dropped")
+            logging.error(f"Outbound queue full, dropping message to {to}: {body[:50]}...")
+            return False
+
+    # Deliver a message on the calling thread, with the same retry policy as the workers
+    def send_now(self, to: str, body: str) -> bool:
+        for chunk in split_message(body):
+            if not self._deliver(to, chunk):
+                return False
+        logging.info(f"Message sent to {to}: {body[:50]}...")
+        return True
+
+    # Whether a message to `to` is waiting in (or being sent from) the queue
+    def is_queued(self, to: str) -> bool:
+        return to in self._queued
+
+    def pending(self) -> int:
+        return sum(q.unfinished_tasks for q in self._queues)
+
+    # Block until everything queued so far has been delivered or given up on
+    def join(self) -> None:
+        for q in self._queues:
+            q.join()
+
+    def _worker(self, q: queue.Queue) -> None:
+        while True:
+            job = q.get()
+            try:
+                if job is None:
+                    return
+                try:
+                    self.send_now(*job)
+                finally:
+                    self._track(job[0], -1)
+            except Exception as e:
+                logging.error(f"Outbound worker error: {e}")
+            finally:
+                q.task_done()
+
+    def _deliver(self, to: str, chunk: str) -> bool:
+        attempt = 0
+        while True:
+            try:
+                self._send_chunk(to, chunk)
+                self._count("sent")
+                return True
+            except TransportError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    self._count("failed")
+                    logging.error(f"Failed to send message to {to}: {e}")
+                    return False
+                delay = e.retry_after or self._backoff(attempt)
+                attempt += 1
+                self._count("retried")
+                logging.warning(f"Retrying message to {to} in {delay:.2f}s (attempt {attempt}): {e}")
+                time.sleep(delay)
+
+    def _send_chunk(self, to: str, chunk: str) -> None:
+        if self.observe_send is None:
+            self.transport.send(to, chunk)
+            return
+        start = time.perf_counter()
+        try:
+            self.transport.send(to, chunk)
+        finally:
+            self.observe_send(time.perf_counter() - start)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _track(self, to: str, delta: int) -> None:
+        with self._stats_lock:
+            count = self._queued.get(to, 0) + delta
+            if count > 0:
+                self._queued[to] = count
+            else:
+                self._queued.pop(to, None)
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
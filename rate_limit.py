@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+# Outcome of a rate limit check; `notify` is set on a sender's first refused message
+# since it was last let through, so a warning is sent once rather than per message
+class RateDecision(NamedTuple):
+    allowed: bool
+    reason: str = ""
+    notify: bool = False
+
+
+ALLOWED = RateDecision(True)
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "warned")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.warned = False
+
+
+# Non-blocking token buckets for inbound messages: one per sender (`sender_rate`
+# messages per second, bursts up to `sender_burst`) and one shared by everyone
+# (`global_rate`, `global_burst`). A rate of 0 disables that bucket. Buckets of
+# senders not seen recently are dropped beyond `max_senders`; an idle sender's bucket
+# would have refilled anyway.
+class WebhookRateLimiter:
+    def __init__(self, sender_rate: float, sender_burst: float, global_rate: float = 0.0,
+                 global_burst: float = 0.0, max_senders: int = 100000, clock=time.monotonic):
+        self.sender_rate = sender_rate
+        self.sender_burst = max(1.0, sender_burst)
+        self.global_rate = global_rate
+        self.global_burst = max(1.0, global_burst)
+        self.max_senders = max_senders
+        self.clock = clock
+        self._senders: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._global = _Bucket(self.global_burst, clock())
+        self._lock = threading.Lock()
+
+    # Take a token from the sender's bucket and one from the global bucket, or neither. A
+    # global refusal is about overall load, not the sender, so it never asks to notify them.
+    def acquire(self, sender: str) -> RateDecision:
+        now = self.clock()
+        with self._lock:
+            bucket = None
+            if self.sender_rate:
+                bucket = self._senders.get(sender)
+                if bucket is None:
+                    bucket = self._senders[sender] = _Bucket(self.sender_burst, now)
+                    if len(self._senders) > self.max_senders:
+                        self._senders.popitem(last=False)
+                else:
+                    self._senders.move_to_end(sender)
+                if not self._refill(bucket, self.sender_rate, self.sender_burst, now):
+                    return self._refuse(bucket, "sender")
+            if self.global_rate and not self._refill(self._global, self.global_rate, self.global_burst, now):
+                return RateDecision(False, "global")
+            if self.global_rate:
+                self._global.tokens -= 1
+            if bucket is not None:
+                bucket.tokens -= 1
+                bucket.warned = False
+            return ALLOWED
+
+    def __len__(self) -> int:
+        return len(self._senders)
+
+    # Add the tokens earned since the last check; True if a whole token is available
+    @staticmethod
+    def _refill(bucket: _Bucket, rate: float, burst: float, now: float) -> bool:
+        bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+        bucket.updated = now
+        return bucket.tokens >= 1
+
+    @staticmethod
+    def _refuse(bucket: _Bucket, reason: str) -> RateDecision:
+        notify = not bucket.warned
+        bucket.warned = True
+        return RateDecision(False, reason, notify)
+
+
+# Counts calls in progress and refuses new ones past `limit` (0 means no limit)
+class InFlightLimiter:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.limit and self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+# Normalize a customer question so trivially different phrasings share a cache entry
+def normalize_question(message: str) -> str:
+    text = _PUNCTUATION.sub(" ", message.lower().replace("’", "'").replace("'", ""))
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+# Hash the whole context sent to the model (every turn, plus any summary): the answer can
+# depend on any of it, so only customers with identical histories may share an answer
+def context_fingerprint(context: List[Dict[str, str]]) -> str:
+    digest = hashlib.blake2b(digest_size=12)
+    for message in context:
+        digest.update(message["role"].encode())
+        digest.update(b"\0")
+        digest.update(message["content"].encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# A single upstream call that concurrent callers with the same key wait on
+class _InFlight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# LRU + TTL cache in front of query_openai, bounded by entry count and by the total
+# size of cached answers. Concurrent misses for the same key are coalesced so only
+# one upstream request is made.
+class ResponseCache:
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 16 * 2**20, ttl: float = 6 * 3600,
+                 clock=time.time):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], _InFlight] = {}
+        self._async_in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0,
+                      "upstream_calls": 0, "upstream_errors": 0, "upstream_seconds": 0.0}
+
+    def key(self, message: str, context: List[Dict[str, str]]) -> Tuple[str, str]:
+        return normalize_question(message), context_fingerprint(context)
+
+    # Return the cached answer, or call `loader` once for all concurrent callers with this key.
+    # Loader errors are passed to every waiter and never cached.
+    def get_or_load(self, message: str, context: List[Dict[str, str]], loader: Callable[[], str]) -> str:
+        key = self.key(message, context)
+        with self._lock:
+            hit = self._lookup(key)
+            if hit is not None:
+                return hit
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _InFlight()
+            self.stats["misses" if leader else "coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        start = time.perf_counter()
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._finish(key, self._in_flight, flight.value, flight.error, time.perf_counter() - start)
+            flight.event.set()
+        return flight.value
+
+    # Same as get_or_load for the async webhook path; `loader` is a coroutine function
+    async def get_or_load_async(self, message: str, context: List[Dict[str, str]],
+                                loader: Callable[[], Awaitable[str]]) -> str:
+        key = self.key(message, context)
+        with self._lock:
+            hit = self._lookup(key)
+            if hit is not None:
+                return hit
+            future = self._async_in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._async_in_flight[key] = asyncio.get_running_loop().create_future()
+            self.stats["misses" if leader else "coalesced"] += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        start = time.perf_counter()
+        value, error = None, None
+        try:
+            value = await loader()
+            future.set_result(value)
+        except BaseException as e:
+            error = e
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._finish(key, self._async_in_flight, value, error, time.perf_counter() - start)
+        return value
+
+    # Cached answer or None (counted as a miss), for callers that load the answer
+    # themselves, e.g. while streaming it, and `put` it afterwards
+    def get(self, message: str, context: List[Dict[str, str]]) -> Optional[str]:
+        key = self.key(message, context)
+        with self._lock:
+            hit = self._lookup(key)
+            if hit is None:
+                self.stats["misses"] += 1
+            return hit
+
+    # Store an answer loaded outside get_or_load; `elapsed` is the upstream call time
+    def put(self, message: str, context: List[Dict[str, str]], value: str, elapsed: float = 0.0) -> None:
+        key = self.key(message, context)
+        with self._lock:
+            self.stats["upstream_calls"] += 1
+            self.stats["upstream_seconds"] += elapsed
+            self._store(key, value)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(entries=len(self._entries), bytes=self._bytes)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        stats["upstream_avg_seconds"] = stats["upstream_seconds"] / stats["upstream_calls"] if stats["upstream_calls"] else 0.0
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # Fresh cached value for `key`, or None; caller holds the lock
+    def _lookup(self, key: Tuple[str, str]):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.clock() - entry[1] > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def _finish(self, key: Tuple[str, str], in_flight: dict, value, error, elapsed: float) -> None:
+        with self._lock:
+            self.stats["upstream_calls"] += 1
+            self.stats["upstream_seconds"] += elapsed
+            if error is not None:
+                self.stats["upstream_errors"] += 1
+            else:
+                self._store(key, value)
+            del in_flight[key]
+
+    def _store(self, key: Tuple[str, str], value: str) -> None:
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, self.clock())
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value.encode())
@@ -0,0 +1,213 @@
+import itertools
+import threading
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+# One sale; `date` is set once completed, `day` (weekday name) for promised sales
+class Sale:
+    __slots__ = ("id", "phone", "item", "amount", "status", "date", "day")
+
+    def __init__(self, id: str, phone: str, item: str, amount: int, status: str = "pending",
+                 date: str = "", day: str = ""):
+        self.id = id
+        self.phone = phone
+        self.item = item
+        self.amount = amount
+        self.status = status
+        self.date = date
+        self.day = day
+
+    def to_record(self) -> Dict[str, object]:
+        return {"id": self.id, "phone": self.phone, "item": self.item, "amount": self.amount,
+                "status": self.status, "date": self.date, "day": self.day}
+
+
+# Report section whose lines are rendered once, when a sale enters it. The joined text
+# is cached and only new lines are appended, so repeated reports don't re-render.
+class _Section:
+    def __init__(self):
+        self.lines: "OrderedDict[str, str]" = OrderedDict()
+        self._text = ""
+        self._new: List[str] = []
+        self._dirty = False
+
+    def add(self, sale_id: str, line: str) -> None:
+        self.lines[sale_id] = line
+        self._new.append(line)
+
+    def remove(self, sale_id: str) -> None:
+        del self.lines[sale_id]
+        self._dirty = True
+
+    def text(self) -> str:
+        if self._dirty:
+            self._text = "".join(self.lines.values())
+            self._dirty = False
+        elif self._new:
+            self._text += "".join(self._new)
+        self._new.clear()
+        return self._text
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+
+# Sales ledger with per-phone and per-day indexes. Pending sales are queued per phone,
+# so confirming a payment is O(1); counts and totals are kept as running aggregates.
+# `on_change` is called with each new or updated sale (e.g. to journal it). Sale ids
+# carry a per-instance prefix so ledgers in different workers never collide.
+class SalesLedger:
+    def __init__(self, on_change: Optional[Callable[[Sale], None]] = None):
+        self.on_change = on_change
+        self._id_prefix = uuid.uuid4().hex[:8] + "-"
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._sales: Dict[str, Sale] = {}
+        self._pending: Dict[str, Sale] = {}
+        self._pending_by_phone: Dict[str, deque] = defaultdict(deque)
+        self._completed_by_phone: Dict[str, List[Sale]] = defaultdict(list)
+        self._completed_by_date: Dict[str, List[Sale]] = defaultdict(list)
+        self._promised_by_day: Dict[str, List[Sale]] = defaultdict(list)
+        self._completed_section = _Section()
+        self._pending_section = _Section()
+        self._promised_sections: Dict[str, _Section] = defaultdict(_Section)
+        self._version = 0
+        self._report_cache = (None, None, "")
+        self.totals = {"completed_count": 0, "completed_amount": 0, "pending_count": 0,
+                       "pending_amount": 0, "promised_count": 0, "promised_amount": 0}
+
+    def add_pending(self, phone: str, item: str, amount: int) -> Sale:
+        with self._lock:
+            sale = self._insert(Sale(self._next_id(), phone, item, amount))
+        self._changed(sale)
+        return sale
+
+    # Move the phone's oldest pending sale to completed; None if it has none
+    def complete_pending(self, phone: str, date: str) -> Optional[Sale]:
+        with self._lock:
+            queue = self._pending_by_phone.get(phone)
+            if not queue:
+                return None
+            sale = self._complete(self._pending[queue[0]], date)
+        self._changed(sale)
+        return sale
+
+    def add_completed(self, phone: str, item: str, amount: int, date: str) -> Sale:
+        with self._lock:
+            sale = self._insert(Sale(self._next_id(), phone, item, amount, "completed", date=date))
+        self._changed(sale)
+        return sale
+
+    def add_promised(self, phone: str, item: str, amount: int, day: str) -> Sale:
+        with self._lock:
+            sale = self._insert(Sale(self._next_id(), phone, item, amount, "promised", day=day))
+        self._changed(sale)
+        return sale
+
+    # Apply a sale record from a journal or snapshot. Idempotent, and a sale never moves
+    # back from completed to pending, so records can be replayed more than once.
+    def restore(self, record: Dict[str, object]) -> None:
+        with self._lock:
+            sale = self._sales.get(record["id"])
+            if sale is None:
+                self._insert(Sale(record["id"], record["phone"], record["item"], record["amount"],
+                                  record["status"], date=record.get("date", ""), day=record.get("day", "")))
+            elif sale.status == "pending" and record["status"] == "completed":
+                self._complete(sale, record.get("date", ""))
+
+    # Every sale as a record, for snapshots
+    def dump(self) -> List[Dict[str, object]]:
+        with self._lock:
+            return [sale.to_record() for sale in self._sales.values()]
+
+    def __len__(self) -> int:
+        return len(self._sales)
+
+    def pending_for(self, phone: str) -> List[Sale]:
+        with self._lock:
+            return [self._pending[sale_id] for sale_id in self._pending_by_phone.get(phone, ())]
+
+    def completed_for(self, phone: str) -> List[Sale]:
+        with self._lock:
+            return list(self._completed_by_phone.get(phone, ()))
+
+    def completed_on(self, date: str) -> List[Sale]:
+        with self._lock:
+            return list(self._completed_by_date.get(date, ()))
+
+    # Sales report text for the admin command; reused as-is until the ledger changes
+    def report(self, today: Optional[str] = None) -> str:
+        today = today or datetime.now().strftime("%A")
+        with self._lock:
+            version, day, text = self._report_cache
+            if version == self._version and day == today:
+                return text
+            promised = self._promised_sections.get(today)
+            text = "".join([
+                "📊 Sales Report\n\n",
+                f"Completed Sales: {len(self._completed_section)}\n",
+                self._completed_section.text(),
+                "\n",
+                f"Pending Sales: {len(self._pending_section)}\n",
+                self._pending_section.text(),
+                "\n",
+                f"Promised Today ({today}): {len(promised) if promised else 0}\n",
+                promised.text() if promised else "",
+            ])
+            self._report_cache = (self._version, today, text)
+            return text
+
+    def _next_id(self) -> str:
+        return f"{self._id_prefix}{next(self._ids)}"
+
+    def _changed(self, sale: Sale) -> None:
+        if self.on_change is not None:
+            self.on_change(sale)
+
+    # Index a new sale under its status; caller holds the lock
+    def _insert(self, sale: Sale) -> Sale:
+        self._sales[sale.id] = sale
+        if sale.status == "pending":
+            self._pending[sale.id] = sale
+            self._pending_by_phone[sale.phone].append(sale.id)
+            self._pending_section.add(sale.id, f"- {sale.phone}: {sale.item} (R{sale.amount})\n")
+            self.totals["pending_count"] += 1
+            self.totals["pending_amount"] += sale.amount
+        elif sale.status == "completed":
+            self._add_completed(sale)
+        else:
+            self._promised_by_day[sale.day].append(sale)
+            self._promised_sections[sale.day].add(sale.id, f"- {sale.phone}: {sale.item} (R{sale.amount})\n")
+            self.totals["promised_count"] += 1
+            self.totals["promised_amount"] += sale.amount
+        self._version += 1
+        return sale
+
+    # Move a pending sale to completed; caller holds the lock
+    def _complete(self, sale: Sale, date: str) -> Sale:
+        del self._pending[sale.id]
+        queue = self._pending_by_phone[sale.phone]
+        if queue[0] == sale.id:
+            queue.popleft()
+        else:
+            queue.remove(sale.id)
+        if not queue:
+            del self._pending_by_phone[sale.phone]
+        self._pending_section.remove(sale.id)
+        self.totals["pending_count"] -= 1
+        self.totals["pending_amount"] -= sale.amount
+        sale.status = "completed"
+        sale.date = date
+        self._add_completed(sale)
+        self._version += 1
+        return sale
+
+    def _add_completed(self, sale: Sale) -> None:
+        self._completed_by_phone[sale.phone].append(sale)
+        self._completed_by_date[sale.date].append(sale)
+        self._completed_section.add(sale.id, f"- {sale.phone}: {sale.item} (R{sale.amount}) on {sale.date}\n")
+        self.totals["completed_count"] += 1
+        self.totals["completed_amount"] += sale.amount
@@ -0,0 +1,117 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# A job handler receives the job key's subject (e.g. a phone number) and the current
+# time, does its work, and returns the next due time or None to drop the job.
+Handler = Callable[[str, float], Optional[float]]
+
+
+# Timer scheduler backed by a min-heap keyed by due time. Each job is identified by
+# (kind, subject); rescheduling pushes a new heap entry and marks the old one stale,
+# so both schedule and cancel are O(log N) and a tick only touches due jobs.
+class TimerScheduler:
+    def __init__(self, clock: Callable[[], float] = time.time, max_idle: float = 60.0):
+        self.clock = clock
+        self.max_idle = max_idle
+        self._handlers: Dict[str, Handler] = {}
+        self._heap: List[Tuple[float, int, Tuple[str, str]]] = []
+        self._live: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    # Schedule (or move) the job for `subject`; wakes the runner if it is now the earliest
+    def schedule(self, kind: str, subject: str, due: float) -> None:
+        key = (kind, subject)
+        with self._cond:
+            seq = next(self._seq)
+            self._live[key] = (due, seq)
+            heapq.heappush(self._heap, (due, seq, key))
+            if self._heap[0][1] == seq:
+                self._cond.notify()
+            self._maybe_compact()
+
+    # Schedule only if the job is not already pending
+    def schedule_if_absent(self, kind: str, subject: str, due: float) -> bool:
+        with self._cond:
+            if (kind, subject) in self._live:
+                return False
+            self.schedule(kind, subject, due)
+            return True
+
+    def cancel(self, kind: str, subject: str) -> None:
+        with self._cond:
+            self._live.pop((kind, subject), None)
+
+    def due_time(self, kind: str, subject: str) -> Optional[float]:
+        with self._cond:
+            entry = self._live.get((kind, subject))
+            return entry[0] if entry else None
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    # Pop every job due at `now` and run its handler outside the scheduler lock
+    def run_due(self, now: Optional[float] = None) -> int:
+        now = self.clock() if now is None else now
+        due_jobs = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, key = heapq.heappop(self._heap)
+                if self._live.get(key) == (due, seq):
+                    del self._live[key]
+                    due_jobs.append(key)
+
+        for kind, subject in due_jobs:
+            try:
+                next_due = self._handlers[kind](subject, now)
+            except Exception as e:
+                logging.error(f"Scheduled {kind} job for {subject} failed: {e}")
+                continue
+            if next_due is not None:
+                # A reply may have rescheduled the job while the handler ran; keep that one
+                self.schedule_if_absent(kind, subject, next_due)
+        return len(due_jobs)
+
+    def start(self) -> None:
+        if self._thread:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                timeout = self.max_idle
+                if self._heap:
+                    timeout = min(timeout, max(0.0, self._heap[0][0] - self.clock()))
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+            self.run_due()
+
+    # Drop stale entries once they outnumber live ones, keeping the heap O(live jobs)
+    def _maybe_compact(self) -> None:
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._live):
+            self._heap = [(due, seq, key) for key, (due, seq) in self._live.items()]
+            heapq.heapify(self._heap)
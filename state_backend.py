@@ -0,0 +1,136 @@
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from state_journal import SQLiteJournal, StateJournal
+
+LOCAL_LEASE = "local"
+
+
+# Where user states and sales are kept between messages, and how workers take turns on
+# a user. `journal` persists and replicates state (None keeps it in memory only). A
+# sender's messages are processed under their lease, one at a time, so each one starts
+# from the state the previous one left: `acquire` waits up to `wait` seconds and returns
+# a token for `release`, or None if the lease is still held elsewhere.
+class StateBackend:
+    journal: Optional[StateJournal] = None
+    # Whether other processes see this state (and so need the lease to be cross-process)
+    shared = False
+
+    def acquire(self, user: str, wait: float) -> Optional[str]:
+        raise NotImplementedError
+
+    def release(self, user: str, token: str) -> None:
+        raise NotImplementedError
+
+
+# State in this process only, optionally journaled to a file. Leases are per-user locks,
+# created on demand and dropped once no thread holds or waits for them.
+class LocalStateBackend(StateBackend):
+    def __init__(self, journal: Optional[StateJournal] = None):
+        self.journal = journal
+        # user -> [lock, threads holding or waiting for it]
+        self._locks: Dict[str, List] = {}
+        self._locks_lock = threading.Lock()
+
+    def acquire(self, user: str, wait: float) -> Optional[str]:
+        with self._locks_lock:
+            entry = self._locks.get(user)
+            if entry is None:
+                entry = self._locks[user] = [threading.Lock(), 0]
+            entry[1] += 1
+        if entry[0].acquire(timeout=wait):
+            return LOCAL_LEASE
+        self._unref(user, entry)
+        return None
+
+    def release(self, user: str, token: str) -> None:
+        entry = self._locks[user]
+        entry[0].release()
+        self._unref(user, entry)
+
+    def _unref(self, user: str, entry: List) -> None:
+        with self._locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[user]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+# State in one SQLite database (WAL mode) shared by every worker on the host: the
+# SQLiteJournal tables plus a lease row per user being processed. Threads of one process
+# queue on the local lock first, so only one of them polls the database for the lease.
+# A lease expires after `lease_ttl` seconds, so a worker that died holding one does not
+# block that user for good. Release flushes the journal before dropping the lease, so
+# the next holder, on whichever worker, reads the state this message left.
+class SQLiteStateBackend(LocalStateBackend):
+    shared = True
+
+    def __init__(self, path: str, fsync_interval: float = 0.05, lease_ttl: float = 60.0,
+                 poll_interval: float = 0.02, clock=time.time):
+        super().__init__(SQLiteJournal(path, fsync_interval=fsync_interval))
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    # Opened on first use, like the journal's connection; caller holds the database lock
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._connection is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Leases need not survive a power loss, unlike the journal
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_leases ("
+                "phone TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._connection = conn
+        return self._connection
+
+    def acquire(self, user: str, wait: float) -> Optional[str]:
+        deadline = time.monotonic() + wait
+        if super().acquire(user, wait) is None:
+            return None
+        token = uuid.uuid4().hex
+        delay = 0.001
+        while not self._try_lease(user, token):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                super().release(user, LOCAL_LEASE)
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, self.poll_interval)
+        return token
+
+    def release(self, user: str, token: str) -> None:
+        try:
+            self.journal.flush()
+            with self._db_lock:
+                self._conn.execute("DELETE FROM user_leases WHERE phone = ? AND owner = ?", (user, token))
+        finally:
+            super().release(user, LOCAL_LEASE)
+
+    # Users whose lease is held by some worker right now
+    def leased(self) -> int:
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM user_leases WHERE expires > ?", (self.clock(),)).fetchone()[0]
+
+    # Take the user's lease if it is free or its holder's has expired
+    def _try_lease(self, user: str, token: str) -> bool:
+        now = self.clock()
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "INSERT INTO user_leases (phone, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (phone) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE user_leases.expires <= ?",
+                (user, token, now + self.lease_ttl, now),
+            )
+            return cursor.rowcount == 1
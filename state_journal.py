@@ -0,0 +1,410 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from user_state import UserState
+
+# Journal records are idempotent upserts, so replaying one twice (or replaying records
+# already covered by a snapshot) is harmless:
+#   {"op": "user", "phone": ..., "state": {...}}   full user state, last record wins
+#   {"op": "user", "phone": ..., "state": null}    user evicted
+#   {"op": "sale", "id": ..., "status": ..., ...}  sale upsert; status only moves forward
+Record = Dict[str, object]
+
+# A snapshot is {"users": {phone: state}, "sales": [sale records]}
+Snapshot = Dict[str, object]
+
+
+def user_record(phone: str, state: Optional[Dict[str, object]]) -> Record:
+    return {"op": "user", "phone": phone, "state": state}
+
+
+def sale_record(sale) -> Record:
+    record = sale.to_record()
+    record["op"] = "sale"
+    return record
+
+
+# Apply one journal record to the in-memory state; caller holds that user's lock
+def apply_record(record: Record, user_states: Dict[str, UserState], sales_ledger) -> None:
+    if record["op"] == "user":
+        if record["state"] is None:
+            user_states.pop(record["phone"], None)
+        else:
+            user_states[record["phone"]] = UserState.from_record(record["state"])
+    elif record["op"] == "sale":
+        sales_ledger.restore(record)
+
+
+# Expand a snapshot into the records that rebuild it
+def snapshot_records(snapshot: Optional[Snapshot]) -> Iterable[Record]:
+    if not snapshot:
+        return
+    for phone, state in snapshot.get("users", {}).items():
+        yield user_record(phone, state)
+    for sale in snapshot.get("sales", []):
+        sale["op"] = "sale"
+        yield sale
+
+
+# Write-ahead journal for user states and sales. `append` only buffers the record;
+# a background thread writes and fsyncs the buffer every `fsync_interval` seconds
+# (group commit), so at most that window of writes is lost on a crash.
+class StateJournal:
+    def __init__(self, fsync_interval: float = 0.05):
+        self.fsync_interval = fsync_interval
+        self.writer_id = uuid.uuid4().hex
+        self.stats = {"appended": 0, "flushed": 0, "batches": 0, "compactions": 0}
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+
+    def append(self, record: Record) -> None:
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._buffer.append(line)
+            self.stats["appended"] += 1
+
+    # Take the journal for writing before loading it; False if it is still someone else's
+    # after `wait` seconds. Journals any number of processes can write always succeed.
+    def claim(self, wait: float = 0.0) -> bool:
+        return True
+
+    # Snapshot plus the journal tail recorded after it, in replay order
+    def load(self) -> Tuple[Optional[Snapshot], Iterable[Record]]:
+        raise NotImplementedError
+
+    # Records written since the last poll, in journal order
+    def poll(self) -> List[Record]:
+        return []
+
+    # Whether applying `record` (from `poll`) would undo a newer write of this process to the
+    # same user or sale; check it under the lock held while that key's records are appended
+    def superseded(self, record: Record) -> bool:
+        return False
+
+    # Replace the journal with a snapshot. `snapshot_fn` is called without the journal
+    # lock held and must return the current state, including every record applied so far.
+    def compact(self, snapshot_fn: Callable[[], Snapshot]) -> None:
+        raise NotImplementedError
+
+    # Write and fsync everything appended so far
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            if lines:
+                self._write(lines)
+                self.stats["flushed"] += len(lines)
+                self.stats["batches"] += 1
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="state-journal", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.fsync_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"State journal flush failed: {e}")
+
+    # Persist a batch of serialized records; caller holds the lock
+    def _write(self, lines: List[str]) -> None:
+        raise NotImplementedError
+
+
+# Journal as newline-delimited JSON segments (`path.1`, `path.2`, ...) next to a
+# `path.snapshot` file. Compaction starts a new segment, writes the snapshot
+# atomically, then deletes the older segments. For a single process: `claim` takes an
+# exclusive lock on `path.lock`, so a second process cannot append to segments the first
+# one compacts away. Use SQLiteJournal to share state between workers.
+class FileJournal(StateJournal):
+    def __init__(self, path: str, fsync_interval: float = 0.05, claim_poll_interval: float = 0.1):
+        super().__init__(fsync_interval)
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self.claim_poll_interval = claim_poll_interval
+        self._generation = max(self._segments(), default=1)
+        # The current segment is opened on the first write
+        self._file = None
+        self._claim_fd: Optional[int] = None
+
+    # Held until `stop` or exit; waiting lets a restarted process take over from one still
+    # shutting down
+    def claim(self, wait: float = 0.0) -> bool:
+        if self._claim_fd is not None:
+            return True
+        deadline = time.monotonic() + wait
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(self.claim_poll_interval)
+        self._claim_fd = fd
+        # The previous holder may have compacted since this journal was built
+        self._generation = max(self._segments(), default=1)
+        return True
+
+    def load(self) -> Tuple[Optional[Snapshot], Iterable[Record]]:
+        snapshot, covered = None, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            covered = snapshot.get("generation", 0)
+        return snapshot, self._tail(covered)
+
+    def compact(self, snapshot_fn: Callable[[], Snapshot]) -> None:
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            if lines:
+                self._write(lines)
+            if self._file is not None:
+                self._file.close()
+            self._generation += 1
+            generation = self._generation
+            self._file = open(self._segment_path(generation), "a", encoding="utf-8")
+
+        # Records from the new segment may also be in the snapshot; replaying them is harmless
+        snapshot = dict(snapshot_fn(), generation=generation)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._fsync_dir()
+        for old in self._segments():
+            if old < generation:
+                os.remove(self._segment_path(old))
+        self.stats["compactions"] += 1
+
+    def stop(self) -> None:
+        super().stop()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._claim_fd is not None:
+            os.close(self._claim_fd)
+            self._claim_fd = None
+
+    def _write(self, lines: List[str]) -> None:
+        if self._file is None:
+            self._file = open(self._segment_path(self._generation), "a", encoding="utf-8")
+        self._file.write("\n".join(lines) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _tail(self, covered: int) -> Iterable[Record]:
+        for generation in sorted(self._segments()):
+            if generation < covered:
+                continue
+            with open(self._segment_path(generation), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write; nothing after it was fsynced
+                        logging.warning(f"Skipping unreadable journal record in {f.name}")
+
+    def _segments(self) -> List[int]:
+        generations = []
+        for name in glob.glob(glob.escape(self.path) + ".*"):
+            suffix = name[len(self.path) + 1:]
+            if suffix.isdigit():
+                generations.append(int(suffix))
+        return generations
+
+    def _segment_path(self, generation: int) -> str:
+        return f"{self.path}.{generation}"
+
+    def _fsync_dir(self) -> None:
+        fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# Journal in a SQLite database in WAL mode, shared by every worker process. Each
+# worker tails the journal with `poll`; a worker that falls behind a compaction
+# reloads from the snapshot. Concurrent writes to the same user are last-writer-wins
+# in journal order: a worker skips records older than its own latest write of that
+# key (or than a write it has not flushed yet), so every worker ends up with the
+# record with the highest sequence number.
+class SQLiteJournal(StateJournal):
+    def __init__(self, path: str, fsync_interval: float = 0.05):
+        super().__init__(fsync_interval)
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._last_seq = 0
+        # Keys of the buffered records, in order; until flushed, every record for them is stale locally
+        self._buffer_keys: List[str] = []
+        self._unflushed = set()
+        # Sequence number of this process's latest flushed write per key, kept until a poll has
+        # passed it; records for the key below it are older than what this process holds
+        self._written: Dict[str, int] = {}
+
+    # The database is opened on first use, not when the journal is built (e.g. at import in a
+    # pre-fork master); caller holds the database lock
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._connection is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS journal ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, writer TEXT NOT NULL, record TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                "upto_seq INTEGER NOT NULL, state TEXT NOT NULL)"
+            )
+            self._connection = conn
+        return self._connection
+
+    def append(self, record: Record) -> None:
+        line = json.dumps(record, separators=(",", ":"))
+        key = self._key(record)
+        with self._lock:
+            self._buffer.append(line)
+            self._buffer_keys.append(key)
+            self._unflushed.add(key)
+            self.stats["appended"] += 1
+
+    def load(self) -> Tuple[Optional[Snapshot], Iterable[Record]]:
+        with self._db_lock:
+            snapshot, upto = self._read_snapshot()
+            rows = self._conn.execute("SELECT seq, record FROM journal WHERE seq > ? ORDER BY seq", (upto,)).fetchall()
+            self._last_seq = rows[-1][0] if rows else upto
+        return snapshot, (json.loads(record) for _, record in rows)
+
+    # Every record after the last poll, this process's own included, each tagged with its
+    # "seq". Polls must not overlap, and each batch is applied before the next poll, so
+    # that `superseded` still knows the writes the batch has to be checked against.
+    def poll(self) -> List[Record]:
+        with self._lock:
+            self._written = {key: seq for key, seq in self._written.items() if seq > self._last_seq}
+        with self._db_lock:
+            upto = self._conn.execute("SELECT upto_seq FROM snapshot WHERE id = 1").fetchone()
+            records = []
+            if upto and upto[0] > self._last_seq:
+                # Records we never saw were compacted away: rebuild from the snapshot
+                snapshot, upto = self._read_snapshot()
+                for record in snapshot_records(snapshot):
+                    record["seq"] = upto
+                    records.append(record)
+                after = upto
+            else:
+                after = self._last_seq
+            rows = self._conn.execute("SELECT seq, record FROM journal WHERE seq > ? ORDER BY seq", (after,)).fetchall()
+            for seq, line in rows:
+                record = json.loads(line)
+                record["seq"] = seq
+                records.append(record)
+            if rows:
+                self._last_seq = max(self._last_seq, rows[-1][0])
+        return records
+
+    def superseded(self, record: Record) -> bool:
+        key = self._key(record)
+        with self._lock:
+            if key in self._unflushed:
+                return True
+            written = self._written.get(key)
+            return written is not None and written >= record.get("seq", 0)
+
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            keys, self._buffer_keys = self._buffer_keys, []
+            if lines:
+                last_seq = self._write(lines)
+                # One transaction holding the write lock: the batch got consecutive numbers
+                for seq, key in enumerate(keys, last_seq - len(keys) + 1):
+                    self._written[key] = seq
+                self.stats["flushed"] += len(lines)
+                self.stats["batches"] += 1
+            self._unflushed.clear()
+
+    # Callers must apply the records returned by `poll` first, so the snapshot covers
+    # everything up to the sequence number it is stored with
+    def compact(self, snapshot_fn: Callable[[], Snapshot]) -> None:
+        self.flush()
+        with self._db_lock:
+            upto = self._conn.execute("SELECT MAX(seq) FROM journal").fetchone()[0] or 0
+        upto = min(upto, self._last_seq)
+        state = json.dumps(snapshot_fn(), separators=(",", ":"))
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = self._conn.execute("SELECT upto_seq FROM snapshot WHERE id = 1").fetchone()
+                if current and current[0] >= upto:
+                    self._conn.execute("ROLLBACK")
+                    return
+                self._conn.execute("INSERT OR REPLACE INTO snapshot (id, upto_seq, state) VALUES (1, ?, ?)", (upto, state))
+                self._conn.execute("DELETE FROM journal WHERE seq <= ?", (upto,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.stats["compactions"] += 1
+
+    def stop(self) -> None:
+        super().stop()
+        with self._db_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    # Insert the batch and return the sequence number of its last record
+    def _write(self, lines: List[str]) -> int:
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO journal (writer, record) VALUES (?, ?)",
+                    [(self.writer_id, line) for line in lines],
+                )
+                last_seq = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return last_seq
+
+    def _read_snapshot(self) -> Tuple[Optional[Snapshot], int]:
+        row = self._conn.execute("SELECT upto_seq, state FROM snapshot WHERE id = 1").fetchone()
+        if row is None:
+            return None, 0
+        return json.loads(row[1]), row[0]
+
+    @staticmethod
+    def _key(record: Record) -> str:
+        return f"user:{record['phone']}" if record["op"] == "user" else f"sale:{record['id']}"
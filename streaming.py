@@ -0,0 +1,85 @@
+import re
+from typing import AsyncIterable, Awaitable, Callable, Iterable, List, Optional
+
+from outbound import MAX_MESSAGE_LENGTH, split_message
+
+# End of a sentence (punctuation followed by whitespace) or of a line
+_BOUNDARY = re.compile(r"(?<=[.!?:])\s|\n")
+
+
+# Splits a streamed reply into WhatsApp messages at sentence or paragraph boundaries.
+# A chunk is released at the first boundary after `min_length` characters, so short
+# fragments are not sent on their own, and never exceeds `max_length`.
+class ReplyChunker:
+    def __init__(self, min_length: int = 200, max_length: int = MAX_MESSAGE_LENGTH):
+        self.min_length = min(min_length, max_length)
+        self.max_length = max_length
+        # Every chunk released so far, in order
+        self.emitted: List[str] = []
+        self._buffer = ""
+
+    # Add streamed text; returns the chunks it completed
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        chunks = []
+        while True:
+            cut = self._cut()
+            if cut is None:
+                break
+            chunk = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:].lstrip()
+            if chunk:
+                chunks.append(chunk)
+        self.emitted.extend(chunks)
+        return chunks
+
+    # The rest of the reply once the stream has ended
+    def flush(self) -> List[str]:
+        rest = self._buffer.strip()
+        self._buffer = ""
+        chunks = split_message(rest, self.max_length) if rest else []
+        self.emitted.extend(chunks)
+        return chunks
+
+    # Where to end the next chunk, or None to wait for more text
+    def _cut(self) -> Optional[int]:
+        buffer = self._buffer
+        match = _BOUNDARY.search(buffer, self.min_length)
+        if match and match.start() <= self.max_length:
+            return match.start()
+        if len(buffer) <= self.max_length:
+            return None
+        # No boundary in reach: end at the last one that fits, else at a word break
+        window = buffer[:self.max_length]
+        last = None
+        for last in _BOUNDARY.finditer(window):
+            pass
+        if last and last.start() > 0:
+            return last.start()
+        space = window.rfind(" ")
+        return space if space > 0 else self.max_length
+
+
+# Send each chunk of a streamed reply as soon as it is complete; returns the full reply
+def stream_reply(pieces: Iterable[str], chunker: ReplyChunker, send: Callable[[str], None]) -> str:
+    text = []
+    for piece in pieces:
+        text.append(piece)
+        for chunk in chunker.feed(piece):
+            send(chunk)
+    for chunk in chunker.flush():
+        send(chunk)
+    return "".join(text).strip()
+
+
+# Same as stream_reply for the async webhook path
+async def stream_reply_async(pieces: AsyncIterable[str], chunker: ReplyChunker,
+                             send: Callable[[str], Awaitable[None]]) -> str:
+    text = []
+    async for piece in pieces:
+        text.append(piece)
+        for chunk in chunker.feed(piece):
+            await send(chunk)
+    for chunk in chunker.flush():
+        await send(chunk)
+    return "".join(text).strip()
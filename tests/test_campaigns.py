@@ -0,0 +1,39 @@
+import os
+
+from campaigns import CampaignRunner
+
+
+class Outbound:
+    def __init__(self):
+        self.sent = []
+
+    def is_queued(self, to):
+        return False
+
+    def send_now(self, to, body):
+        self.sent.append(to)
+        return True
+
+
+def test_campaign_without_checkpoint_sends_and_leaves_nothing_to_resume(tmp_path):
+    outbound = Outbound()
+    runner = CampaignRunner(outbound, rate=1000, batch_size=2, checkpoint_dir=str(tmp_path / "campaigns"))
+    metrics = runner.run("promo-1", ["+2771", "+2772", "+2773"], "Promo", checkpoint=False)
+    assert metrics["done"] and metrics["sent"] == 3
+    assert sorted(outbound.sent) == ["+2771", "+2772", "+2773"]
+    assert not os.path.exists(tmp_path / "campaigns")
+    assert not runner.resume()
+
+
+def test_checkpointed_campaign_resumes_after_a_stop(tmp_path):
+    outbound = Outbound()
+    checkpoint_dir = str(tmp_path / "campaigns")
+    runner = CampaignRunner(outbound, rate=1000, batch_size=1, checkpoint_dir=checkpoint_dir)
+    runner._stopped = True
+    assert not runner.run("promo-1", ["+2771", "+2772"], "Promo")["done"]
+
+    resumed = CampaignRunner(outbound, rate=1000, batch_size=1, checkpoint_dir=checkpoint_dir)
+    assert resumed.resume()
+    resumed.join()
+    assert sorted(outbound.sent) == ["+2771", "+2772"]
+    assert os.listdir(checkpoint_dir) == []
@@ -0,0 +1,30 @@
+from inventory import InventoryIndex
+
+INVENTORY = {
+    "iPhone XS": {"base_price": 5399, "storage": {64: 0, 256: 600}, "colors": ["Space Gray", "Silver"]},
+    "iPhone XS Max": {"base_price": 5999, "storage": {64: 0, 256: 600}, "colors": ["Space Gray", "Silver"]},
+    "iPhone 13": {"base_price": 7549, "storage": {128: 0, 256: 500}, "colors": ["Pink", "Midnight"]},
+    "iPhone 16 Pro": {"base_price": 14999, "storage": {128: 0, 256: 600}, "colors": ["Black Titanium", "White Titanium"]},
+    "iPhone 16 Pro Max": {"base_price": 15599, "storage": {128: 0, 256: 600}, "colors": ["Black Titanium", "White Titanium"]},
+}
+
+
+def test_exact_lookup():
+    offer = InventoryIndex(INVENTORY).lookup("iPhone 16 Pro", "Black Titanium", "256GB")
+    assert (offer.model, offer.color, offer.storage, offer.price) == ("iPhone 16 Pro", "Black Titanium", "256GB", 15599)
+
+
+def test_spelling_variants_and_aliases_resolve_to_the_stocked_model():
+    index = InventoryIndex(INVENTORY)
+    assert index.lookup("iphone16promax", "black titanium", "128 gb").model == "iPhone 16 Pro Max"
+    assert index.lookup("Iphone XS", "Space Grey", "64").color == "Space Gray"
+    assert index.lookup("iPhone 16 Pro Mx", "Black Titanum", "128GB").model == "iPhone 16 Pro Max"
+    assert index.lookup("iPhone XS Mac", "Silver", "256GB").model == "iPhone XS Max"
+
+
+def test_unknown_model_numbers_are_not_matched_to_another_generation():
+    index = InventoryIndex(INVENTORY)
+    assert index.lookup("Iphone 17 pro", "Black titanium", "256gb") is None
+    assert index.lookup("iPhone 17 Pro Max", "Black Titanium", "256GB") is None
+    assert index.lookup("iPhone 14", "Pink", "128GB") is None
+    assert index.lookup("iPhone 1", "Pink", "128GB") is None
@@ -0,0 +1,28 @@
+from rate_limit import WebhookRateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sender_is_warned_once_when_over_their_limit():
+    limiter = WebhookRateLimiter(1 / 60, 2, clock=Clock())
+    assert limiter.acquire("+2771").allowed
+    assert limiter.acquire("+2771").allowed
+    first, second = limiter.acquire("+2771"), limiter.acquire("+2771")
+    assert (first.allowed, first.reason, first.notify) == (False, "sender", True)
+    assert not second.allowed and not second.notify
+
+
+def test_global_refusal_keeps_the_senders_token_and_does_not_notify():
+    clock = Clock()
+    limiter = WebhookRateLimiter(1 / 60, 1, global_rate=1, global_burst=1, clock=clock)
+    assert limiter.acquire("+2771").allowed
+    refused = limiter.acquire("+2772")
+    assert (refused.allowed, refused.reason, refused.notify) == (False, "global", False)
+    clock.now = 1.0
+    assert limiter.acquire("+2772").allowed
@@ -0,0 +1,22 @@
+from response_cache import ResponseCache
+
+
+def history(quote):
+    return [
+        {"role": "user", "content": "I'm interested in buying an iPhone"},
+        {"role": "assistant", "content": quote},
+        {"role": "user", "content": "price"},
+        {"role": "assistant", "content": "[Sent the full iPhone price list]"},
+    ]
+
+
+def test_answers_are_not_shared_between_different_histories():
+    cache = ResponseCache()
+    cache.put("Which colour did I choose?", history("[Quoted the iPhone 13 (Pink, 128GB) at R7,549]"), "Pink")
+    assert cache.get("which colour did I choose", history("[Quoted the iPhone 12 (Blue, 64GB) at R6,999]")) is None
+
+
+def test_identical_histories_share_an_answer():
+    cache = ResponseCache()
+    cache.put("Is there a warranty?", [], "12 months")
+    assert cache.get("is there a warranty", []) == "12 months"
@@ -0,0 +1,109 @@
+import random
+
+from sales_ledger import SalesLedger
+from state_journal import FileJournal, SQLiteJournal, apply_record, user_record
+from user_state import UserState
+
+
+# One worker: its journal plus the in-memory state it keeps in step with it
+class Worker:
+    def __init__(self, path):
+        self.journal = SQLiteJournal(path)
+        self.states = {}
+        self.ledger = SalesLedger()
+
+    def write(self, phone, **fields):
+        state = self.states.setdefault(phone, UserState())
+        for name, value in fields.items():
+            setattr(state, name, value)
+        self.journal.append(user_record(phone, state.to_record()))
+
+    def sync(self):
+        for record in self.journal.poll():
+            if not self.journal.superseded(record):
+                apply_record(record, self.states, self.ledger)
+
+    def record(self, phone):
+        return self.states[phone].to_record()
+
+
+def last_record(path, phone):
+    journal = SQLiteJournal(path)
+    _, tail = journal.load()
+    states = {}
+    for record in tail:
+        apply_record(record, states, SalesLedger())
+    journal.stop()
+    return states[phone].to_record()
+
+
+def test_workers_converge_on_the_last_write(tmp_path):
+    path = str(tmp_path / "state.db")
+    leader, follower = Worker(path), Worker(path)
+    for worker in (leader, follower):
+        worker.write("+27710000001", last_message_time=100)
+        worker.journal.flush()
+    leader.sync()
+    follower.sync()
+
+    leader.write("+27710000001", last_promo_time=500)
+    follower.write("+27710000001", last_message_time=600)
+    leader.journal.flush()
+    follower.journal.flush()
+    leader.sync()
+    follower.sync()
+
+    expected = last_record(path, "+27710000001")
+    assert expected["last_message_time"] == 600
+    assert leader.record("+27710000001") == expected
+    assert follower.record("+27710000001") == expected
+
+
+def test_interleaved_writes_converge(tmp_path):
+    path = str(tmp_path / "state.db")
+    workers = [Worker(path) for _ in range(3)]
+    rng = random.Random(8)
+    phones = [f"+2771000000{i}" for i in range(3)]
+    for step in range(500):
+        worker = rng.choice(workers)
+        action = rng.random()
+        if action < 0.5:
+            worker.write(rng.choice(phones), follow_up_count=step, last_promo_time=rng.random())
+        elif action < 0.75:
+            worker.journal.flush()
+        else:
+            worker.sync()
+    for worker in workers:
+        worker.journal.flush()
+    for worker in workers:
+        worker.sync()
+
+    for phone in phones:
+        expected = last_record(path, phone)
+        assert all(worker.record(phone) == expected for worker in workers)
+
+
+def test_unflushed_write_is_not_overwritten_by_an_older_record(tmp_path):
+    path = str(tmp_path / "state.db")
+    a, b = Worker(path), Worker(path)
+    a.write("+27710000001", follow_up_count=1)
+    a.journal.flush()
+    b.write("+27710000001", follow_up_count=2)
+    b.sync()
+    assert b.record("+27710000001")["follow_up_count"] == 2
+    b.journal.flush()
+    a.sync()
+    assert a.record("+27710000001")["follow_up_count"] == 2
+
+
+def test_file_journal_has_one_writer_at_a_time(tmp_path):
+    path = str(tmp_path / "state.journal")
+    first, second = FileJournal(path), FileJournal(path)
+    assert first.claim()
+    assert not second.claim(wait=0.2)
+    first.append(user_record("+2771", UserState().to_record()))
+    first.stop()
+    assert second.claim()
+    _, tail = second.load()
+    assert [record["phone"] for record in tail] == ["+2771"]
+    second.stop()
@@ -0,0 +1,106 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+# One user's follow-up, reminder and promo state. Slots instead of a dict keep a user
+# to a fixed handful of fields, and the last reply is kept as a response ID (the intent
+# that produced it, "ai" for AI answers) rather than its text.
+class UserState:
+    __slots__ = ("last_message_time", "follow_up_count", "last_response", "last_promo_time",
+                 "reminder_time", "reminder_text")
+
+    def __init__(self, last_message_time: float = 0.0, follow_up_count: int = 0, last_response: str = "",
+                 last_promo_time: float = 0, reminder_time: float = 0, reminder_text: str = ""):
+        self.last_message_time = last_message_time
+        self.follow_up_count = follow_up_count
+        self.last_response = last_response
+        self.last_promo_time = last_promo_time
+        self.reminder_time = reminder_time
+        self.reminder_text = reminder_text
+
+    def to_record(self) -> Dict[str, object]:
+        return {"last_message_time": self.last_message_time, "follow_up_count": self.follow_up_count,
+                "last_response": self.last_response, "last_promo_time": self.last_promo_time,
+                "reminder_time": self.reminder_time, "reminder_text": self.reminder_text}
+
+    # Journal records written before UserState carry the reply text in "last_message"; it is dropped
+    @classmethod
+    def from_record(cls, record: Dict[str, object]) -> "UserState":
+        return cls(record.get("last_message_time", 0.0), record.get("follow_up_count", 0),
+                   record.get("last_response", ""), record.get("last_promo_time", 0),
+                   record.get("reminder_time", 0), record.get("reminder_text", ""))
+
+
+class _Shard:
+    __slots__ = ("states", "lock")
+
+    def __init__(self):
+        self.states: Dict[str, UserState] = {}
+        self.lock = threading.Lock()
+
+
+# Per-user state split across lock-striped shards. A user always maps to the same
+# shard, so updates for one conversation are serialized while different users
+# proceed in parallel. Callers hold `lock(phone)` around reads and writes of that
+# user; scans visit one shard at a time and never hold more than one lock.
+class ShardedUserStates:
+    def __init__(self, shards: int = 64):
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+
+    def lock(self, phone: str) -> threading.Lock:
+        return self._shard(phone).lock
+
+    def get(self, phone: str, default: Optional[UserState] = None) -> Optional[UserState]:
+        return self._shard(phone).states.get(phone, default)
+
+    def __getitem__(self, phone: str) -> UserState:
+        return self._shard(phone).states[phone]
+
+    def __setitem__(self, phone: str, state: UserState) -> None:
+        self._shard(phone).states[phone] = state
+
+    def __contains__(self, phone: str) -> bool:
+        return phone in self._shard(phone).states
+
+    def pop(self, phone: str, default: Optional[UserState] = None) -> Optional[UserState]:
+        return self._shard(phone).states.pop(phone, default)
+
+    def __len__(self) -> int:
+        return sum(len(shard.states) for shard in self._shards)
+
+    # Apply `select(phone, state)` to every user, one shard lock at a time, and return
+    # the non-None results. `select` runs under the shard lock, so keep it cheap.
+    def collect(self, select: Callable[[str, UserState], Optional[T]]) -> List[T]:
+        results = []
+        for shard in self._shards:
+            with shard.lock:
+                for phone, state in shard.states.items():
+                    value = select(phone, state)
+                    if value is not None:
+                        results.append(value)
+        return results
+
+    # Remove every user for which `select(phone, state)` is true, one shard lock at a time,
+    # and return them. `on_evict(phone, state)` runs under the shard lock, before anyone
+    # can store a new state for that phone, so keep it cheap too.
+    def evict(self, select: Callable[[str, UserState], bool],
+              on_evict: Optional[Callable[[str, UserState], None]] = None) -> List[Tuple[str, UserState]]:
+        evicted = []
+        for shard in self._shards:
+            with shard.lock:
+                expired = [(phone, state) for phone, state in shard.states.items() if select(phone, state)]
+                for phone, state in expired:
+                    del shard.states[phone]
+                    if on_evict is not None:
+                        on_evict(phone, state)
+            evicted.extend(expired)
+        return evicted
+
+    # Every user's state as journal records, for snapshots and background scans
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        return dict(self.collect(lambda phone, state: (phone, state.to_record())))
+
+    def _shard(self, phone: str) -> _Shard:
+        return self._shards[hash(phone) % len(self._shards)]